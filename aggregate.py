@@ -1,14 +1,33 @@
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import geopandas as gpd
 import pandas as pd
 import numpy as np
 from shapely.strtree import STRtree
 
 from .load_data import (
-    iter_crime_chunks,
+    _scope_is_bounded,
+    _scope_mask,
+    iter_crime_arrays,
     load_streetlights,
     load_bus_stops,
+    merge_watermarks,
+    scope_to_dict,
+    update_watermark,
+)
+from .build_grid import HexIndexer
+from .crime_cube import CrimeCube, save_cell_hour_dow
+from .config import (
+    CELL_HOUR_DOW_FILE,
+    GRID_FILE,
+    FEATURES_FILE,
+    LEDGER_FILE,
+    MONTHLY_FILE,
+    CUBE_FILE,
+    SCOPE_FILE,
 )
-from .config import GRID_FILE, FEATURES_FILE, MONTHLY_FILE
 
 DEFAULT_CRIME_TYPES = ["BURGLARY", "ROBBERY", "ASSAULT"]
 
@@ -25,30 +44,455 @@ def build_grid_index(grid):
 
 
 # ---------------------------------------------------------------------
-# Helper: count point features per grid cell (small datasets only)
+# Helper: vectorised point-in-cell assignment
+# ---------------------------------------------------------------------
+
+def assign_cells(points, tree):
+    """
+    Assign a batch of points to grid cells in a single STRtree query.
+
+    Parameters
+    ----------
+    points : GeoSeries or array of shapely Points
+        Points in the same CRS as the grid.
+    tree : STRtree
+        Index built by build_grid_index().
+
+    Returns
+    -------
+    np.ndarray (int64)
+        Positional index of the containing cell for every point,
+        or -1 where the point falls outside the grid.
+    """
+    points = np.asarray(points)
+    positions = np.full(len(points), -1, dtype=np.int64)
+
+    if len(points) == 0:
+        return positions
+
+    # (point_idx, cell_idx) pairs where the cell contains the point
+    point_idx, cell_idx = tree.query(points, predicate="within")
+
+    # Cells do not overlap, but keep the lowest cell index if a point
+    # ever matches more than one (deterministic tie-break)
+    order = np.lexsort((cell_idx, point_idx))
+    point_idx, cell_idx = point_idx[order], cell_idx[order]
+    first = np.r_[True, point_idx[1:] != point_idx[:-1]]
+    positions[point_idx[first]] = cell_idx[first]
+
+    return positions
+
+
+def locate_points(points, grid, indexer=None, tree=None):
+    """
+    Positional cell index for every point (-1 outside the grid).
+
+    Uses the analytic HexIndexer when available and falls back to a
+    bulk STRtree query for grids without lattice metadata.
+    """
+    if indexer is not None:
+        return indexer.positions(points.x.values, points.y.values)
+
+    if tree is None:
+        tree, _, _ = build_grid_index(grid)
+    return assign_cells(points.values, tree)
+
+
+# ---------------------------------------------------------------------
+# Helper: count point features per grid cell
+# ---------------------------------------------------------------------
+
+def count_points(points_gdf, grid, indexer=None):
+    if indexer is None:
+        indexer = HexIndexer.from_grid(grid)
+
+    positions = locate_points(points_gdf.geometry, grid, indexer=indexer)
+    positions = positions[positions >= 0]
+
+    return pd.Series(
+        np.bincount(positions, minlength=len(grid)),
+        index=grid["cell_id"],
+        dtype=int,
+    )
+
+
+# ---------------------------------------------------------------------
+# Chunk-level partial counts (picklable, mergeable)
+# ---------------------------------------------------------------------
+
+def chunk_columns(arrays) -> dict:
+    """
+    Reduce a crime chunk from iter_crime_arrays() to the compact
+    arrays aggregation needs (what gets pickled to worker processes).
+    """
+    return {
+        "id": arrays["id"],
+        "updated_on": arrays["updated_on"],
+        "x": arrays["x"],
+        "y": arrays["y"],
+        "month": arrays["month"],
+        "hour": arrays["hour"],
+        "dow": arrays["dow"],
+        "primary_type": arrays["primary_type"],
+    }
+
+
+def chunk_partial(columns, cell_ids, primary_types, indexer=None, tree=None) -> dict:
+    """
+    Count one chunk onto the grid.
+
+    Returns
+    -------
+    dict
+        total   : (n_cells,) int64 counts of all crimes
+        by_type : (n_types, n_cells) int64 counts per primary type
+        cube    : CrimeCube of the chunk's cell/month/hour/dow/type
+                  counts
+        ledger  : DataFrame with the cube coordinates of every counted
+                  incident, keyed by id (see ledger_frame())
+        watermark : highest id / updated_on in the chunk
+    """
+    n_cells = len(cell_ids)
+
+    if indexer is not None:
+        positions = indexer.positions(columns["x"], columns["y"])
+    else:
+        positions = assign_cells(
+            gpd.points_from_xy(columns["x"], columns["y"]), tree
+        )
+
+    matched = positions >= 0
+    positions = positions[matched]
+    ptype = pd.Categorical(columns["primary_type"])[matched]
+
+    by_type = np.zeros((len(primary_types), n_cells), dtype=np.int64)
+    for k, ctype in enumerate(primary_types):
+        by_type[k] = np.bincount(positions[ptype == ctype], minlength=n_cells)
+
+    cube = CrimeCube(cell_ids).add(
+        positions,
+        columns["month"][matched],
+        columns["hour"][matched],
+        columns["dow"][matched],
+        ptype,
+    )
+
+    return {
+        "total": np.bincount(positions, minlength=n_cells).astype(np.int64),
+        "by_type": by_type,
+        "cube": cube,
+        "ledger": ledger_frame(columns, matched, positions, ptype),
+        "watermark": update_watermark(None, columns["id"], columns["updated_on"]),
+    }
+
+
+def merge_partials(*partials) -> dict:
+    """
+    Combine partials (None entries are skipped). Associative and
+    order-independent; the first partial's cube is updated in place.
+    """
+    partials = [p for p in partials if p is not None]
+    if not partials:
+        return None
+
+    cube = partials[0]["cube"]
+    for p in partials[1:]:
+        cube.merge(p["cube"])
+
+    ledgers = [p["ledger"] for p in partials]
+    return {
+        "total": sum(p["total"] for p in partials),
+        "by_type": sum(p["by_type"] for p in partials),
+        "cube": cube,
+        "ledger": ledgers[0] if len(ledgers) == 1 else pd.concat(ledgers, ignore_index=True),
+        "watermark": merge_watermarks(*(p["watermark"] for p in partials)),
+    }
+
+
+# ---------------------------------------------------------------------
+# Incident ledger (incremental refresh)
+# ---------------------------------------------------------------------
+# The ledger records where every counted incident landed in the cube
+# (cell position, month, hour, dow, type). A late update of an existing
+# ID is applied by subtracting the ledger entry and adding the new
+# version, so refreshes never need to revisit the full history.
+
+def ledger_frame(columns, matched, positions, ptype) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "id": columns["id"][matched],
+            "cell": positions.astype(np.int32),
+            "month": columns["month"][matched].astype(np.int16),
+            "hour": columns["hour"][matched].astype(np.int8),
+            "dow": columns["dow"][matched].astype(np.int8),
+            "primary_type": ptype,
+        }
+    )
+
+
+def _empty_ledger() -> pd.DataFrame:
+    return ledger_frame(
+        {k: np.zeros(0, dtype=np.int64) for k in ("id", "month", "hour", "dow")},
+        np.zeros(0, dtype=bool),
+        np.zeros(0, dtype=np.int64),
+        pd.Categorical([]),
+    )
+
+
+def _save_ledger(ledger: pd.DataFrame):
+    ledger = ledger.assign(primary_type=ledger["primary_type"].astype(str))
+    ledger.to_parquet(LEDGER_FILE, index=False)
+
+
+def _load_previous_run(grid, primary_types, scope):
+    """
+    Cube, ledger and watermark of the previous aggregation, or None when
+    it cannot be extended (missing artefacts, other grid / scope / crime
+    types).
+    """
+    if not (CUBE_FILE.exists() and LEDGER_FILE.exists() and SCOPE_FILE.exists()):
+        return None
+
+    with open(SCOPE_FILE) as f:
+        record = json.load(f)
+
+    if (
+        record.get("watermark") is None
+        or record.get("scope") != scope_to_dict(scope)
+        or record.get("crime_types") != list(primary_types)
+    ):
+        return None
+
+    cube = CrimeCube.load(CUBE_FILE)
+    if not np.array_equal(cube.cell_ids, grid["cell_id"].values):
+        return None
+
+    return cube, pd.read_parquet(LEDGER_FILE), record["watermark"]
+
+
+def apply_delta(cube, ledger, delta, cell_ids, scope=None, indexer=None, tree=None):
+    """
+    Apply new and updated incidents to a cube and its ledger.
+
+    Parameters
+    ----------
+    delta : dict of arrays
+        Rows from iter_crime_arrays(since=...), read without a scope so
+        that updates moving a record out of scope still remove it.
+
+    Returns
+    -------
+    (cube, ledger, n_added, n_replaced)
+    """
+    delta = pd.DataFrame(delta)
+
+    # Latest version of every ID wins
+    delta = (
+        delta.sort_values("updated_on", kind="stable")
+        .drop_duplicates("id", keep="last")
+        .reset_index(drop=True)
+    )
+
+    # Remove the previous contribution of updated IDs
+    superseded = ledger["id"].isin(delta["id"]).values
+    old = ledger.loc[superseded]
+    cube.add(
+        old["cell"].values,
+        old["month"].values,
+        old["hour"].values,
+        old["dow"].values,
+        old["primary_type"].values,
+        counts=np.full(len(old), -1, dtype=np.int64),
+    )
+    ledger = ledger.loc[~superseded]
+
+    if _scope_is_bounded(scope):
+        delta = delta.loc[_scope_mask(pd.Series(delta["date"].values), scope).values]
+
+    columns = chunk_columns({k: delta[k].values for k in delta.columns})
+    partial = chunk_partial(columns, cell_ids, [], indexer=indexer, tree=tree)
+
+    cube.merge(partial["cube"])
+    ledger = pd.concat(
+        [ledger, partial["ledger"].astype({"primary_type": object})],
+        ignore_index=True,
+    )
+
+    return cube, ledger, len(partial["ledger"]), len(old)
+
+
+def cube_feature_counts(cube, primary_types):
+    """
+    Total and per-type crime counts per cell derived from a cube.
+    """
+    per_type = cube.sum(axis=("month", "hour", "dow"))
+    total = per_type.sum(axis=1).astype(np.int64)
+
+    by_type = np.zeros((len(primary_types), len(cube.cell_ids)), dtype=np.int64)
+    for k, ctype in enumerate(primary_types):
+        if ctype in cube.primary_types:
+            by_type[k] = per_type[:, cube.primary_types.index(ctype)]
+
+    return total, by_type
+
+
+# Per-process state for parallel aggregation (set by _init_worker)
+_WORKER_STATE = {}
+
+
+def _init_worker(cell_ids, primary_types, indexer, geoms):
+    _WORKER_STATE.update(
+        cell_ids=cell_ids,
+        primary_types=primary_types,
+        indexer=indexer,
+        tree=STRtree(geoms) if indexer is None else None,
+    )
+
+
+def _worker_partial(columns):
+    return chunk_partial(columns, **_WORKER_STATE)
+
+
+def _iter_partials(chunks, workers, cell_ids, primary_types, indexer, tree, geoms):
+    """
+    Yield chunk partials in chunk order, serially or from a process pool.
+    """
+    if workers <= 1:
+        for i, crimes in enumerate(chunks, start=1):
+            print(f"[AGGREGATE] Chunk {i} loaded ({len(crimes['x'])} rows)")
+            yield chunk_partial(
+                chunk_columns(crimes), cell_ids, primary_types,
+                indexer=indexer, tree=tree,
+            )
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(cell_ids, primary_types, indexer, geoms if indexer is None else None),
+    ) as pool:
+        pending = deque()
+
+        for i, crimes in enumerate(chunks, start=1):
+            print(f"[AGGREGATE] Chunk {i} loaded ({len(crimes['x'])} rows)")
+            pending.append(pool.submit(_worker_partial, chunk_columns(crimes)))
+
+            # Bound the chunks in flight; results come back in order
+            while len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+# ---------------------------------------------------------------------
+# Full and incremental counting
 # ---------------------------------------------------------------------
+def _aggregate_full(chunksize, scope, workers, cell_ids, primary_types, indexer, tree, geoms):
+    """
+    Count every in-scope crime (serial or process pool) and merge the
+    partials.
+    """
+    mode = f"{workers} worker processes" if workers > 1 else "serial"
+    print(f"\n[AGGREGATE] Processing crime data in chunks ({mode})...")
+
+    counts = None
+    pending = []
+    for partial in _iter_partials(
+        iter_crime_arrays(chunksize=chunksize, scope=scope),
+        workers,
+        cell_ids,
+        primary_types,
+        indexer,
+        tree,
+        geoms,
+    ):
+        # Merge in batches so the running cube is re-sorted less often
+        pending.append(partial)
+        if len(pending) >= max(2, workers):
+            counts = merge_partials(counts, *pending)
+            pending = []
+
+    counts = merge_partials(counts, *pending)
+
+    if counts is None:
+        return (
+            np.zeros(len(cell_ids), dtype=np.int64),
+            np.zeros((len(primary_types), len(cell_ids)), dtype=np.int64),
+            CrimeCube(cell_ids),
+            _empty_ledger(),
+            None,
+        )
 
-def count_points(points_gdf, grid):
-    tree, geoms, cell_ids = build_grid_index(grid)
-    counts = pd.Series(0, index=grid["cell_id"], dtype=int)
+    return (
+        counts["total"],
+        counts["by_type"],
+        counts["cube"],
+        counts["ledger"],
+        counts["watermark"],
+    )
 
-    for geom in points_gdf.geometry:
-        idxs = tree.query(geom)
 
-        for idx in idxs:
-            poly = geoms[idx]
-            if poly.contains(geom):
-                counts.loc[cell_ids[idx]] += 1
-                break
+def _aggregate_delta(previous, chunksize, scope, cell_ids, indexer, tree):
+    """
+    Apply rows past the previous watermark to the previous cube.
+    """
+    cube, ledger, watermark = previous
+    print(
+        f"\n[AGGREGATE] Incremental refresh: rows newer than id "
+        f"{watermark['max_id']} / updated {watermark['updated_on']}..."
+    )
 
-    return counts
+    n_added = n_replaced = 0
+    for i, delta in enumerate(
+        iter_crime_arrays(chunksize=chunksize, since=watermark), start=1
+    ):
+        print(f"[AGGREGATE] Delta chunk {i} loaded ({len(delta['id'])} rows)")
+        cube, ledger, added, replaced = apply_delta(
+            cube, ledger, delta, cell_ids, scope=scope, indexer=indexer, tree=tree
+        )
+        n_added += added
+        n_replaced += replaced
+        watermark = update_watermark(watermark, delta["id"], delta["updated_on"])
+
+    print(f"[AGGREGATE] Counted {n_added} incidents ({n_replaced} superseded versions removed).")
+    return cube, ledger, watermark
 
 
 # ---------------------------------------------------------------------
 # Main aggregation routine
 # ---------------------------------------------------------------------
 
-def aggregate_features(primary_types=None, chunksize: int = 500_000):
+def aggregate_features(
+    primary_types=None,
+    chunksize: int = 500_000,
+    scope=None,
+    workers: int = 1,
+    incremental: bool = False,
+):
+    """
+    Aggregate crimes and environmental context onto the hex grid.
+
+    Parameters
+    ----------
+    primary_types : list of str, optional
+        Crime types that get their own crime_<type> column.
+    chunksize : int
+        Rows per chunk read from the crime store / CSV.
+    scope : dict, optional
+        Temporal scope from load_data.resolve_temporal_scope(). It is
+        pushed down to the reader and recorded in SCOPE_FILE.
+    workers : int
+        Number of processes counting chunks. Each returns partial count
+        arrays that are merged in chunk order, so results are identical
+        to the serial run.
+    incremental : bool
+        Extend the previous run instead of recounting the history: only
+        rows past the recorded watermark are read, new incidents are
+        added and late updates replace their ledger entry. Falls back
+        to a full aggregation when the previous artefacts do not match
+        this grid, scope and crime types.
+    """
 
     if primary_types is None:
         primary_types = DEFAULT_CRIME_TYPES
@@ -74,6 +518,18 @@ def aggregate_features(primary_types=None, chunksize: int = 500_000):
     for ctype in primary_types:
         grid[f"crime_{ctype.lower()}"] = 0
 
+    # ------------------------------------------------------------------
+    # Point locator: analytic lattice indexer, STRtree as fallback
+    # ------------------------------------------------------------------
+
+    indexer = HexIndexer.from_grid(grid)
+    if indexer is not None:
+        tree = None
+        print("[AGGREGATE] Using analytic hex-lattice indexer.")
+    else:
+        tree, _, _ = build_grid_index(grid)
+        print("[AGGREGATE] No lattice metadata; using STRtree indexer.")
+
     # ------------------------------------------------------------------
     # Environmental context (safe to sjoin — small)
     # ------------------------------------------------------------------
@@ -82,95 +538,40 @@ def aggregate_features(primary_types=None, chunksize: int = 500_000):
     bus = load_bus_stops()
 
     grid["streetlight_count"] = (
-        count_points(lights, grid)
+        count_points(lights, grid, indexer=indexer)
         .reindex(grid["cell_id"])
         .fillna(0)
         .astype(int)
     )
 
     grid["bus_count"] = (
-        count_points(bus, grid)
+        count_points(bus, grid, indexer=indexer)
         .reindex(grid["cell_id"])
         .fillna(0)
         .astype(int)
     )
 
-    # ------------------------------------------------------------------
-    # Build spatial index ONCE
-    # ------------------------------------------------------------------
-
-    tree, geoms, cell_ids = build_grid_index(grid)
-
-    # ------------------------------------------------------------------
-    # Monthly aggregation accumulator
-    # ------------------------------------------------------------------
-
-    monthly_accumulator = {}
-
-    print("\n[AGGREGATE] Processing crime data in chunks...")
-
-    for i, crimes in enumerate(iter_crime_chunks(chunksize=chunksize), start=1):
-
-        print(f"[AGGREGATE] Chunk {i} loaded ({len(crimes)} rows)")
-
-        for row in crimes.itertuples(index=False):
-
-            geom = row.geometry
-            idxs = tree.query(geom)
-
-            cell_id = None
-            for idx in idxs:
-                if geoms[idx].contains(geom):
-                    cell_id = cell_ids[idx]
-                    break
-
-
-            if cell_id is None:
-                continue
-
-            # Total count
-            grid.loc[grid["cell_id"] == cell_id, "crime_count_total"] += 1
-
-            # Per-type count
-            if row.primary_type in primary_types:
-                col = f"crime_{row.primary_type.lower()}"
-                grid.loc[grid["cell_id"] == cell_id, col] += 1
-
-            # Monthly aggregation key
-            key = (
-                cell_id,
-                row.month,
-                row.hour,
-                row.dow,
-                row.primary_type,
-            )
-
-            monthly_accumulator[key] = monthly_accumulator.get(key, 0) + 1
+    cell_ids = grid["cell_id"].values
 
-    # ------------------------------------------------------------------
-    # Finalise monthly table
-    # ------------------------------------------------------------------
+    previous = _load_previous_run(grid, primary_types, scope) if incremental else None
+    if incremental and previous is None:
+        print("[AGGREGATE] No reusable previous run; running a full aggregation.")
 
-    if monthly_accumulator:
-        monthly = (
-            pd.Series(monthly_accumulator)
-            .rename("crime_count")
-            .reset_index()
-            .rename(
-                columns={
-                    "level_0": "cell_id",
-                    "level_1": "month",
-                    "level_2": "hour",
-                    "level_3": "dow",
-                    "level_4": "primary_type",
-                }
-            )
+    if previous is not None:
+        cube, ledger, watermark = _aggregate_delta(
+            previous, chunksize, scope, cell_ids, indexer, tree
         )
+        total_counts, by_type = cube_feature_counts(cube, primary_types)
     else:
-        monthly = pd.DataFrame(
-            columns=["cell_id", "month", "hour", "dow", "primary_type", "crime_count"]
+        total_counts, by_type, cube, ledger, watermark = _aggregate_full(
+            chunksize, scope, workers, cell_ids, primary_types, indexer, tree,
+            grid.geometry.values,
         )
 
+    grid["crime_count_total"] = total_counts
+    for k, ctype in enumerate(primary_types):
+        grid[f"crime_{ctype.lower()}"] = by_type[k]
+
     # ------------------------------------------------------------------
     # Save outputs
     # ------------------------------------------------------------------
@@ -178,11 +579,32 @@ def aggregate_features(primary_types=None, chunksize: int = 500_000):
     FEATURES_FILE.parent.mkdir(parents=True, exist_ok=True)
     grid.to_parquet(FEATURES_FILE)
 
+    cube.save(CUBE_FILE)
+    save_cell_hour_dow(cube, CELL_HOUR_DOW_FILE)
+    _save_ledger(ledger)
+
+    # Long monthly table, kept for tools that read Parquet directly
     MONTHLY_FILE.parent.mkdir(parents=True, exist_ok=True)
-    monthly.to_parquet(MONTHLY_FILE)
+    cube.to_frame().to_parquet(MONTHLY_FILE)
+
+    # Record which period the artefacts describe
+    months = cube.axis_labels("month")
+    scope_record = {
+        "scope": scope_to_dict(scope),
+        "first_month": months[0] if len(months) else None,
+        "last_month": months[-1] if len(months) else None,
+        "incidents": int(total_counts.sum()),
+        "crime_types": list(primary_types),
+        "watermark": watermark,
+    }
+    with open(SCOPE_FILE, "w") as f:
+        json.dump(scope_record, f, indent=2)
 
     print("\n[AGGREGATE] Aggregation complete.")
     print(f"[AGGREGATE] Saved features to: {FEATURES_FILE}")
+    print(f"[AGGREGATE] Saved crime cube to: {CUBE_FILE} ({cube.nnz} entries)")
+    print(f"[AGGREGATE] Saved cell x hour x dow counts to: {CELL_HOUR_DOW_FILE}")
     print(f"[AGGREGATE] Saved monthly table to: {MONTHLY_FILE}")
+    print(f"[AGGREGATE] Saved temporal scope to: {SCOPE_FILE}")
 
-    return grid, monthly, primary_types
\ No newline at end of file
+    return grid, cube, primary_types
\ No newline at end of file
@@ -1,10 +1,12 @@
+import json
 import math
+import shapely
 from shapely.geometry import Polygon
 from shapely.ops import unary_union
 import geopandas as gpd
 import numpy as np
 
-from .config import GRID_FILE
+from .config import GRID_FILE, GRID_META_FILE
 
 
 def _hexagon(cx: float, cy: float, radius: float) -> Polygon:
@@ -84,6 +86,16 @@ def build_hex_grid(
     grid.reset_index(drop=True, inplace=True)
     grid["cell_id"] = grid.index.astype(int)
 
+    # Lattice parameters, so points can be indexed arithmetically later
+    grid.attrs["hex_lattice"] = {
+        "origin_x": float(minx),
+        "origin_y": float(miny),
+        "radius": float(radius),
+        "hex_diameter": float(hex_diameter),
+        "crs": grid.crs.to_string(),
+        "n_cells": int(len(grid)),
+    }
+
     return grid
 
 
@@ -104,9 +116,167 @@ def build_and_save_grid(
     GRID_FILE.parent.mkdir(parents=True, exist_ok=True)
     grid.to_file(GRID_FILE, driver="GPKG")
 
+    with open(GRID_META_FILE, "w") as f:
+        json.dump(grid.attrs["hex_lattice"], f, indent=2)
+
     print(f"[GRID] Hex diameter (vertex-to-vertex): {hex_diameter:.1f} m")
     print(f"[GRID] Total cells: {len(grid)}")
     print(f"[GRID] CRS: {grid.crs}")
     print(f"[GRID] Saved to: {GRID_FILE}")
 
-    return grid
\ No newline at end of file
+    return grid
+
+
+# ---------------------------------------------------------------------
+# Lattice metadata
+# ---------------------------------------------------------------------
+
+def load_grid_lattice(grid: gpd.GeoDataFrame = None):
+    """
+    Load the lattice parameters saved alongside the hex grid.
+
+    Returns None when no metadata exists (grids built by older
+    versions) or when it does not describe the given grid.
+    """
+    if not GRID_META_FILE.exists():
+        return None
+
+    with open(GRID_META_FILE) as f:
+        lattice = json.load(f)
+
+    if grid is not None and lattice.get("n_cells") != len(grid):
+        return None
+
+    return lattice
+
+
+# ---------------------------------------------------------------------
+# Analytic point -> cell indexer
+# ---------------------------------------------------------------------
+
+class HexIndexer:
+    """
+    Map projected coordinates to grid cells with pure arithmetic.
+
+    build_hex_grid() places hexagons (vertices at 0°, 60°, ...) on a
+    lattice with rows sqrt(3) * radius apart, centres 3 * radius apart
+    within a row and odd rows shifted by 1.5 * radius. The hexagons do
+    not tile the plane, so a point is snapped to its nearest lattice
+    centre and then tested against that hexagon; points in the gaps
+    belong to no cell, exactly as with a geometric contains() test.
+
+    Only cells that were clipped by the city boundary need an exact
+    geometric check, which is done with vectorised shapely calls.
+    """
+
+    def __init__(self, grid: gpd.GeoDataFrame, lattice: dict):
+        self.origin_x = lattice["origin_x"]
+        self.origin_y = lattice["origin_y"]
+        self.radius = lattice["radius"]
+
+        self.w = 3 * self.radius
+        self.h = math.sqrt(3) * self.radius
+
+        # Lattice coordinates of every cell (any interior point of a
+        # clipped cell still lies inside its original hexagon)
+        rep = grid.geometry.representative_point()
+        rows, cols, _, _ = self._nearest_centre(rep.x.values, rep.y.values)
+
+        if len(set(zip(rows.tolist(), cols.tolist()))) != len(grid):
+            raise ValueError("Grid cells do not map one-to-one onto the hex lattice.")
+
+        self.row_min, self.col_min = rows.min(), cols.min()
+        self.lookup = np.full(
+            (rows.max() - self.row_min + 1, cols.max() - self.col_min + 1),
+            -1,
+            dtype=np.int64,
+        )
+        self.lookup[rows - self.row_min, cols - self.col_min] = np.arange(len(grid))
+
+        # Cells that differ from a full hexagon need an exact test
+        full_area = 1.5 * math.sqrt(3) * self.radius ** 2
+        clipped = ~np.isclose(grid.geometry.area.values, full_area, rtol=1e-9, atol=1e-6)
+        self.clipped = clipped
+        self.geoms = np.asarray(grid.geometry.values)
+        shapely.prepare(self.geoms[clipped])
+
+    def __setstate__(self, state):
+        # Prepared geometries do not survive pickling (worker processes)
+        self.__dict__.update(state)
+        shapely.prepare(self.geoms[self.clipped])
+
+    @classmethod
+    def from_grid(cls, grid: gpd.GeoDataFrame):
+        """
+        Build an indexer for a grid, or return None if the grid has no
+        usable lattice metadata.
+        """
+        lattice = load_grid_lattice(grid)
+        if lattice is None:
+            return None
+        try:
+            return cls(grid, lattice)
+        except ValueError as exc:
+            print(f"[GRID] Lattice indexer unavailable: {exc}")
+            return None
+
+    def _nearest_centre(self, x, y):
+        """
+        Return (row, col, dx, dy) of the nearest lattice centre.
+        """
+        fy = (y - self.origin_y) / self.h
+        best = None
+
+        for row in (np.floor(fy), np.floor(fy) + 1):
+            offset = np.where(row % 2 == 0, 0.0, 1.5 * self.radius)
+            col = np.rint((x - self.origin_x - offset) / self.w)
+            dx = x - (self.origin_x + col * self.w + offset)
+            dy = y - (self.origin_y + row * self.h)
+            d2 = dx * dx + dy * dy
+
+            if best is None:
+                best = [row, col, dx, dy, d2]
+            else:
+                closer = d2 < best[4]
+                for k, v in enumerate((row, col, dx, dy, d2)):
+                    best[k] = np.where(closer, v, best[k])
+
+        row, col, dx, dy, _ = best
+        return row.astype(np.int64), col.astype(np.int64), dx, dy
+
+    def positions(self, x, y) -> np.ndarray:
+        """
+        Positional grid index for each (x, y), or -1 outside the grid.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+
+        row, col, dx, dy = self._nearest_centre(x, y)
+        dx, dy = np.abs(dx), np.abs(dy)
+
+        # Strictly inside the hexagon (vertices at 0°, 60°, ...)
+        s3 = math.sqrt(3)
+        inside = (dy < 0.5 * s3 * self.radius) & (s3 * dx + dy < s3 * self.radius)
+
+        row = row - self.row_min
+        col = col - self.col_min
+        inside &= (row >= 0) & (row < self.lookup.shape[0])
+        inside &= (col >= 0) & (col < self.lookup.shape[1])
+
+        positions = np.full(len(x), -1, dtype=np.int64)
+        positions[inside] = self.lookup[row[inside], col[inside]]
+
+        # Exact check for cells clipped by the boundary
+        hit = np.flatnonzero(positions >= 0)
+        needs_check = hit[self.clipped[positions[hit]]]
+
+        if len(needs_check):
+            order = np.argsort(positions[needs_check], kind="stable")
+            needs_check = needs_check[order]
+            cells, starts = np.unique(positions[needs_check], return_index=True)
+
+            for pos, idx in zip(cells, np.split(needs_check, starts[1:])):
+                keep = shapely.contains_xy(self.geoms[pos], x[idx], y[idx])
+                positions[idx[~keep]] = -1
+
+        return positions
\ No newline at end of file
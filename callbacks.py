@@ -1,25 +1,337 @@
-from dash import Input, Output, State, dcc, html
+from dash import Input, Output, State, ctx, dcc, html, no_update
 import dash_bootstrap_components as dbc
 import plotly.express as px
 import pandas as pd
 import numpy as np
+import json
 import pathlib
 
 from .maps import (
+    encode_map_values,
     make_static_map,
     make_animated_map,
     gdf,
-    monthly_df,
+    register_geometry_route,
+    static_map_values,
 )
 from src.reporting import generate_pdf_summary
 from src.spatial_stats import compute_moran
-from src.config import FORECAST_FILE
+from src.config import (
+    CELL_HOUR_DOW_FILE,
+    CUBE_FILE,
+    EMERGING_HOTSPOTS_FILE,
+    FORECAST_CELL_FILE,
+    FORECAST_FILE,
+    GEOJSON_DIR,
+    MODEL_FILE,
+    MONTHLY_FILE,
+    MORAN_TABLE_FILE,
+    RESULT_CACHE_DB,
+    RESULT_CACHE_DB_MB,
+    RESULT_CACHE_MB,
+)
+from src import map_geometry
+from src.map_geometry import GEOJSON_MANIFEST, GEOJSON_ZOOM_LEVELS
+from . import maps
+from .result_cache import ResultCache
+
+# Controls that only change the static map's values / colours; in
+# client-side mode they recolour the existing figure instead of
+# rebuilding it
+RECOLOUR_INPUTS = {
+    "model-choice", "color-scale", "crime-type", "hour-slider", "all-hours", "dow-checklist"
+}
+
+# Decode the float32 payload and patch z / colour scale of the current
+# figure; the geometry (a URL) and everything else are left as they are
+RECOLOUR_JS = """
+function(payload, figure) {
+    if (!payload || !figure || !figure.data || !figure.data.length
+            || (figure.frames && figure.frames.length)) {
+        return window.dash_clientside.no_update;
+    }
+    const raw = atob(payload.z);
+    const bytes = new Uint8Array(raw.length);
+    for (let i = 0; i < raw.length; i++) {
+        bytes[i] = raw.charCodeAt(i);
+    }
+    const values = new Float32Array(bytes.buffer);
+    if (values.length !== payload.n) {
+        return window.dash_clientside.no_update;
+    }
+    const z = Array.from(values, v => (Number.isNaN(v) ? null : v));
+    const trace = Object.assign({}, figure.data[0], {z: z});
+    const layout = Object.assign({}, figure.layout);
+    layout.coloraxis = Object.assign({}, layout.coloraxis, {colorscale: payload.colorscale});
+    return Object.assign({}, figure, {data: [trace].concat(figure.data.slice(1)), layout: layout});
+}
+"""
+
+# Swap the geometry URL of every trace (and animation frame) to the
+# detail level for the zoom the user has reached; the figure keeps its
+# values and view (uirevision), only the geometry is fetched again
+GEOMETRY_LEVEL_JS = """
+function(relayout, figure) {
+    const levels = %s;
+    if (!relayout || relayout["mapbox.zoom"] === undefined
+            || !figure || !figure.data || !figure.data.length) {
+        return window.dash_clientside.no_update;
+    }
+    const zoom = relayout["mapbox.zoom"];
+    let level = levels[levels.length - 1][1];
+    for (const [minZoom, name] of levels) {
+        if (zoom >= minZoom) {
+            level = name;
+            break;
+        }
+    }
+    const pattern = /\\/[a-z]+\\.geojson$/;
+    const url = figure.data[0].geojson;
+    if (typeof url !== "string" || !pattern.test(url)
+            || url.endsWith("/" + level + ".geojson")) {
+        return window.dash_clientside.no_update;
+    }
+    const swap = trace => (typeof trace.geojson === "string"
+        ? Object.assign({}, trace, {
+            geojson: trace.geojson.replace(pattern, "/" + level + ".geojson"),
+        })
+        : trace);
+    const layout = Object.assign({}, figure.layout);
+    layout.mapbox = Object.assign({}, layout.mapbox, {zoom: zoom});
+    if (relayout["mapbox.center"]) {
+        layout.mapbox.center = relayout["mapbox.center"];
+    }
+    const frames = (figure.frames || []).map(
+        frame => Object.assign({}, frame, {data: (frame.data || []).map(swap)})
+    );
+    return Object.assign({}, figure, {
+        data: figure.data.map(swap), layout: layout, frames: frames,
+    });
+}
+""" % json.dumps(GEOJSON_ZOOM_LEVELS)
+
+
+# Results cache: figures, tables and downloads only depend on the
+# callback inputs, the artefacts below and the code of the app and src
+# packages (maps is imported first, so the version matches the data it
+# loaded)
+
+result_cache = ResultCache(
+    artifacts=[
+        MODEL_FILE,
+        MONTHLY_FILE,
+        CUBE_FILE,
+        CELL_HOUR_DOW_FILE,
+        FORECAST_FILE,
+        FORECAST_CELL_FILE,
+        MORAN_TABLE_FILE,
+        EMERGING_HOTSPOTS_FILE,
+        GEOJSON_DIR / GEOJSON_MANIFEST,
+    ],
+    code=[maps, map_geometry],
+    max_mb=RESULT_CACHE_MB,
+    sqlite_path=RESULT_CACHE_DB,
+    sqlite_mb=RESULT_CACHE_DB_MB,
+)
+
+
+# STATISTICS TAB CONTENT
+
+def build_stats_tab():
+
+    # Summary table
+
+    cols = [
+        "crime_count_total",
+        "streetlight_count",
+        "bus_count",
+        "pred_poisson",
+        "pred_nb",
+        "pred_rf",
+        "pred_gwr",
+        "gi_z",
+        "kde_intensity",
+    ]
+    cols = [c for c in cols if c in gdf.columns]
+
+    desc = gdf[cols].describe().reset_index()
+    stats_table = dbc.Table.from_dataframe(
+        desc, striped=True, bordered=True, hover=True
+    )
+
+    # Moran’s I
+
+    try:
+        moran = compute_moran(gdf)
+        moran_block = html.Div(
+            [
+                html.H5("Spatial autocorrelation (Moran’s I)"),
+                html.P(f"Moran’s I: {moran.I:.4f}"),
+                html.P(f"p-value: {moran.p_norm:.4f}"),
+            ]
+        )
+    except Exception as e:
+        moran_block = html.Div(
+            ["Moran’s I failed to compute.", html.Br(), str(e)]
+        )
+
+    # Moran’s I by crime type / time slice (precomputed table)
+
+    moran_table_block = html.Div()
+
+    if pathlib.Path(MORAN_TABLE_FILE).exists():
+        moran_df = pd.read_parquet(MORAN_TABLE_FILE)
+        moran_df = moran_df[
+            moran_df["family"].isin(["primary_type", "hour", "dow"])
+        ]
+        moran_df = moran_df[
+            ["family", "variable", "n_crimes", "I", "z_norm", "p_norm"]
+        ].round(4)
+        moran_table_block = html.Div(
+            [
+                html.H5("Moran’s I by crime type, hour and day of week"),
+                dbc.Table.from_dataframe(
+                    moran_df, striped=True, bordered=True, hover=True, size="sm"
+                ),
+            ]
+        )
+
+    # LISA clusters (permutation inference)
+
+    lisa_block = html.Div()
+
+    if "lisa_cluster" in gdf.columns:
+        clusters = (
+            gdf["lisa_cluster"].value_counts()
+            .rename_axis("cluster").reset_index(name="cells")
+        )
+        lisa_block = html.Div(
+            [
+                html.H5("Local Moran clusters (999 permutations, p ≤ 0.05)"),
+                dbc.Table.from_dataframe(
+                    clusters, striped=True, bordered=True, hover=True, size="sm"
+                ),
+                html.P(
+                    f"FDR-significant: {int(gdf['lisa_fdr'].sum())} LISA cells, "
+                    f"{int(gdf['gi_fdr'].sum())} Gi* cells"
+                ),
+            ]
+        )
+
+    # Emerging hot spots (space-time Gi* + Mann-Kendall)
+
+    emerging_block = html.Div()
+
+    if pathlib.Path(EMERGING_HOTSPOTS_FILE).exists():
+        emerging = (
+            pd.read_parquet(EMERGING_HOTSPOTS_FILE)["category"]
+            .value_counts(sort=False)
+            .rename_axis("category").reset_index(name="cells")
+        )
+        emerging_block = html.Div(
+            [
+                html.H5("Emerging hot spots"),
+                dbc.Table.from_dataframe(
+                    emerging, striped=True, bordered=True, hover=True, size="sm"
+                ),
+            ]
+        )
+
+    # Hotspot Scatterplot (Gi*)
+
+    if "gi_star" in gdf.columns:
+        fig_hot = px.scatter(
+            gdf,
+            x=gdf.index,
+            y="gi_star",
+            title="Gi* Z-scores (per grid cell)",
+        )
+    else:
+        fig_hot = px.scatter(title="Gi* not available")
+
+    # KDE distribution
+
+    if "kde_intensity" in gdf.columns:
+        fig_kde = px.histogram(
+            gdf,
+            x="kde_intensity",
+            nbins=40,
+            title="Distribution of KDE intensity (crimes per km²)",
+        )
+    else:
+        fig_kde = px.scatter(title="KDE not available")
+
+    # Forecast plot
+
+    forecast_block = html.Div(
+        html.P("No forecast available."),
+    )
+
+    if pathlib.Path(FORECAST_FILE).exists():
+        forecast_df = pd.read_parquet(FORECAST_FILE)
+
+        if len(forecast_df) > 0:
+            fig_forecast = px.line(
+                forecast_df,
+                x="month",
+                y="forecast",
+                title="Forecasted crime totals (next months)",
+            )
+            forecast_block = dcc.Graph(figure=fig_forecast)
+
+    # Assemble statistics tab
+
+    return html.Div(
+        [
+            html.H4("Summary statistics"),
+            stats_table,
+            html.Hr(),
+            moran_block,
+            moran_table_block,
+            lisa_block,
+            emerging_block,
+            html.Hr(),
+            html.H5("Hotspot Statistics (Gi*)"),
+            dcc.Graph(figure=fig_hot),
+            html.Hr(),
+            html.H5("KDE Intensity Distribution"),
+            dcc.Graph(figure=fig_kde),
+            html.Hr(),
+            html.H5("Forecasting"),
+            forecast_block,
+        ],
+        style={"padding": "1rem"},
+    )
+
+
+def build_map_values(model_choice, color_scale, crime_type, hour, dows):
+    values = static_map_values(model_choice, crime_type, hour, dows)
+    return encode_map_values(values, color_scale)
+
+
+def build_pdf_bytes():
+    moran = compute_moran(gdf)
+    pdf_path = generate_pdf_summary(gdf, moran)
+
+    with open(pdf_path, "rb") as f:
+        return f.read()
+
+
+cached_static_map = result_cache.memoize(make_static_map)
+cached_animated_map = result_cache.memoize(make_animated_map)
+cached_map_values = result_cache.memoize(build_map_values)
+cached_stats_tab = result_cache.memoize(build_stats_tab)
+cached_pdf_bytes = result_cache.memoize(build_pdf_bytes)
 
 
 # Register callbacks
 
 def register_callbacks(app):
 
+    # Map geometry is fetched once by the browser, not sent per figure
+
+    register_geometry_route(app)
+
     # TAB SWITCHING CALLBACK
 
     @app.callback(
@@ -30,19 +342,30 @@ def register_callbacks(app):
         Input("animate-toggle", "value"),
         Input("crime-type", "value"),
         Input("hour-slider", "value"),
+        Input("all-hours", "value"),
         Input("dow-checklist", "value"),
+        Input("client-recolour", "value"),
     )
-    def render_tab(tab, model_choice, color_scale, animate_value, crime_type, hour, dows):
+    def render_tab(
+        tab, model_choice, color_scale, animate_value, crime_type, hour, all_hours, dows,
+        recolour_value,
+    ):
 
         animate = "animate" in (animate_value or [])
+        client_recolour = "client" in (recolour_value or [])
+        static_hour = None if "all" in (all_hours or []) else hour
 
         # TAB 1: MAP TAB
 
         if tab == "tab-map":
+            # The static map stays on screen and is recoloured client-side
+            if client_recolour and not animate and ctx.triggered_id in RECOLOUR_INPUTS:
+                return no_update
+
             if animate and model_choice == "observed":
-                fig = make_animated_map(crime_type, color_scale, hour, dows)
+                fig = cached_animated_map(crime_type, color_scale, hour, dows)
             else:
-                fig = make_static_map(model_choice, color_scale, crime_type, hour, dows)
+                fig = cached_static_map(model_choice, color_scale, crime_type, static_hour, dows)
 
             return html.Div(
                 dcc.Graph(id="risk-map", figure=fig, style={"height": "82vh"}),
@@ -52,107 +375,58 @@ def register_callbacks(app):
         # TAB 2: STATISTICS TAB
 
         elif tab == "tab-stats":
+            return cached_stats_tab()
 
-            # Summary table
-
-            cols = [
-                "crime_count_total",
-                "streetlight_count",
-                "bus_count",
-                "pred_poisson",
-                "pred_nb",
-                "pred_rf",
-                "pred_gwr",
-                "gi_z",
-                "kde_intensity",
-            ]
-            cols = [c for c in cols if c in gdf.columns]
-
-            desc = gdf[cols].describe().reset_index()
-            stats_table = dbc.Table.from_dataframe(
-                desc, striped=True, bordered=True, hover=True
-            )
-
-            # Moran’s I
-
-            try:
-                moran = compute_moran(gdf)
-                moran_block = html.Div(
-                    [
-                        html.H5("Spatial autocorrelation (Moran’s I)"),
-                        html.P(f"Moran’s I: {moran.I:.4f}"),
-                        html.P(f"p-value: {moran.p_norm:.4f}"),
-                    ]
-                )
-            except Exception as e:
-                moran_block = html.Div(
-                    ["Moran’s I failed to compute.", html.Br(), str(e)]
-                )
-
-            # Hotspot Scatterplot (Gi*)
-
-            if "gi_star" in gdf.columns:
-                fig_hot = px.scatter(
-                    gdf,
-                    x=gdf.index,
-                    y="gi_star",
-                    title="Gi* Z-scores (per grid cell)",
-                )
-            else:
-                fig_hot = px.scatter(title="Gi* not available")
-
-            # KDE distribution
-
-            if "kde_intensity" in gdf.columns:
-                fig_kde = px.histogram(
-                    gdf,
-                    x="kde_intensity",
-                    nbins=40,
-                    title="Distribution of KDE intensity",
-                )
-            else:
-                fig_kde = px.scatter(title="KDE not available")
-
-            # Forecast plot
-
-            forecast_block = html.Div(
-                html.P("No forecast available."),
-            )
+        return html.Div("Unknown tab")
 
-            if pathlib.Path(FORECAST_FILE).exists():
-                forecast_df = pd.read_parquet(FORECAST_FILE)
 
-                if len(forecast_df) > 0:
-                    fig_forecast = px.line(
-                        forecast_df,
-                        x="month",
-                        y="forecast",
-                        title="Forecasted crime totals (next months)",
-                    )
-                    forecast_block = dcc.Graph(figure=fig_forecast)
+    # CLIENT-SIDE RECOLOURING (static map)
 
-            # Assemble statistics tab
+    @app.callback(
+        Output("map-values", "data"),
+        Input("model-choice", "value"),
+        Input("color-scale", "value"),
+        Input("crime-type", "value"),
+        Input("hour-slider", "value"),
+        Input("all-hours", "value"),
+        Input("dow-checklist", "value"),
+        State("tabs", "value"),
+        State("animate-toggle", "value"),
+        State("client-recolour", "value"),
+        prevent_initial_call=True,
+    )
+    def map_values(
+        model_choice, color_scale, crime_type, hour, all_hours, dows,
+        tab, animate_value, recolour_value,
+    ):
+
+        if (
+            tab != "tab-map"
+            or "animate" in (animate_value or [])
+            or "client" not in (recolour_value or [])
+        ):
+            return no_update
+
+        hour = None if "all" in (all_hours or []) else hour
+        return cached_map_values(model_choice, color_scale, crime_type, hour, dows)
+
+    app.clientside_callback(
+        RECOLOUR_JS,
+        Output("risk-map", "figure"),
+        Input("map-values", "data"),
+        State("risk-map", "figure"),
+        prevent_initial_call=True,
+    )
 
-            return html.Div(
-                [
-                    html.H4("Summary statistics"),
-                    stats_table,
-                    html.Hr(),
-                    moran_block,
-                    html.Hr(),
-                    html.H5("Hotspot Statistics (Gi*)"),
-                    dcc.Graph(figure=fig_hot),
-                    html.Hr(),
-                    html.H5("KDE Intensity Distribution"),
-                    dcc.Graph(figure=fig_kde),
-                    html.Hr(),
-                    html.H5("Forecasting"),
-                    forecast_block,
-                ],
-                style={"padding": "1rem"},
-            )
+    # Geometry detail follows the map zoom
 
-        return html.Div("Unknown tab")
+    app.clientside_callback(
+        GEOMETRY_LEVEL_JS,
+        Output("risk-map", "figure", allow_duplicate=True),
+        Input("risk-map", "relayoutData"),
+        State("risk-map", "figure"),
+        prevent_initial_call=True,
+    )
 
 
     # EXPORT CSV
@@ -181,13 +455,7 @@ def register_callbacks(app):
     )
     def download_pdf(n_clicks):
 
-        moran = compute_moran(gdf)
-        pdf_path = generate_pdf_summary(gdf, moran)
-
-        with open(pdf_path, "rb") as f:
-            pdf_bytes = f.read()
-
         return dcc.send_bytes(
-            pdf_bytes,
+            cached_pdf_bytes(),
             filename="crime_summary.pdf"
         )
\ No newline at end of file
@@ -34,9 +34,19 @@ CITY_LIMITS_SHP = DATA_RAW / "Chicago_City_Limits.shp"
 # (used during pipeline execution, not required by Dash)
 # ---------------------------------------------------------------------
 
+CRIME_STORE_DIR = DATA_PROCESSED / "crimes_store"
 GRID_FILE = DATA_PROCESSED / "hex_grid.gpkg"
+GRID_META_FILE = DATA_PROCESSED / "hex_grid.json"
+WEIGHTS_DIR = DATA_PROCESSED / "hex_grid_weights"
 FEATURES_FILE = DATA_PROCESSED / "features.parquet"
+LEDGER_FILE = DATA_PROCESSED / "crime_ledger.parquet"
 FORECAST_FILE = DATA_PROCESSED / "forecast_monthly.parquet"
+FORECAST_CELL_FILE = DATA_PROCESSED / "forecast_cell_monthly.parquet"
+SARIMA_LEADERBOARD_FILE = DATA_PROCESSED / "sarima_leaderboard.parquet"
+SARIMA_SELECTION_FILE = DATA_PROCESSED / "sarima_selection.json"
+SCOPE_FILE = DATA_PROCESSED / "temporal_scope.json"
+STAGES_DIR = DATA_PROCESSED / "stages"
+PIPELINE_STATE_FILE = DATA_PROCESSED / "pipeline_state.json"
 REPORTS_DIR = DATA_PROCESSED / "reports"
 
 # ---------------------------------------------------------------------
@@ -46,6 +56,28 @@ REPORTS_DIR = DATA_PROCESSED / "reports"
 
 MODEL_FILE = DATA_PROCESSED / "model_results.parquet"
 MONTHLY_FILE = DATA_PROCESSED / "monthly_cell_crime.parquet"
+CUBE_FILE = DATA_PROCESSED / "crime_cube.npz"
+
+# Optional: all-time cell x hour x dow x type counts (static map filters)
+CELL_HOUR_DOW_FILE = DATA_PROCESSED / "cell_hour_dow.npz"
+
+# Optional: batched Moran's I / Gi* tables (dashboard falls back if absent)
+MORAN_TABLE_FILE = DATA_PROCESSED / "spatial_moran.parquet"
+GI_STAR_TABLE_FILE = DATA_PROCESSED / "spatial_gi_star.parquet"
+
+# Optional: per-type / per-month KDE intensity and raster surfaces
+KDE_CELLS_FILE = DATA_PROCESSED / "kde_cells.parquet"
+KDE_RASTER_FILE = DATA_PROCESSED / "kde_raster.npz"
+
+# Optional: emerging hot spot categories and space-time Gi* per cell-month
+EMERGING_HOTSPOTS_FILE = DATA_PROCESSED / "emerging_hotspots.parquet"
+SPACE_TIME_GI_FILE = DATA_PROCESSED / "space_time_gi_star.parquet"
+
+# Optional: pre-serialised map GeoJSON per detail level (else built at startup)
+GEOJSON_DIR = DATA_PROCESSED / "geojson"
+
+# Optional: fitted model registry (scoring new data without refitting)
+MODELS_DIR = DATA_PROCESSED / "models"
 
 # ---------------------------------------------------------------------
 # Spatial configuration
@@ -67,6 +99,19 @@ IS_DASH_RUNTIME = (BASE / "run_app.py").exists() and not __name__ == "__main__"
 # True when running the analytics pipeline
 IS_PIPELINE_RUNTIME = (BASE / "run_pipeline.py").exists()
 
+# ---------------------------------------------------------------------
+# Dashboard result cache
+# ---------------------------------------------------------------------
+
+# In-process LRU budget per worker (MB)
+RESULT_CACHE_MB = int(os.environ.get("RESULT_CACHE_MB", 256))
+
+# Optional SQLite file shared by all Gunicorn workers (unset = per-worker only)
+RESULT_CACHE_DB = (
+    Path(os.environ["RESULT_CACHE_DB"]) if os.environ.get("RESULT_CACHE_DB") else None
+)
+RESULT_CACHE_DB_MB = int(os.environ.get("RESULT_CACHE_DB_MB", 1024))
+
 # ---------------------------------------------------------------------
 # Sanity checks (fail fast, but only when appropriate)
 # ---------------------------------------------------------------------
@@ -0,0 +1,598 @@
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------------------------
+# Key layout
+# ---------------------------------------------------------------------
+# Every non-zero cell of the cube is stored once under a packed int64
+# key (most significant field first, so sorting keys sorts rows by
+# cell, month, hour, dow, type):
+#
+#   cell position : 20 bits  (up to ~1M grid cells)
+#   month code    : 12 bits  (months since MONTH_BASE_YEAR, ~340 years)
+#   hour          :  5 bits
+#   dow           :  3 bits
+#   type code     :  8 bits  (up to 256 primary types)
+
+AXES = ("cell", "month", "hour", "dow", "primary_type")
+
+_BITS = {"cell": 20, "month": 12, "hour": 5, "dow": 3, "primary_type": 8}
+_SHIFT = {}
+_offset = 0
+for _axis in reversed(AXES):
+    _SHIFT[_axis] = _offset
+    _offset += _BITS[_axis]
+_MASK = {axis: (1 << bits) - 1 for axis, bits in _BITS.items()}
+
+MONTH_BASE_YEAR = 1900
+
+CUBE_FORMAT_VERSION = 1
+
+# Type label of records without a primary type (counted in the totals
+# like any other type)
+MISSING_TYPE = "UNKNOWN"
+
+
+# ---------------------------------------------------------------------
+# Month codes
+# ---------------------------------------------------------------------
+
+def month_code(year, month):
+    """
+    Integer month code (months since January MONTH_BASE_YEAR).
+    """
+    return (np.asarray(year, dtype=np.int64) - MONTH_BASE_YEAR) * 12 + (
+        np.asarray(month, dtype=np.int64) - 1
+    )
+
+
+def month_codes_from_labels(labels) -> np.ndarray:
+    """
+    Convert "YYYY-MM" labels to month codes.
+    """
+    labels = pd.Series(labels, dtype="string")
+    year = labels.str.slice(0, 4).astype(int).values
+    month = labels.str.slice(5, 7).astype(int).values
+    return month_code(year, month)
+
+
+def month_labels(codes) -> np.ndarray:
+    """
+    Convert month codes back to "YYYY-MM" labels.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    year = codes // 12 + MONTH_BASE_YEAR
+    month = codes % 12 + 1
+    return np.array([f"{y:04d}-{m:02d}" for y, m in zip(year, month)], dtype=object)
+
+
+# ---------------------------------------------------------------------
+# Crime cube
+# ---------------------------------------------------------------------
+
+class CrimeCube:
+    """
+    Sparse cell x month x hour x dow x primary_type count cube.
+
+    Counts are held as two flat arrays (sorted packed keys and int64
+    counts), roughly 16 bytes per non-zero entry, instead of a dict of
+    Python tuples. Cells are positional against `cell_ids`; primary
+    types are coded against `primary_types`.
+
+    Parameters
+    ----------
+    cell_ids : array-like of int
+        Grid cell_id for every cell position.
+    primary_types : list of str, optional
+        Initial type vocabulary (extended on demand by add()).
+    """
+
+    def __init__(self, cell_ids, primary_types=None, keys=None, counts=None):
+        self.cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        self.primary_types = list(primary_types or [])
+        self.keys = (
+            np.asarray(keys, dtype=np.int64)
+            if keys is not None
+            else np.empty(0, dtype=np.int64)
+        )
+        self.counts = (
+            np.asarray(counts, dtype=np.int64)
+            if counts is not None
+            else np.empty(0, dtype=np.int64)
+        )
+
+        if len(self.cell_ids) > _MASK["cell"] + 1:
+            raise ValueError("Too many grid cells for CrimeCube key layout.")
+
+    # ------------------------------------------------------------------
+    # Encoding helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _encode(cell, month, hour, dow, ptype):
+        key = np.zeros(len(cell), dtype=np.int64)
+        for axis, values in zip(AXES, (cell, month, hour, dow, ptype)):
+            key |= (np.asarray(values, dtype=np.int64) & _MASK[axis]) << _SHIFT[axis]
+        return key
+
+    def decode(self, axis: str) -> np.ndarray:
+        """
+        Integer codes of one axis for every stored entry.
+        """
+        return (self.keys >> _SHIFT[axis]) & _MASK[axis]
+
+    def _type_codes(self, values) -> np.ndarray:
+        """
+        Code primary type labels, extending the vocabulary as needed.
+        """
+        if isinstance(values, pd.Categorical):
+            # Code the categories actually present (in order of first
+            # appearance), then broadcast through the category codes
+            codes = values.codes
+            used = pd.unique(codes[codes >= 0])
+            lut = np.full(len(values.categories) + 1, -1, dtype=np.int64)
+            lut[used] = self._type_codes(np.asarray(values.categories)[used])
+            if (codes < 0).any():
+                # Missing types (code -1) read the last slot
+                lut[-1] = self._type_codes([MISSING_TYPE])[0]
+            return lut[codes]
+
+        values = pd.Series(values, dtype=object).fillna(MISSING_TYPE)
+        known = pd.Index(self.primary_types, dtype=object)
+        new = [v for v in pd.unique(values) if v not in known]
+
+        if new:
+            if len(self.primary_types) + len(new) > _MASK["primary_type"] + 1:
+                raise ValueError("Too many primary types for CrimeCube key layout.")
+            self.primary_types.extend(new)
+            known = pd.Index(self.primary_types, dtype=object)
+
+        return known.get_indexer(values)
+
+    @staticmethod
+    def _reduce(keys, counts):
+        """
+        Sort keys and sum counts of duplicates.
+        """
+        if len(keys) == 0:
+            return keys, counts
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        summed = np.bincount(inverse.ravel(), weights=counts, minlength=len(uniq))
+        return uniq, summed.astype(np.int64)
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def add(self, cell_pos, month, hour, dow, primary_type, counts=None):
+        """
+        Add a batch of records (or pre-counted rows) to the cube.
+
+        Parameters
+        ----------
+        cell_pos : array of int
+            Cell positions (index into cell_ids), not cell_id values.
+        month : array of int
+            Month codes (see month_code()).
+        hour, dow : array of int
+        primary_type : array of str
+        counts : array of int, optional
+            Weight of every row (defaults to 1). Negative weights
+            remove previously added records.
+        """
+        cell_pos = np.asarray(cell_pos, dtype=np.int64)
+        if len(cell_pos) == 0:
+            return self
+
+        keys = self._encode(
+            cell_pos, month, hour, dow, self._type_codes(primary_type)
+        )
+        weights = (
+            np.ones(len(keys), dtype=np.int64)
+            if counts is None
+            else np.asarray(counts, dtype=np.int64)
+        )
+
+        self.keys, self.counts = self._reduce(
+            np.concatenate([self.keys, keys]),
+            np.concatenate([self.counts, weights]),
+        )
+        self._drop_zeros()
+        return self
+
+    def merge(self, other: "CrimeCube") -> "CrimeCube":
+        """
+        Add another cube's counts into this one (in place). Associative
+        and order-independent, so partial cubes from worker processes
+        can be combined in any grouping.
+        """
+        if len(other.cell_ids) != len(self.cell_ids) or not np.array_equal(
+            other.cell_ids, self.cell_ids
+        ):
+            raise ValueError("Cannot merge cubes built on different grids.")
+
+        if len(other.keys) == 0:
+            for ptype in other.primary_types:
+                if ptype not in self.primary_types:
+                    self.primary_types.append(ptype)
+            return self
+
+        # Recode the other cube's types into this vocabulary
+        remap = self._type_codes(other.primary_types)
+        other_types = other.decode("primary_type")
+        keys = (other.keys & ~(_MASK["primary_type"] << _SHIFT["primary_type"])) | (
+            remap[other_types].astype(np.int64) << _SHIFT["primary_type"]
+        )
+
+        self.keys, self.counts = self._reduce(
+            np.concatenate([self.keys, keys]),
+            np.concatenate([self.counts, other.counts]),
+        )
+        self._drop_zeros()
+        return self
+
+    def _drop_zeros(self):
+        keep = self.counts != 0
+        if not keep.all():
+            self.keys, self.counts = self.keys[keep], self.counts[keep]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, cell_ids) -> "CrimeCube":
+        """
+        Build a cube from a monthly table (cell_id, month, hour, dow,
+        primary_type, crime_count).
+        """
+        cube = cls(cell_ids)
+        if len(df) == 0:
+            return cube
+
+        positions = pd.Index(cube.cell_ids).get_indexer(df["cell_id"].values)
+        keep = positions >= 0
+
+        return cube.add(
+            positions[keep],
+            month_codes_from_labels(df["month"].values[keep]),
+            df["hour"].values[keep],
+            df["dow"].values[keep],
+            df["primary_type"].values[keep],
+            counts=df["crime_count"].values[keep],
+        )
+
+    # ------------------------------------------------------------------
+    # Axis labels
+    # ------------------------------------------------------------------
+
+    @property
+    def nnz(self) -> int:
+        return len(self.keys)
+
+    def month_range(self) -> np.ndarray:
+        """
+        Contiguous month codes from the first to the last stored month.
+        """
+        if self.nnz == 0:
+            return np.empty(0, dtype=np.int64)
+        months = self.decode("month")
+        return np.arange(months.min(), months.max() + 1, dtype=np.int64)
+
+    def axis_labels(self, axis: str):
+        """
+        Labels along an axis, in the order used by sum().
+        """
+        if axis == "cell":
+            return self.cell_ids
+        if axis == "month":
+            return month_labels(self.month_range())
+        if axis == "hour":
+            return np.arange(24)
+        if axis == "dow":
+            return np.arange(7)
+        if axis == "primary_type":
+            return np.array(self.primary_types, dtype=object)
+        raise ValueError(f"Unknown axis: {axis}")
+
+    def _axis_positions(self, axis: str):
+        """
+        (positions, axis_length) of every entry along a dense axis.
+        """
+        codes = self.decode(axis)
+        if axis == "month":
+            months = self.month_range()
+            start = months[0] if len(months) else 0
+            return codes - start, len(months)
+        if axis == "cell":
+            return codes, len(self.cell_ids)
+        if axis == "hour":
+            return codes, 24
+        if axis == "dow":
+            return codes, 7
+        return codes, len(self.primary_types)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def slice(self, cells=None, months=None, hours=None, dows=None, primary_types=None):
+        """
+        Sub-cube keeping only the given labels on each axis (None keeps
+        the whole axis). Axis vocabularies are preserved.
+
+        cells are cell_id values, months are "YYYY-MM" labels or codes.
+        """
+        keep = np.ones(self.nnz, dtype=bool)
+
+        if cells is not None:
+            positions = pd.Index(self.cell_ids).get_indexer(np.atleast_1d(cells))
+            keep &= np.isin(self.decode("cell"), positions[positions >= 0])
+
+        if months is not None:
+            months = np.atleast_1d(months)
+            if months.dtype.kind in "OUS":
+                months = month_codes_from_labels(months)
+            keep &= np.isin(self.decode("month"), months)
+
+        if hours is not None:
+            keep &= np.isin(self.decode("hour"), np.atleast_1d(hours))
+
+        if dows is not None:
+            keep &= np.isin(self.decode("dow"), np.atleast_1d(dows))
+
+        if primary_types is not None:
+            wanted = pd.Index(self.primary_types, dtype=object).get_indexer(
+                np.atleast_1d(primary_types)
+            )
+            keep &= np.isin(self.decode("primary_type"), wanted[wanted >= 0])
+
+        return CrimeCube(
+            self.cell_ids,
+            list(self.primary_types),
+            keys=self.keys[keep],
+            counts=self.counts[keep],
+        )
+
+    def sum(self, axis=()):
+        """
+        Dense array of counts after summing over the given axes.
+
+        Remaining axes keep the canonical order (cell, month, hour,
+        dow, primary_type); see axis_labels() for their labels. The
+        month axis spans month_range().
+        """
+        if isinstance(axis, str):
+            axis = (axis,)
+        unknown = set(axis) - set(AXES)
+        if unknown:
+            raise ValueError(f"Unknown axes: {sorted(unknown)}")
+
+        remaining = [a for a in AXES if a not in axis]
+        if not remaining:
+            return int(self.counts.sum())
+
+        shape, flat = [], np.zeros(self.nnz, dtype=np.int64)
+        for a in remaining:
+            positions, length = self._axis_positions(a)
+            flat = flat * length + positions
+            shape.append(length)
+
+        out = np.bincount(flat, weights=self.counts, minlength=int(np.prod(shape)))
+        return out.astype(np.int64).reshape(shape)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Long monthly table: cell_id, month, hour, dow, primary_type,
+        crime_count (sorted by cell, month, hour, dow, primary_type).
+        """
+        if self.nnz == 0:
+            return pd.DataFrame(
+                columns=["cell_id", "month", "hour", "dow", "primary_type", "crime_count"]
+            )
+
+        types = np.array(self.primary_types, dtype=object)
+        type_codes = self.decode("primary_type")
+
+        # Alphabetical type order within each (cell, month, hour, dow)
+        rank = np.empty(len(types), dtype=np.int64)
+        rank[np.argsort(types.astype(str), kind="stable")] = np.arange(len(types))
+        order = np.lexsort((rank[type_codes], self.keys >> _SHIFT["dow"]))
+
+        months = self.decode("month")[order]
+        uniq_months, month_inv = np.unique(months, return_inverse=True)
+
+        return pd.DataFrame(
+            {
+                "cell_id": self.cell_ids[self.decode("cell")[order]],
+                "month": month_labels(uniq_months)[month_inv.ravel()],
+                "hour": self.decode("hour")[order],
+                "dow": self.decode("dow")[order],
+                "primary_type": types[type_codes[order]],
+                "crime_count": self.counts[order],
+            }
+        )
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path):
+        """
+        Save as a compressed .npz (keys, counts and axis vocabularies).
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        count_dtype = (
+            np.int32
+            if self.nnz == 0 or np.abs(self.counts).max() < np.iinfo(np.int32).max
+            else np.int64
+        )
+        np.savez_compressed(
+            path,
+            version=np.int64(CUBE_FORMAT_VERSION),
+            cell_ids=self.cell_ids,
+            primary_types=np.array(self.primary_types, dtype=str),
+            keys=self.keys,
+            counts=self.counts.astype(count_dtype),
+        )
+        return path
+
+    @classmethod
+    def load(cls, path) -> "CrimeCube":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != CUBE_FORMAT_VERSION:
+                raise ValueError(f"Unsupported CrimeCube format in {path}.")
+            return cls(
+                data["cell_ids"],
+                data["primary_types"].tolist(),
+                keys=data["keys"],
+                counts=data["counts"].astype(np.int64),
+            )
+
+    def __repr__(self):
+        months = self.month_range()
+        span = (
+            f"{month_labels(months[:1])[0]}..{month_labels(months[-1:])[0]}"
+            if len(months)
+            else "empty"
+        )
+        return (
+            f"CrimeCube(cells={len(self.cell_ids)}, months={span}, "
+            f"types={len(self.primary_types)}, nnz={self.nnz})"
+        )
+
+
+# ---------------------------------------------------------------------
+# Cell x hour x dow x type tensor
+# ---------------------------------------------------------------------
+# All-time counts by hour of day and day of week, dense and small
+# enough (cells x 168 x types int32) for the dashboard to load whole and
+# reduce per request without touching the monthly data.
+
+def save_cell_hour_dow(cube: CrimeCube, path):
+    """
+    Save the cube summed over months as a dense int32
+    (cell, hour, dow, primary_type) tensor.
+    """
+    tensor = cube.sum(axis="month")
+    if tensor.size and tensor.max() > np.iinfo(np.int32).max:
+        raise ValueError("Cell x hour x dow counts overflow int32.")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        path,
+        version=np.int64(CUBE_FORMAT_VERSION),
+        cell_ids=cube.cell_ids,
+        primary_types=np.array(cube.primary_types, dtype=str),
+        counts=tensor.astype(np.int32),
+    )
+    return path
+
+
+def load_cell_hour_dow(path):
+    """
+    (counts, cell_ids, primary_types) saved by save_cell_hour_dow().
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["version"]) != CUBE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported cell x hour x dow format in {path}.")
+        return data["counts"], data["cell_ids"], data["primary_types"].tolist()
+
+
+# ---------------------------------------------------------------------
+# Pre-indexed monthly slices
+# ---------------------------------------------------------------------
+# Answers "cell x month counts for one type (or all), one hour and any
+# set of days of week" without scanning the cube: for every (type,
+# hour) slot the (month, cell) pairs with crimes are stored once,
+# sorted month-major, next to a (pairs x 7) block of counts per day of
+# week. A query reads one contiguous slot and sums the chosen dow
+# columns.
+
+class MonthlySliceIndex:
+    """
+    Cell x month counts pre-reduced per (primary type, hour), with day
+    of week as a trailing axis of 7.
+
+    Slot `len(primary_types)` holds all types together.
+    """
+
+    def __init__(self, cell_ids, primary_types, months, rows, counts, offsets):
+        self.cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        self.primary_types = list(primary_types)
+        self.months = np.asarray(months, dtype=object)
+        self.rows = rows
+        self.counts = counts
+        self.offsets = offsets
+        self._type_slot = {t: i for i, t in enumerate(self.primary_types)}
+
+    @classmethod
+    def from_cube(cls, cube: CrimeCube) -> "MonthlySliceIndex":
+        n_cells = len(cube.cell_ids)
+        n_types = len(cube.primary_types)
+        n_slots = (n_types + 1) * 24
+
+        month_pos, n_months = cube._axis_positions("month")
+        cell_month = month_pos * n_cells + cube.decode("cell")
+        hour = cube.decode("hour")
+        dow = cube.decode("dow")
+        ptype = cube.decode("primary_type")
+
+        # Per-type entries plus the same entries again under "all types"
+        slot = np.concatenate([ptype * 24 + hour, n_types * 24 + hour])
+        cell_month = np.concatenate([cell_month, cell_month])
+        dow = np.concatenate([dow, dow])
+        weights = np.concatenate([cube.counts, cube.counts])
+
+        group = slot * (n_months * n_cells) + cell_month
+        groups, inverse = np.unique(group, return_inverse=True)
+
+        counts = np.bincount(
+            inverse.ravel() * 7 + dow, weights=weights, minlength=len(groups) * 7
+        )
+        # Counts per (cell, month, hour, dow, type) are small: store them
+        # (and the row positions) in the narrowest type that fits
+        count_dtype = np.uint16 if counts.max(initial=0) <= np.iinfo(np.uint16).max else np.int32
+        counts = counts.astype(count_dtype).reshape(len(groups), 7)
+
+        group_slot = groups // max(n_months * n_cells, 1)
+        offsets = np.searchsorted(group_slot, np.arange(n_slots + 1))
+
+        rows = groups - group_slot * (n_months * n_cells)
+        row_dtype = np.int32 if n_months * n_cells <= np.iinfo(np.int32).max else np.int64
+
+        return cls(
+            cube.cell_ids,
+            cube.primary_types,
+            cube.axis_labels("month"),
+            rows=rows.astype(row_dtype),
+            counts=counts,
+            offsets=offsets,
+        )
+
+    def query(self, primary_type=None, hour=0, dows=None):
+        """
+        Non-zero counts for one type (None = all types), one hour and a
+        set of days of week (None or empty = all).
+
+        Returns
+        -------
+        (cell_ids, months, counts), sorted by month then cell.
+        """
+        if primary_type is None:
+            type_slot = len(self.primary_types)
+        elif primary_type in self._type_slot:
+            type_slot = self._type_slot[primary_type]
+        else:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, np.empty(0, dtype=object), empty
+
+        slot = type_slot * 24 + int(hour)
+        lo, hi = self.offsets[slot], self.offsets[slot + 1]
+        block = self.counts[lo:hi]
+
+        if dows:
+            counts = block[:, np.asarray(dows, dtype=np.int64)].sum(axis=1, dtype=np.int64)
+        else:
+            counts = block.sum(axis=1, dtype=np.int64)
+
+        keep = counts > 0
+        rows = self.rows[lo:hi][keep]
+        n_cells = len(self.cell_ids)
+        return self.cell_ids[rows % n_cells], self.months[rows // n_cells], counts[keep]
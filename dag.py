@@ -0,0 +1,373 @@
+import datetime
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from .config import PIPELINE_STATE_FILE, STAGES_DIR
+
+# ---------------------------------------------------------------------
+# Content-addressed pipeline DAG
+# ---------------------------------------------------------------------
+# Every node is keyed by a hash of its parameters, the source of the
+# code it runs, the files it reads and the keys of its upstream nodes.
+# A node whose key matches the one recorded in PIPELINE_STATE_FILE, and
+# whose output files are still as it left them, is skipped. The state
+# file is rewritten after every completed node, so a crashed run
+# resumes from the first node that did not finish.
+
+STATE_VERSION = 1
+
+
+def file_signature(path):
+    """
+    Cheap fingerprint of a file (size + mtime); None if it is missing.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _code_fingerprint(code) -> str:
+    digest = hashlib.sha256()
+    for obj in code:
+        if inspect.ismodule(obj):
+            digest.update(Path(inspect.getsourcefile(obj)).read_bytes())
+        else:
+            digest.update(inspect.getsource(obj).encode())
+    return digest.hexdigest()
+
+
+class Node:
+    """
+    One pipeline stage.
+
+    Parameters
+    ----------
+    name : str
+    run : callable
+        run(upstream, **params, **options) -> result, where upstream
+        maps dependency names to their results (loaded from disk on
+        first access when the dependency was skipped).
+    deps : sequence of str
+        Names of upstream nodes.
+    params : dict
+        JSON-serialisable parameters that change the result (part of
+        the key).
+    options : dict
+        Arguments that do not change the result, e.g. worker counts
+        (not part of the key).
+    code : sequence of modules / functions
+        Code whose source is part of the key (run itself is always
+        included).
+    inputs : sequence of Path
+        Files read directly by the node (raw data).
+    outputs : sequence of Path
+        Files the node writes; a skipped node must still find them
+        unchanged.
+    save : callable, optional
+        save(result) -> None, persists the result for later runs.
+    load : callable, optional
+        load() -> result, restores it when the node is skipped.
+    parallel : bool
+        May run on the process pool next to other stages (run must be a
+        module-level function; params, options, upstream results and
+        the result must pickle).
+    cpus : int
+        CPU slots the stage occupies against the scheduler's budget;
+        BLAS / OpenMP threads in the worker are capped to it.
+    """
+
+    def __init__(
+        self,
+        name,
+        run,
+        deps=(),
+        params=None,
+        options=None,
+        code=(),
+        inputs=(),
+        outputs=(),
+        save=None,
+        load=None,
+        parallel=False,
+        cpus=1,
+    ):
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+        self.params = params or {}
+        self.options = options or {}
+        self.code = tuple(code)
+        self.inputs = tuple(Path(p) for p in inputs)
+        self.outputs = tuple(Path(p) for p in outputs)
+        self.save = save
+        self.load = load
+        self.parallel = parallel
+        self.cpus = max(1, int(cpus))
+
+    def key(self, dep_keys) -> str:
+        payload = {
+            "node": self.name,
+            "params": self.params,
+            "code": _code_fingerprint((self.run,) + self.code),
+            "inputs": {str(p): file_signature(p) for p in self.inputs},
+            "deps": dep_keys,
+        }
+        blob = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def stage_path(name: str, suffix: str = ".parquet") -> Path:
+    """
+    Artefact path for a node's cached result.
+    """
+    STAGES_DIR.mkdir(parents=True, exist_ok=True)
+    return STAGES_DIR / f"{name}{suffix}"
+
+
+# ---------------------------------------------------------------------
+# State file
+# ---------------------------------------------------------------------
+
+def _load_state() -> dict:
+    if PIPELINE_STATE_FILE.exists():
+        with open(PIPELINE_STATE_FILE) as f:
+            state = json.load(f)
+        if state.get("version") == STATE_VERSION:
+            return state
+    return {"version": STATE_VERSION, "nodes": {}}
+
+
+def _save_state(state: dict):
+    PIPELINE_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = PIPELINE_STATE_FILE.with_name(PIPELINE_STATE_FILE.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    tmp.replace(PIPELINE_STATE_FILE)
+
+
+def _outputs_intact(record) -> bool:
+    return all(
+        file_signature(path) == sig for path, sig in record.get("outputs", {}).items()
+    )
+
+
+# ---------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------
+
+class _Results:
+    """
+    Node results, loaded lazily for skipped nodes.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.values = {}
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            node = self.nodes[name]
+            if node.load is None:
+                raise KeyError(f"Result of stage '{name}' is not available.")
+            self.values[name] = node.load()
+        return self.values[name]
+
+    def __setitem__(self, name, value):
+        self.values[name] = value
+
+    def __contains__(self, name):
+        return name in self.nodes
+
+
+def topological_order(nodes):
+    """
+    Nodes ordered so that dependencies come first (declaration order
+    is kept where possible).
+    """
+    by_name = {n.name: n for n in nodes}
+    order, done, visiting = [], set(), set()
+
+    def visit(node):
+        if node.name in done:
+            return
+        if node.name in visiting:
+            raise ValueError(f"Cycle in pipeline DAG at stage '{node.name}'.")
+        visiting.add(node.name)
+        for dep in node.deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage '{node.name}' depends on unknown stage '{dep}'.")
+            visit(by_name[dep])
+        visiting.discard(node.name)
+        done.add(node.name)
+        order.append(node)
+
+    for node in nodes:
+        visit(node)
+    return order
+
+
+def _run_node(run, upstream, kwargs, cpus):
+    """
+    Process-pool entry point: run one stage with native thread pools
+    capped to its CPU share.
+    """
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return run(upstream, **kwargs)
+
+    with threadpool_limits(limits=cpus):
+        return run(upstream, **kwargs)
+
+
+def run_dag(nodes, force=(), jobs: int = 1, cpu_budget: int = None):
+    """
+    Run the pipeline DAG, skipping nodes whose key is unchanged.
+
+    Parameters
+    ----------
+    nodes : list of Node
+    force : iterable of str
+        Stage names to re-run regardless of their key ("all" re-runs
+        everything). Downstream stages re-run only if the forced
+        stage's key changes, or if they are forced too.
+    jobs : int
+        Maximum number of parallel stages running at once on a process
+        pool. With jobs=1 every stage runs in this process, in order.
+    cpu_budget : int, optional
+        Total CPU slots shared by running parallel stages (defaults to
+        os.cpu_count()). A stage starts only when its `cpus` fit in
+        what is left, unless nothing else is running.
+
+    Returns
+    -------
+    _Results
+        Mapping of stage name to result (lazily loaded).
+    """
+    order = topological_order(nodes)
+    force = set(force)
+    if "all" in force:
+        force = {n.name for n in order}
+
+    unknown = force - {n.name for n in order}
+    if unknown:
+        raise ValueError(f"Unknown pipeline stage(s): {sorted(unknown)}")
+
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    state = _load_state()
+    results = _Results({n.name: n for n in order})
+
+    # Keys depend only on declarations and inputs, never on results,
+    # so the whole plan is known before anything runs
+    keys, todo = {}, []
+    for node in order:
+        key = node.key({d: keys[d] for d in node.deps})
+        keys[node.name] = key
+        record = state["nodes"].get(node.name)
+
+        if (
+            node.name not in force
+            and record is not None
+            and record.get("key") == key
+            and _outputs_intact(record)
+        ):
+            print(f"\n[DAG] Stage '{node.name}' is up to date; skipped.")
+        else:
+            todo.append(node)
+
+    finished = {n.name for n in order} - {n.name for n in todo}
+
+    def _complete(node, result, started):
+        if node.save is not None:
+            node.save(result)
+        results[node.name] = result
+        finished.add(node.name)
+
+        state["nodes"][node.name] = {
+            "key": keys[node.name],
+            "outputs": {str(p): file_signature(p) for p in node.outputs},
+            "completed": datetime.datetime.now().isoformat(timespec="seconds"),
+            "seconds": round((datetime.datetime.now() - started).total_seconds(), 3),
+        }
+        _save_state(state)
+
+    if jobs <= 1:
+        for node in todo:
+            print(f"\n[DAG] Running stage '{node.name}'...")
+            started = datetime.datetime.now()
+            _complete(node, node.run(results, **node.params, **node.options), started)
+        return results
+
+    # ------------------------------------------------------------------
+    # Concurrent schedule: parallel stages go to the pool as soon as
+    # their dependencies are done and their CPUs fit the budget; other
+    # stages run here, in declaration order, while the pool works.
+    # ------------------------------------------------------------------
+
+    running = {}
+    errors = []
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while todo or running:
+            ready = [
+                n for n in todo
+                if all(d in finished for d in n.deps)
+            ]
+
+            if not errors:
+                for node in [n for n in ready if n.parallel]:
+                    used = sum(n.cpus for n, _ in running.values())
+                    if len(running) >= jobs or (running and used + node.cpus > cpu_budget):
+                        continue
+                    print(f"\n[DAG] Starting stage '{node.name}' ({node.cpus} CPU)...")
+                    upstream = {d: results[d] for d in node.deps}
+                    future = pool.submit(
+                        _run_node,
+                        node.run,
+                        upstream,
+                        {**node.params, **node.options},
+                        node.cpus,
+                    )
+                    running[future] = (node, datetime.datetime.now())
+                    todo.remove(node)
+
+                local = [n for n in ready if not n.parallel]
+                if local:
+                    node = local[0]
+                    todo.remove(node)
+                    print(f"\n[DAG] Running stage '{node.name}'...")
+                    started = datetime.datetime.now()
+                    try:
+                        _complete(node, node.run(results, **node.params, **node.options), started)
+                    except Exception as exc:
+                        errors.append(exc)
+                    continue
+
+            if not running:
+                if errors or todo:
+                    break
+                continue
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                node, started = running.pop(future)
+                try:
+                    _complete(node, future.result(), started)
+                    print(f"[DAG] Stage '{node.name}' finished.")
+                except Exception as exc:
+                    print(f"[DAG] Stage '{node.name}' failed: {exc}")
+                    errors.append(exc)
+
+    if errors:
+        # Stages that finished are recorded; a re-run resumes from here
+        raise errors[0]
+    if todo:
+        raise RuntimeError(f"Unschedulable pipeline stages: {[n.name for n in todo]}")
+
+    return results
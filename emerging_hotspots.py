@@ -0,0 +1,215 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from scipy import sparse, stats
+
+from .crime_cube import CrimeCube
+from .spatial_stats import knn_neighbours
+
+# ---------------------------------------------------------------------
+# Emerging hot spot analysis
+# ---------------------------------------------------------------------
+# Gi* is computed for every cell-month on the space-time cube: a
+# cell-month's neighbours are its KNN cells and itself, in the same
+# month and the `time_window` months before it (the Kronecker product
+# of a temporal band with W + I, applied as two sparse products). A
+# Mann-Kendall test on each cell's Gi* series then separates new,
+# intensifying, persistent, diminishing and sporadic hot spots.
+
+CATEGORIES = [
+    "new",
+    "intensifying",
+    "persistent",
+    "diminishing",
+    "sporadic",
+    "no pattern",
+]
+
+# Share of months a cell must be a hot spot to count as persistent
+PERSISTENT_SHARE = 0.9
+
+
+def _temporal_band(n_months: int, time_window: int) -> sparse.csr_matrix:
+    """
+    (T x T) binary matrix linking month t to months t - window .. t.
+    """
+    offsets = list(range(0, -(time_window + 1), -1))
+    return sparse.diags(
+        [np.ones(n_months - abs(k)) for k in offsets],
+        offsets,
+        shape=(n_months, n_months),
+        format="csr",
+    )
+
+
+def space_time_gi_star(
+    Y: np.ndarray,
+    neighbours: sparse.csr_matrix,
+    time_window: int = 1,
+) -> np.ndarray:
+    """
+    Gi* z-scores for every cell-month with binary space-time weights.
+
+    Parameters
+    ----------
+    Y : array (n_cells, n_months) of counts.
+    neighbours : binary (n x n) CSR KNN matrix (self excluded).
+    time_window : int
+        Previous months included in the neighbourhood.
+
+    Returns
+    -------
+    array (n_cells, n_months); NaN when Y is constant.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    n, t = Y.shape
+    spatial = sparse.csr_matrix(neighbours, dtype=np.float64) + sparse.identity(n, format="csr")
+    band = _temporal_band(t, time_window)
+
+    # sum_j w_ij x_j and sum_j w_ij for the space-time neighbourhood
+    lag = np.asarray((spatial @ Y) @ band.T)
+    weight = np.outer(np.asarray(spatial.sum(axis=1)).ravel(), np.asarray(band.sum(axis=1)).ravel())
+
+    N = Y.size
+    mean = Y.mean()
+    sd = np.sqrt((Y * Y).mean() - mean**2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Binary weights: sum_j w_ij^2 == sum_j w_ij
+        denom = sd * np.sqrt((N * weight - weight**2) / (N - 1))
+        return (lag - mean * weight) / denom
+
+
+def mann_kendall(X: np.ndarray):
+    """
+    Mann-Kendall trend test along the rows of X (with tie correction).
+
+    Returns
+    -------
+    (S, z, p) arrays of length n_rows; p is two-sided.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    n_rows, t = X.shape
+
+    S = np.zeros(n_rows)
+    for lag in range(1, t):
+        S += np.sign(X[:, lag:] - X[:, :-lag]).sum(axis=1)
+
+    # Tied groups within each row: sum of c(c - 1)(2c + 5)
+    ordered = np.sort(X, axis=1)
+    starts = np.ones_like(ordered, dtype=bool)
+    starts[:, 1:] = np.diff(ordered, axis=1) != 0
+    group = np.cumsum(starts.ravel()) - 1
+    sizes = np.bincount(group).astype(np.float64)
+    group_row = np.repeat(np.arange(n_rows), t)[starts.ravel()]
+    ties = np.bincount(
+        group_row, weights=sizes * (sizes - 1) * (2 * sizes + 5), minlength=n_rows
+    )
+
+    var = (t * (t - 1) * (2 * t + 5) - ties) / 18.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(var > 0, (S - np.sign(S)) / np.sqrt(var), 0.0)
+    return S, z, 2.0 * stats.norm.sf(np.abs(z))
+
+
+def classify_hotspots(gi_z: np.ndarray, alpha: float = 0.05):
+    """
+    Emerging hot spot category of each cell from its Gi* series.
+
+    new           hot in the final month only, never before
+    intensifying  hot in >= 90% of months including the final one,
+                  with a significant upward trend in Gi*
+    persistent    as intensifying, with no significant trend
+    diminishing   as intensifying, with a significant downward trend
+    sporadic      hot in the final month and on and off before
+    no pattern    anything else
+
+    Returns
+    -------
+    DataFrame with category, hot_months, final_z, trend_z, trend_p.
+    """
+    z_crit = stats.norm.isf(alpha / 2)
+    hot = np.nan_to_num(gi_z, nan=0.0) >= z_crit
+    n_months = gi_z.shape[1]
+
+    hot_months = hot.sum(axis=1)
+    final_hot = hot[:, -1]
+    earlier_hot = hot[:, :-1].any(axis=1)
+
+    _, trend_z, trend_p = mann_kendall(np.nan_to_num(gi_z, nan=0.0))
+    trend = np.where(trend_p < alpha, np.sign(trend_z), 0)
+
+    persistent = final_hot & (hot_months >= PERSISTENT_SHARE * n_months)
+    category = np.select(
+        [
+            final_hot & ~earlier_hot,
+            persistent & (trend > 0),
+            persistent & (trend == 0),
+            persistent & (trend < 0),
+            final_hot,
+        ],
+        CATEGORIES[:5],
+        default="no pattern",
+    )
+
+    return pd.DataFrame(
+        {
+            "category": pd.Categorical(category, categories=CATEGORIES),
+            "hot_months": hot_months,
+            "final_z": gi_z[:, -1],
+            "trend_z": trend_z,
+            "trend_p": trend_p,
+        }
+    )
+
+
+def emerging_hotspots(
+    gdf: gpd.GeoDataFrame,
+    cube: CrimeCube,
+    k: int = 8,
+    time_window: int = 1,
+    alpha: float = 0.05,
+):
+    """
+    Emerging hot spot analysis over the monthly cube.
+
+    Parameters
+    ----------
+    gdf : GeoDataFrame of grid cells (with cell_id).
+    cube : CrimeCube
+    k : int
+        Spatial neighbours per cell.
+    time_window : int
+        Previous months in each cell-month's neighbourhood.
+    alpha : float
+        Significance level for hot months and trends.
+
+    Returns
+    -------
+    (cells, cell_months)
+    cells       — cell_id plus the classify_hotspots() columns
+    cell_months — long table: cell_id, month, crime_count, gi_star
+    """
+    cell_ids = gdf["cell_id"].values
+    months = cube.axis_labels("month")
+
+    counts = cube.sum(("hour", "dow", "primary_type"))
+    rows = pd.Index(cube.cell_ids).get_indexer(cell_ids)
+    Y = np.zeros((len(cell_ids), len(months)), dtype=np.float64)
+    Y[rows >= 0] = counts[rows[rows >= 0]]
+
+    csr, _ = knn_neighbours(gdf, k=k)
+    gi_z = space_time_gi_star(Y, csr, time_window=time_window)
+
+    cells = classify_hotspots(gi_z, alpha=alpha)
+    cells.insert(0, "cell_id", cell_ids)
+
+    cell_months = pd.DataFrame(
+        {
+            "cell_id": np.repeat(cell_ids, len(months)),
+            "month": np.tile(np.asarray(months, dtype=object), len(cell_ids)),
+            "crime_count": Y.ravel().astype(np.int64),
+            "gi_star": gi_z.ravel().astype(np.float32),
+        }
+    )
+    return cells, cell_months
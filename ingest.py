@@ -0,0 +1,314 @@
+import datetime
+import json
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .load_data import (
+    CRIME_STORE_COLUMNS,
+    CRIME_STORE_MANIFEST,
+    CRIME_STORE_VERSION,
+    CRIME_RAW_COLUMNS,
+    _csv_signature,
+    crime_store_is_current,
+    iter_crime_csv,
+    project_lonlat,
+    read_crime_store_manifest,
+    update_watermark,
+)
+from .crime_cube import MONTH_BASE_YEAR
+from .config import CRIME_CSV, CRIME_STORE_DIR
+
+STORE_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("date", pa.timestamp("ns")),
+        ("updated_on", pa.timestamp("ns")),
+        ("primary_type", pa.string()),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("month", pa.string()),
+        ("hour", pa.int8()),
+        ("dow", pa.int8()),
+        ("x", pa.float64()),
+        ("y", pa.float64()),
+    ]
+)
+
+# Hive partition keys (directory names, not stored in the files)
+PARTITION_KEYS = ["year", "month_num"]
+
+# Rows buffered per partition before a row group is written, and the
+# total buffered across partitions before everything is flushed
+ROW_GROUP_ROWS = 64_000
+MAX_BUFFERED_ROWS = 2_000_000
+
+
+# ---------------------------------------------------------------------
+# CSV -> store chunks
+# ---------------------------------------------------------------------
+
+def _iter_store_chunks(chunksize: int, since=None):
+    """
+    Parse the raw CSV once, project coordinates and yield DataFrames
+    holding the store columns plus partition keys.
+    """
+    for i, chunk in enumerate(
+        iter_crime_csv(chunksize=chunksize, columns=CRIME_RAW_COLUMNS, since=since),
+        start=1,
+    ):
+        chunk["x"], chunk["y"] = project_lonlat(
+            chunk["longitude"].values, chunk["latitude"].values
+        )
+        chunk["year"] = chunk["month_code"] // 12 + MONTH_BASE_YEAR
+        chunk["month_num"] = chunk["month_code"] % 12 + 1
+
+        print(f"[INGEST] Chunk {i} parsed ({len(chunk)} rows)")
+
+        yield chunk[STORE_SCHEMA.names + PARTITION_KEYS]
+
+
+class _PartitionWriter:
+    """
+    One Parquet file per (year, month_num) partition, written from the
+    main thread with per-partition buffering so row groups stay large.
+    Tracks the watermark of everything written.
+    """
+
+    def __init__(self, base_dir, file_name="part-0.parquet"):
+        self.base_dir = base_dir
+        self.file_name = file_name
+        self.writers = {}
+        self.buffers = {}
+        self.n_buffered = 0
+        self.n_rows = 0
+        self.watermark = None
+
+    def add(self, chunk: pd.DataFrame):
+        self.watermark = update_watermark(
+            self.watermark, chunk["id"].values, chunk["updated_on"].values
+        )
+        for key, part in chunk.groupby(PARTITION_KEYS, sort=False):
+            table = pa.Table.from_pandas(
+                part[STORE_SCHEMA.names],
+                schema=STORE_SCHEMA,
+                preserve_index=False,
+            )
+            self.buffers.setdefault(key, []).append(table)
+            self.n_buffered += table.num_rows
+            self.n_rows += table.num_rows
+
+            if sum(t.num_rows for t in self.buffers[key]) >= ROW_GROUP_ROWS:
+                self._flush(key)
+
+        if self.n_buffered >= MAX_BUFFERED_ROWS:
+            for key in list(self.buffers):
+                self._flush(key)
+
+    def _flush(self, key):
+        tables = self.buffers.pop(key, None)
+        if not tables:
+            return
+
+        writer = self.writers.get(key)
+        if writer is None:
+            year, month_num = key
+            path = (
+                self.base_dir
+                / f"year={int(year)}"
+                / f"month_num={int(month_num)}"
+                / self.file_name
+            )
+            path.parent.mkdir(parents=True, exist_ok=True)
+            writer = pq.ParquetWriter(path, STORE_SCHEMA)
+            self.writers[key] = writer
+
+        table = pa.concat_tables(tables)
+        writer.write_table(table, row_group_size=table.num_rows)
+        self.n_buffered -= table.num_rows
+
+    def close(self):
+        for key in list(self.buffers):
+            self._flush(key)
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+# ---------------------------------------------------------------------
+# One-time ingest
+# ---------------------------------------------------------------------
+
+def build_crime_store(chunksize: int = 500_000):
+    """
+    Convert the raw crimes CSV into a Parquet dataset partitioned by
+    year / month_num, keeping only the columns the pipeline uses.
+
+    The store is written to a temporary directory and swapped in once
+    complete, so an interrupted ingest never leaves a partial store.
+    """
+    if not CRIME_CSV.exists():
+        raise FileNotFoundError(f"Raw crime CSV not found: {CRIME_CSV}")
+
+    source = _csv_signature()
+    tmp_dir = CRIME_STORE_DIR.with_name(CRIME_STORE_DIR.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    print(f"\n[INGEST] Converting {CRIME_CSV} to Parquet store...")
+
+    writer = _PartitionWriter(tmp_dir)
+    try:
+        for chunk in _iter_store_chunks(chunksize):
+            writer.add(chunk)
+    finally:
+        writer.close()
+
+    manifest = {
+        "version": CRIME_STORE_VERSION,
+        "source": source,
+        "rows": writer.n_rows,
+        "columns": CRIME_STORE_COLUMNS,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "watermark": writer.watermark,
+        "appends": 0,
+    }
+    _write_manifest(tmp_dir, manifest)
+
+    shutil.rmtree(CRIME_STORE_DIR, ignore_errors=True)
+    tmp_dir.rename(CRIME_STORE_DIR)
+
+    print(f"[INGEST] Wrote {writer.n_rows} rows to: {CRIME_STORE_DIR}")
+    return CRIME_STORE_DIR
+
+
+def _write_manifest(base_dir, manifest):
+    with open(base_dir / CRIME_STORE_MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+# ---------------------------------------------------------------------
+# Incremental append
+# ---------------------------------------------------------------------
+
+def _drop_store_ids(ids) -> int:
+    """
+    Remove the stored versions of `ids` by rewriting only the
+    partitions that hold them. Returns the number of rows removed.
+    """
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    if len(ids) == 0:
+        return 0
+
+    id_set = pa.array(ids, type=pa.int64())
+    dataset = ds.dataset(CRIME_STORE_DIR, format="parquet", partitioning="hive")
+    hits = dataset.to_table(
+        columns=PARTITION_KEYS, filter=ds.field("id").isin(id_set)
+    ).to_pandas()
+
+    removed = 0
+    for year, month_num in hits.drop_duplicates().itertuples(index=False):
+        part_dir = CRIME_STORE_DIR / f"year={int(year)}" / f"month_num={int(month_num)}"
+        files = sorted(part_dir.glob("*.parquet"))
+        table = pa.concat_tables([pq.read_table(p, schema=STORE_SCHEMA) for p in files])
+        keep = pc.invert(pc.is_in(table["id"], value_set=id_set))
+        kept = table.filter(keep)
+        removed += table.num_rows - kept.num_rows
+
+        # Compact the partition into a single file
+        tmp = part_dir / "part-0.parquet.tmp"
+        pq.write_table(kept, tmp)
+        for p in files:
+            p.unlink()
+        tmp.rename(part_dir / "part-0.parquet")
+
+    return removed
+
+
+def update_crime_store(chunksize: int = 500_000):
+    """
+    Bring the Parquet store up to date with a grown CSV without
+    rebuilding it.
+
+    Only rows past the manifest watermark are parsed and projected:
+    new IDs are appended as extra files in their partitions, and for
+    late updates of existing IDs the superseded rows are removed from
+    the partitions that held them. Falls back to a full build when the
+    store has no watermark.
+    """
+    manifest = read_crime_store_manifest()
+    if (
+        manifest is None
+        or manifest.get("version") != CRIME_STORE_VERSION
+        or not manifest.get("watermark")
+    ):
+        return build_crime_store(chunksize=chunksize)
+
+    since = manifest["watermark"]
+    source = _csv_signature()
+    print(
+        f"\n[INGEST] Appending rows newer than id {since['max_id']} / "
+        f"updated {since['updated_on']} to the Parquet store..."
+    )
+
+    delta = [chunk for chunk in _iter_store_chunks(chunksize, since=since)]
+    delta = pd.concat(delta, ignore_index=True) if delta else None
+
+    added = removed = 0
+    if delta is not None and len(delta):
+        # Keep the latest version of any ID seen more than once
+        delta = (
+            delta.sort_values("updated_on", kind="stable")
+            .drop_duplicates("id", keep="last")
+            .reset_index(drop=True)
+        )
+        removed = _drop_store_ids(delta["id"].values)
+
+        appends = manifest.get("appends", 0) + 1
+        writer = _PartitionWriter(CRIME_STORE_DIR, file_name=f"part-{appends}.parquet")
+        try:
+            writer.add(delta)
+        finally:
+            writer.close()
+
+        added = writer.n_rows
+        manifest["appends"] = appends
+        manifest["watermark"] = update_watermark(
+            since, delta["id"].values, delta["updated_on"].values
+        )
+
+    manifest["rows"] = manifest.get("rows", 0) - removed + added
+    manifest["source"] = source
+    manifest["updated"] = datetime.datetime.now().isoformat(timespec="seconds")
+    _write_manifest(CRIME_STORE_DIR, manifest)
+
+    print(
+        f"[INGEST] Appended {added} rows ({removed} superseded versions replaced); "
+        f"store now holds {manifest['rows']} rows."
+    )
+    return CRIME_STORE_DIR
+
+
+def ensure_crime_store(
+    chunksize: int = 500_000,
+    force: bool = False,
+    incremental: bool = False,
+):
+    """
+    Build the Parquet store only if it is missing or out of date.
+
+    With incremental=True an out-of-date store is appended to
+    (update_crime_store()) instead of rebuilt.
+    """
+    if not force and crime_store_is_current():
+        print(f"[INGEST] Parquet store is up to date: {CRIME_STORE_DIR}")
+        return CRIME_STORE_DIR
+
+    if incremental and not force:
+        return update_crime_store(chunksize=chunksize)
+
+    return build_crime_store(chunksize=chunksize)
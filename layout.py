@@ -33,6 +33,7 @@ def build_sidebar(crime_types):
                     {"label": "GWR", "value": "pred_gwr"},
                     {"label": "Hotspot (Gi*)", "value": "hotspot"},
                     {"label": "KDE intensity", "value": "kde"},
+                    {"label": "Forecast change (next month)", "value": "forecast_change"},
                 ],
                 value="observed",
             ),
@@ -66,6 +67,14 @@ def build_sidebar(crime_types):
                 value=12,
                 marks={h: str(h) for h in range(0, 24, 3)},
             ),
+
+            # All hours (static map); the animation uses the slider hour
+
+            dcc.Checklist(
+                id="all-hours",
+                options=[{"label": "All hours", "value": "all"}],
+                value=["all"],
+            ),
             html.Br(),
 
             # Day-of-week selector
@@ -94,6 +103,16 @@ def build_sidebar(crime_types):
                 options=[{"label": "Animate monthly counts", "value": "animate"}],
                 value=[],
             ),
+
+            # Client-side recolouring: geometry is sent once, later
+            # changes only send per-cell values
+
+            dcc.Checklist(
+                id="client-recolour",
+                options=[{"label": "Fast recolouring (keep map geometry)", "value": "client"}],
+                value=["client"],
+            ),
+            dcc.Store(id="map-values"),
             html.Br(),
 
             # Downloads
@@ -1,62 +1,597 @@
+import functools
+import json
+
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 
+from .crime_cube import MONTH_BASE_YEAR, month_labels
 from .config import (
     CRIME_CSV,
+    CRIME_STORE_DIR,
     STREETLIGHT_CSV,
     CTA_BUS_SHP,
     CITY_LIMITS_SHP,
     DEFAULT_CRS,
 )
 
+# Bump when the layout or derived columns of the Parquet store change
+CRIME_STORE_VERSION = 2
+
+CRIME_STORE_MANIFEST = "_manifest.json"
+
+# Columns kept in the Parquet store (standardised names)
+CRIME_STORE_COLUMNS = [
+    "id",
+    "date",
+    "updated_on",
+    "primary_type",
+    "latitude",
+    "longitude",
+    "month",
+    "hour",
+    "dow",
+    "x",
+    "y",
+]
+
+CRIME_DATE_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+
+
+# ---------------------------------------------------------------------
+# Column names
+# ---------------------------------------------------------------------
+
+def _standardise_columns(columns):
+    return (
+        pd.Index(columns)
+        .str.strip()
+        .str.lower()
+        .str.replace(" ", "_")
+    )
+
+
 # ---------------------------------------------------------------------
-# Chunked crime data loader (critical for large CSVs)
+# Temporal scope
 # ---------------------------------------------------------------------
 
-def iter_crime_chunks(chunksize: int = 500_000):
+def resolve_temporal_scope(year=None, start=None, end=None, months=None):
     """
-    Yield crime data in chunks as GeoDataFrames.
+    Resolve CLI-style temporal options into a half-open date range.
+
+    Parameters
+    ----------
+    year : int, optional
+        Restrict to one calendar year.
+    start, end : str or Timestamp, optional
+        First and last day to include (both inclusive).
+    months : int, optional
+        Keep only the trailing N calendar months of the range. Without
+        an end bound the window ends with the current month.
+
+    Returns
+    -------
+    dict with keys "start" and "end" (Timestamps, end exclusive, None
+    when unbounded). An empty scope means the full history.
+    """
+    lo = pd.Timestamp(start).normalize() if start is not None else None
+    hi = (
+        pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+        if end is not None
+        else None
+    )
+
+    if year is not None:
+        y_lo = pd.Timestamp(year=int(year), month=1, day=1)
+        y_hi = pd.Timestamp(year=int(year) + 1, month=1, day=1)
+        lo = y_lo if lo is None else max(lo, y_lo)
+        hi = y_hi if hi is None else min(hi, y_hi)
+
+    if months is not None:
+        anchor = hi if hi is not None else pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+        # Trailing whole months, up to and including the anchor's month
+        m_hi = (anchor - pd.Timedelta(days=1)).to_period("M").to_timestamp() + pd.offsets.MonthBegin(1)
+        m_lo = m_hi - pd.offsets.MonthBegin(int(months))
+        lo = m_lo if lo is None else max(lo, m_lo)
+        hi = m_hi if hi is None else min(hi, m_hi)
+
+    if lo is not None and hi is not None and lo >= hi:
+        raise ValueError(f"Empty temporal scope: start {lo.date()} >= end {hi.date()}.")
+
+    return {"start": lo, "end": hi}
+
+
+def scope_to_dict(scope) -> dict:
+    """
+    JSON-friendly representation of a temporal scope.
+    """
+    scope = scope or {}
+    return {
+        k: (scope[k].isoformat() if scope.get(k) is not None else None)
+        for k in ("start", "end")
+    }
+
+
+def scope_from_dict(record) -> dict:
+    """
+    Inverse of scope_to_dict().
+    """
+    record = record or {}
+    return {
+        k: (pd.Timestamp(record[k]) if record.get(k) is not None else None)
+        for k in ("start", "end")
+    }
+
+
+def _scope_is_bounded(scope) -> bool:
+    return bool(scope) and (
+        scope.get("start") is not None or scope.get("end") is not None
+    )
+
+
+def _scope_mask(dates: pd.Series, scope) -> pd.Series:
+    mask = pd.Series(True, index=dates.index)
+    if scope.get("start") is not None:
+        mask &= dates >= scope["start"]
+    if scope.get("end") is not None:
+        mask &= dates < scope["end"]
+    return mask
+
+
+def _scope_years(scope):
+    """
+    Inclusive (first_year, last_year) covered by a scope; None = open.
+    """
+    first = scope["start"].year if scope.get("start") is not None else None
+    last = (
+        (scope["end"] - pd.Timedelta(1, "ns")).year
+        if scope.get("end") is not None
+        else None
+    )
+    return first, last
+
+
+def _scope_store_filter(scope):
+    """
+    pyarrow expression for a scope: partition bounds on year/month_num
+    (directory pruning) plus an exact predicate on date (row-group
+    statistics).
+    """
+    import pyarrow.dataset as ds
+
+    year, month_num, date = ds.field("year"), ds.field("month_num"), ds.field("date")
+    expr = None
+
+    def _and(a, b):
+        return b if a is None else a & b
+
+    if scope.get("start") is not None:
+        lo = scope["start"]
+        expr = _and(expr, (year > lo.year) | ((year == lo.year) & (month_num >= lo.month)))
+        expr = _and(expr, date >= lo)
+
+    if scope.get("end") is not None:
+        last = scope["end"] - pd.Timedelta(1, "ns")
+        expr = _and(expr, (year < last.year) | ((year == last.year) & (month_num <= last.month)))
+        expr = _and(expr, date < scope["end"])
+
+    return expr
+
+
+# ---------------------------------------------------------------------
+# Watermark (incremental refresh)
+# ---------------------------------------------------------------------
+# A watermark records the highest incident ID and the latest
+# "Updated On" timestamp processed. Rows newer than either are the
+# delta of the next refresh: new IDs are appended records, older IDs
+# with a newer Updated On are late corrections of existing records.
+
+def merge_watermarks(*watermarks) -> dict:
+    """
+    Combine watermarks (None entries are skipped).
+    """
+    ids = [w["max_id"] for w in watermarks if w and w.get("max_id") is not None]
+    stamps = [
+        pd.Timestamp(w["updated_on"])
+        for w in watermarks
+        if w and w.get("updated_on") is not None
+    ]
+    return {
+        "max_id": int(max(ids)) if ids else None,
+        "updated_on": max(stamps).isoformat() if stamps else None,
+    }
+
+
+def update_watermark(watermark, ids, updated_on) -> dict:
+    """
+    Advance a watermark (None = empty) over a batch of rows.
+    """
+    ids = np.asarray(ids)
+    updated_on = np.asarray(updated_on, dtype="datetime64[ns]")
+    updated_on = updated_on[~np.isnat(updated_on)]
+
+    batch = {
+        "max_id": int(ids.max()) if len(ids) else None,
+        "updated_on": pd.Timestamp(updated_on.max()).isoformat() if len(updated_on) else None,
+    }
+    return merge_watermarks(watermark, batch)
+
+
+def _since_mask(ids, updated_on, since) -> np.ndarray:
+    """
+    True for rows newer than the watermark `since`.
+    """
+    ids = np.asarray(ids)
+    mask = np.zeros(len(ids), dtype=bool)
+    if since.get("max_id") is not None:
+        mask |= ids > since["max_id"]
+    else:
+        mask[:] = True
+    if since.get("updated_on") is not None:
+        mask |= np.asarray(updated_on, dtype="datetime64[ns]") > np.datetime64(
+            pd.Timestamp(since["updated_on"]).to_datetime64(), "ns"
+        )
+    return mask
+
+
+def _since_store_filter(since):
+    import pyarrow.dataset as ds
+
+    expr = None
+    if since.get("max_id") is not None:
+        expr = ds.field("id") > since["max_id"]
+    if since.get("updated_on") is not None:
+        newer = ds.field("updated_on") > pd.Timestamp(since["updated_on"])
+        expr = newer if expr is None else expr | newer
+    return expr
+
+
+# ---------------------------------------------------------------------
+# Vectorised timestamp / coordinate helpers
+# ---------------------------------------------------------------------
+
+_NAT = np.datetime64("NaT", "ns")
+
 
-    Designed for very large CSVs (8+ million rows).
-    Keeps memory usage bounded.
+def parse_crime_dates(values) -> np.ndarray:
     """
+    Parse Chicago timestamps to datetime64[ns].
+
+    Extracts repeat the same timestamp strings heavily, so each
+    distinct string is parsed once and the result broadcast back.
+    Unparseable or missing values become NaT.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    parsed = pd.to_datetime(
+        pd.Index(uniques, dtype=object),
+        format=CRIME_DATE_FORMAT,
+        errors="coerce",
+    ).values.astype("datetime64[ns]")
+    return np.append(parsed, _NAT)[codes]
+
+
+def time_parts(dates):
+    """
+    Integer month code, hour and day of week (Monday = 0) for an array
+    of datetime64 values (no NaT).
+    """
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    days = dates.astype("datetime64[D]")
+
+    months = dates.astype("datetime64[M]").astype(np.int64) + (1970 - MONTH_BASE_YEAR) * 12
+    hour = ((dates - days) // np.timedelta64(1, "h")).astype(np.int8)
+    # 1970-01-01 was a Thursday
+    dow = ((days.astype(np.int64) + 3) % 7).astype(np.int8)
+
+    return months, hour, dow
+
+
+def month_code_labels(codes) -> np.ndarray:
+    """
+    "YYYY-MM" labels for an array of month codes (one conversion per
+    distinct month).
+    """
+    idx, uniq = pd.factorize(np.asarray(codes))
+    return month_labels(uniq)[idx]
+
+
+@functools.lru_cache(maxsize=None)
+def _lonlat_transformer():
+    from pyproj import Transformer
+
+    return Transformer.from_crs("EPSG:4326", f"EPSG:{DEFAULT_CRS}", always_xy=True)
+
+
+def project_lonlat(lon, lat):
+    """
+    Project WGS84 lon/lat arrays to DEFAULT_CRS x/y float64 arrays
+    without building geometry objects.
+    """
+    x, y = _lonlat_transformer().transform(
+        np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    )
+    return np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+
+
+# ---------------------------------------------------------------------
+# Shared CSV helpers
+# ---------------------------------------------------------------------
+
+def _prepare_crime_chunk(chunk: pd.DataFrame, scope=None, since=None) -> pd.DataFrame:
+    """
+    Standardise names, parse timestamps, drop unusable records and
+    derive month / hour / dow.
+    """
+    chunk.columns = _standardise_columns(chunk.columns)
+
+    if "updated_on" in chunk.columns:
+        chunk["updated_on"] = parse_crime_dates(chunk["updated_on"].values)
+
+    # Incremental refresh: keep only rows past the watermark
+    if since is not None:
+        chunk = chunk.loc[
+            _since_mask(chunk["id"].values, chunk["updated_on"].values, since)
+        ].copy()
+
+    # Cheap pre-filter on the integer Year column before date parsing
+    if _scope_is_bounded(scope) and "year" in chunk.columns:
+        first, last = _scope_years(scope)
+        years = pd.to_numeric(chunk["year"], errors="coerce")
+        keep = years.notna()
+        if first is not None:
+            keep &= years >= first
+        if last is not None:
+            keep &= years <= last
+        chunk = chunk.loc[keep].copy()
+
+    # Parse timestamps (Chicago crime format)
+    chunk["date"] = parse_crime_dates(chunk["date"].values)
+
+    # Drop unusable records early
+    chunk = chunk.dropna(subset=["date", "latitude", "longitude"])
+
+    if _scope_is_bounded(scope):
+        chunk = chunk.loc[_scope_mask(chunk["date"], scope)]
+
+    # Temporal components (assign: the filters above return slices)
+    months, hour, dow = time_parts(chunk["date"].values)
+    return chunk.assign(
+        month_code=months,
+        month=month_code_labels(months),
+        hour=hour,
+        dow=dow,
+    )
+
+
+def iter_crime_csv(chunksize: int = 500_000, columns=None, scope=None, since=None):
+    """
+    Yield prepared (non-geometric) chunks straight from the raw CSV.
+
+    Parameters
+    ----------
+    columns : list of str, optional
+        Standardised column names to read. Reading only what is needed
+        avoids parsing the ~20 unused text columns of the extract.
+    scope : dict, optional
+        Temporal scope from resolve_temporal_scope(). Rows outside it
+        are dropped using the Year column before dates are parsed.
+    since : dict, optional
+        Watermark (see update_watermark()); only newer rows are kept.
+    """
+    usecols = None
+    dtype = None
+
+    if columns is not None:
+        header = pd.read_csv(CRIME_CSV, nrows=0).columns
+        raw_names = dict(zip(_standardise_columns(header), header))
+        wanted = list(columns)
+        if _scope_is_bounded(scope) and "year" not in wanted:
+            wanted.append("year")
+        usecols = [raw_names[c] for c in wanted if c in raw_names]
+        dtype = {
+            raw_names[c]: t
+            for c, t in [
+                ("id", "int64"),
+                ("date", str),
+                ("updated_on", str),
+                ("primary_type", "category"),
+                ("latitude", "float64"),
+                ("longitude", "float64"),
+            ]
+            if c in raw_names
+        }
+
     for chunk in pd.read_csv(
         CRIME_CSV,
         chunksize=chunksize,
+        usecols=usecols,
+        dtype=dtype,
         low_memory=False,
     ):
-        # Standardise column names
-        chunk.columns = (
-            chunk.columns
-            .str.strip()
-            .str.lower()
-            .str.replace(" ", "_")
-        )
+        chunk = _prepare_crime_chunk(chunk, scope=scope, since=since)
+        if len(chunk):
+            yield chunk
 
 
-        # Parse timestamps (Chicago crime format)
-        chunk["date"] = pd.to_datetime(
-            chunk["date"],
-            format="%m/%d/%Y %I:%M:%S %p",
-            errors="coerce",
-        )
+# ---------------------------------------------------------------------
+# Parquet crime store (written once by src.ingest)
+# ---------------------------------------------------------------------
 
-        # Drop unusable records early
-        chunk = chunk.dropna(subset=["date", "latitude", "longitude"])
+def _csv_signature():
+    stat = CRIME_CSV.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
 
-        # Temporal components
-        chunk["month"] = chunk["date"].dt.to_period("M").astype(str)
-        chunk["hour"] = chunk["date"].dt.hour
-        chunk["dow"] = chunk["date"].dt.dayofweek
 
-        # Convert to GeoDataFrame (WGS84 → projected)
-        gdf = gpd.GeoDataFrame(
-            chunk,
-            geometry=gpd.points_from_xy(chunk["longitude"], chunk["latitude"]),
-            crs="EPSG:4326",
-        ).to_crs(epsg=DEFAULT_CRS)
+def read_crime_store_manifest():
+    path = CRIME_STORE_DIR / CRIME_STORE_MANIFEST
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def crime_store_is_current() -> bool:
+    """
+    True when the Parquet store exists, matches the current store
+    layout and was built from the CSV as it is now on disk.
+    """
+    manifest = read_crime_store_manifest()
+    if manifest is None:
+        return False
+    if manifest.get("version") != CRIME_STORE_VERSION:
+        return False
+    if not CRIME_CSV.exists():
+        # Store is all we have
+        return True
+    return manifest.get("source") == _csv_signature()
+
+
+def iter_crime_store(chunksize: int = 500_000, columns=None, scope=None, since=None):
+    """
+    Yield DataFrames of roughly `chunksize` rows from the Parquet store.
+
+    A temporal scope is pushed down to the dataset scan: partitions
+    outside it are never opened and row groups are skipped on their
+    date statistics. A watermark (`since`) is pushed down the same way
+    on the id / updated_on statistics.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(CRIME_STORE_DIR, format="parquet", partitioning="hive")
+    columns = columns or CRIME_STORE_COLUMNS
+    expr = _scope_store_filter(scope) if _scope_is_bounded(scope) else None
+    if since is not None:
+        newer = _since_store_filter(since)
+        if newer is not None:
+            expr = newer if expr is None else expr & newer
+
+    buffered, n_buffered = [], 0
+
+    def _to_pandas(batches):
+        # Strings come back as categoricals (codes + a few labels)
+        return pa.Table.from_batches(batches).to_pandas(strings_to_categorical=True)
+
+    for batch in dataset.to_batches(
+        columns=columns, filter=expr, batch_size=chunksize
+    ):
+        if batch.num_rows == 0:
+            continue
+        buffered.append(batch)
+        n_buffered += batch.num_rows
+
+        if n_buffered >= chunksize:
+            yield _to_pandas(buffered)
+            buffered, n_buffered = [], 0
+
+    if buffered:
+        yield _to_pandas(buffered)
 
-        yield gdf
+
+# ---------------------------------------------------------------------
+# Chunked crime data loaders (critical for large CSVs)
+# ---------------------------------------------------------------------
+
+# Raw CSV columns needed to build crime arrays
+CRIME_RAW_COLUMNS = ["id", "date", "updated_on", "primary_type", "latitude", "longitude"]
+
+
+def iter_crime_arrays(chunksize: int = 500_000, scope=None, since=None):
+    """
+    Yield crime chunks as plain arrays ("array mode").
+
+    Reads the partitioned Parquet store when it is up to date and falls
+    back to parsing the raw CSV otherwise. No geometry objects are
+    created: CSV coordinates are projected with a cached pyproj
+    Transformer straight into float arrays.
+
+    Parameters
+    ----------
+    scope : dict, optional
+        Temporal scope from resolve_temporal_scope(); filtering happens
+        at read time.
+    since : dict, optional
+        Watermark from a previous run; only newer or updated rows are
+        read.
+
+    Yields
+    ------
+    dict with
+        id           : int64 incident IDs
+        date         : datetime64[ns]
+        updated_on   : datetime64[ns]
+        x, y         : float64 projected coordinates (DEFAULT_CRS)
+        month        : int64 month codes (see crime_cube.month_code)
+        hour, dow    : int8
+        primary_type : pandas Categorical
+    """
+    if crime_store_is_current():
+        chunks = iter_crime_store(
+            chunksize=chunksize,
+            columns=["id", "date", "updated_on", "primary_type", "x", "y", "hour", "dow"],
+            scope=scope,
+            since=since,
+        )
+        for chunk in chunks:
+            dates = chunk["date"].values.astype("datetime64[ns]")
+            months, _, _ = time_parts(dates)
+            yield {
+                "id": chunk["id"].values.astype(np.int64),
+                "date": dates,
+                "updated_on": chunk["updated_on"].values.astype("datetime64[ns]"),
+                "x": chunk["x"].values,
+                "y": chunk["y"].values,
+                "month": months,
+                "hour": chunk["hour"].values.astype(np.int8),
+                "dow": chunk["dow"].values.astype(np.int8),
+                "primary_type": pd.Categorical(chunk["primary_type"]),
+            }
+        return
+
+    for chunk in iter_crime_csv(
+        chunksize=chunksize, columns=CRIME_RAW_COLUMNS, scope=scope, since=since
+    ):
+        x, y = project_lonlat(chunk["longitude"].values, chunk["latitude"].values)
+        yield {
+            "id": chunk["id"].values.astype(np.int64),
+            "date": chunk["date"].values.astype("datetime64[ns]"),
+            "updated_on": chunk["updated_on"].values.astype("datetime64[ns]"),
+            "x": x,
+            "y": y,
+            "month": chunk["month_code"].values,
+            "hour": chunk["hour"].values,
+            "dow": chunk["dow"].values,
+            "primary_type": pd.Categorical(chunk["primary_type"]),
+        }
+
+
+def iter_crime_chunks(chunksize: int = 500_000, scope=None):
+    """
+    Yield crime data in chunks as GeoDataFrames.
+
+    Built on iter_crime_arrays(); use that directly when point
+    geometries are not needed. Designed for very large extracts
+    (8+ million rows); keeps memory usage bounded.
+    """
+    for arrays in iter_crime_arrays(chunksize=chunksize, scope=scope):
+        chunk = pd.DataFrame(
+            {
+                "id": arrays["id"],
+                "date": arrays["date"],
+                "updated_on": arrays["updated_on"],
+                "primary_type": arrays["primary_type"],
+                "month": month_code_labels(arrays["month"]),
+                "hour": arrays["hour"],
+                "dow": arrays["dow"],
+                "x": arrays["x"],
+                "y": arrays["y"],
+            }
+        )
+        yield gpd.GeoDataFrame(
+            chunk,
+            geometry=gpd.points_from_xy(arrays["x"], arrays["y"]),
+            crs=f"EPSG:{DEFAULT_CRS}",
+        )
 
 
 # ---------------------------------------------------------------------
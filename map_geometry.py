@@ -0,0 +1,151 @@
+import hashlib
+import json
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from .config import GEOJSON_DIR
+
+# ---------------------------------------------------------------------
+# Pre-serialised map geometry
+# ---------------------------------------------------------------------
+# The dashboard draws the same hexes on every map, so their GeoJSON is
+# built once per detail level: simplified in the projected CRS (shared
+# edges kept by coverage simplification where shapely supports it),
+# reprojected to WGS84 and rounded to a precision that matches the
+# tolerance. Features are keyed by cell_id. The encoded bytes are
+# written next to a manifest holding a hash of the source geometry, so
+# a stale cache is detected and rebuilt.
+
+# Level -> (simplification tolerance in metres, decimal places)
+GEOJSON_LEVELS = {
+    "full": (0.0, 6),
+    "medium": (10.0, 5),
+    "coarse": (50.0, 4),
+}
+
+# Coarsest level that still looks exact at a given map zoom
+GEOJSON_ZOOM_LEVELS = [(12, "full"), (10, "medium"), (0, "coarse")]
+
+GEOJSON_MANIFEST = "manifest.json"
+
+
+def geometry_hash(grid: gpd.GeoDataFrame) -> str:
+    """
+    Hash of the cell ids, geometries and CRS a cache is built from.
+    """
+    # str(crs) is "EPSG:..." for a CRS built from a code but PROJJSON
+    # once read back from GeoParquet; the EPSG code (or WKT) is stable
+    crs = grid.crs
+    epsg = crs.to_epsg() if crs is not None else None
+    crs_key = f"EPSG:{epsg}" if epsg is not None else (crs.to_wkt() if crs is not None else "")
+
+    digest = hashlib.sha256()
+    digest.update(crs_key.encode())
+    digest.update(np.ascontiguousarray(grid["cell_id"].values).tobytes())
+    for wkb in shapely.to_wkb(grid.geometry.values):
+        digest.update(wkb)
+    return digest.hexdigest()
+
+
+def level_for_zoom(zoom: float) -> str:
+    """
+    GeoJSON level to use for a map shown at `zoom`.
+    """
+    for min_zoom, level in GEOJSON_ZOOM_LEVELS:
+        if zoom >= min_zoom:
+            return level
+    return GEOJSON_ZOOM_LEVELS[-1][1]
+
+
+def _simplify(geoms, tolerance: float):
+    if tolerance <= 0:
+        return geoms
+    if hasattr(shapely, "coverage_simplify"):
+        # shapely >= 2.1: neighbouring cells keep identical shared edges
+        return shapely.coverage_simplify(geoms, tolerance, simplify_boundary=True)
+    return shapely.simplify(geoms, tolerance, preserve_topology=True)
+
+
+def encode_geojson(grid: gpd.GeoDataFrame, level: str = "full") -> bytes:
+    """
+    FeatureCollection of the grid cells (id = cell_id as string) at one
+    detail level, encoded as UTF-8 JSON.
+    """
+    tolerance, decimals = GEOJSON_LEVELS[level]
+
+    geoms = _simplify(grid.geometry.values, tolerance)
+    geoms = gpd.GeoSeries(geoms, crs=grid.crs).to_crs(4326).values
+    geoms = shapely.transform(geoms, lambda xy: np.round(xy, decimals))
+
+    features = ",".join(
+        f'{{"type":"Feature","id":"{cell_id}","properties":{{}},"geometry":{geom}}}'
+        for cell_id, geom in zip(grid["cell_id"].values, shapely.to_geojson(geoms))
+    )
+    return f'{{"type":"FeatureCollection","features":[{features}]}}'.encode()
+
+
+def write_geojson_cache(grid: gpd.GeoDataFrame, out_dir=None):
+    """
+    Encode every level and write it to out_dir (default GEOJSON_DIR).
+
+    Returns
+    -------
+    list of written paths (manifest last).
+    """
+    out_dir = out_dir or GEOJSON_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    paths, sizes = [], {}
+    for level in GEOJSON_LEVELS:
+        path = out_dir / f"{level}.geojson"
+        data = encode_geojson(grid, level)
+        path.write_bytes(data)
+        paths.append(path)
+        sizes[level] = len(data)
+
+    manifest = {"geometry_hash": geometry_hash(grid), "bytes": sizes}
+    with open(out_dir / GEOJSON_MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2)
+    paths.append(out_dir / GEOJSON_MANIFEST)
+
+    print(f"[GEOJSON] Wrote {len(GEOJSON_LEVELS)} levels to: {out_dir} {sizes}")
+    return paths
+
+
+def load_geojson_cache(grid: gpd.GeoDataFrame, cache_dir=None) -> dict:
+    """
+    Encoded GeoJSON per level for `grid`: read from the cache written by
+    the pipeline when it matches the grid, otherwise encoded here (in
+    memory only, so read-only deployments still work).
+
+    Returns
+    -------
+    dict level -> {"bytes": bytes, "etag": str}
+    """
+    cache_dir = cache_dir or GEOJSON_DIR
+    expected = geometry_hash(grid)
+
+    manifest_path = cache_dir / GEOJSON_MANIFEST
+    cached = False
+    if manifest_path.exists():
+        with open(manifest_path) as f:
+            cached = json.load(f).get("geometry_hash") == expected
+        cached = cached and all(
+            (cache_dir / f"{level}.geojson").exists() for level in GEOJSON_LEVELS
+        )
+
+    if not cached:
+        print("[GEOJSON] No current geometry cache; encoding map geometry.")
+
+    return {
+        level: {
+            "bytes": (
+                (cache_dir / f"{level}.geojson").read_bytes()
+                if cached else encode_geojson(grid, level)
+            ),
+            "etag": f"{expected[:16]}-{level}",
+        }
+        for level in GEOJSON_LEVELS
+    }
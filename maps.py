@@ -1,13 +1,32 @@
+import base64
+import json
+
+import flask
 import geopandas as gpd
 import pandas as pd
 import numpy as np
 import plotly.express as px
-from src.config import MODEL_FILE, MONTHLY_FILE
+from src.config import (
+    CELL_HOUR_DOW_FILE,
+    CUBE_FILE,
+    FORECAST_CELL_FILE,
+    MODEL_FILE,
+    MONTHLY_FILE,
+)
+from src.crime_cube import CrimeCube, MonthlySliceIndex, load_cell_hour_dow
+from src.map_geometry import level_for_zoom, load_geojson_cache
+
+MAP_ZOOM = 9
+MAP_CENTER = {"lat": 41.8781, "lon": -87.6298}
 
-# Load model output
+# Load model output and its pre-serialised geometry (one GeoJSON per
+# detail level, encoded once per process)
 
-gdf = gpd.read_parquet(MODEL_FILE).to_crs(4326)
-gdf["id"] = gdf.index.astype(str)
+gdf = gpd.read_parquet(MODEL_FILE)
+geojson_cache = load_geojson_cache(gdf)
+
+gdf = gdf.to_crs(4326)
+gdf["id"] = gdf["cell_id"].astype(str)
 
 # Ensure Gi* and KDE fields exist even if absent
 # Fix Gi* naming
@@ -19,12 +38,98 @@ elif "gi_z" not in gdf.columns:
 if "kde_intensity" not in gdf.columns:
     gdf["kde_intensity"] = np.nan
 
-# Load monthly table
+# Next-month cell forecast and its change from the recent level
+
+gdf["forecast_next"] = np.nan
+gdf["forecast_change"] = np.nan
+
+if FORECAST_CELL_FILE.exists():
+    next_month = pd.read_parquet(FORECAST_CELL_FILE).query("horizon == 1")
+    next_month = next_month.set_index("cell_id").reindex(gdf["cell_id"])
+    gdf["forecast_next"] = next_month["forecast"].values
+    gdf["forecast_change"] = (next_month["forecast"] - next_month["baseline"]).values
+
+# Load monthly crime cube (older deployments only ship the long table)
 
 try:
-    monthly_df = pd.read_parquet(MONTHLY_FILE)
+    if CUBE_FILE.exists():
+        crime_cube = CrimeCube.load(CUBE_FILE)
+    else:
+        crime_cube = CrimeCube.from_frame(
+            pd.read_parquet(MONTHLY_FILE), gdf["cell_id"].values
+        )
 except Exception:
-    monthly_df = pd.DataFrame()
+    crime_cube = None
+
+# All-time counts per cell x hour x dow x type (rows in `gdf` order)
+# for the static observed map; absent in older deployments
+
+hour_dow_counts, hour_dow_types = None, []
+
+if CELL_HOUR_DOW_FILE.exists():
+    _counts, _cell_ids, hour_dow_types = load_cell_hour_dow(CELL_HOUR_DOW_FILE)
+    _rows = pd.Index(_cell_ids).get_indexer(gdf["cell_id"].values)
+    hour_dow_counts = np.zeros((len(gdf),) + _counts.shape[1:], dtype=np.int32)
+    hour_dow_counts[_rows >= 0] = _counts[_rows[_rows >= 0]]
+
+# Animation counts per (crime type, hour) x day of week, indexed once
+
+animation_index = (
+    MonthlySliceIndex.from_cube(crime_cube)
+    if crime_cube is not None and crime_cube.nnz > 0
+    else None
+)
+
+# Attribute table for figures (geometry travels separately)
+
+cells = pd.DataFrame(gdf.drop(columns="geometry"))
+
+# Map geometry: served by URL once registered on the Dash server (the
+# browser fetches and caches it), otherwise embedded in the figure
+
+GEOMETRY_ROUTE = "/_geometry/"
+_geometry_url = None
+_geometry_dicts = {}
+
+
+def register_geometry_route(app):
+    """
+    Serve the cached GeoJSON from the Dash server so figures can
+    reference it by URL instead of embedding it.
+    """
+    global _geometry_url
+
+    route = app.config.routes_pathname_prefix + GEOMETRY_ROUTE.lstrip("/")
+
+    @app.server.route(route + "<level>.geojson")
+    def serve_geometry(level):
+        entry = geojson_cache.get(level)
+        if entry is None:
+            flask.abort(404)
+
+        response = flask.Response(entry["bytes"], mimetype="application/geo+json")
+        response.set_etag(entry["etag"])
+        response.cache_control.public = True
+        response.cache_control.max_age = 86400
+        return response.make_conditional(flask.request)
+
+    _geometry_url = app.get_relative_path(GEOMETRY_ROUTE)
+
+
+def map_geojson(zoom=MAP_ZOOM):
+    """
+    GeoJSON argument for a map at `zoom`: the cache URL, or the decoded
+    cache when no route is registered. Figures start at MAP_ZOOM; the
+    dashboard swaps the URL to finer levels as the user zooms in.
+    """
+    level = level_for_zoom(zoom)
+    if _geometry_url is not None:
+        return f"{_geometry_url}{level}.geojson"
+    if level not in _geometry_dicts:
+        _geometry_dicts[level] = json.loads(geojson_cache[level]["bytes"])
+    return _geometry_dicts[level]
+
+
 # Helper: observed crime type column
 
 def get_observed_column(crime_type):
@@ -33,10 +138,29 @@ def get_observed_column(crime_type):
     return f"crime_{crime_type.lower()}"
 
 
-# Build STATIC map (non-animated)
+# Per-cell values shown by the static map (in `cells` order)
+
+def observed_counts(crime_type, hour=None, dows=None):
+    """
+    Observed counts per cell for one hour (None = all) and days of
+    week (None or empty = all), from the cell x hour x dow tensor.
+    """
+    counts = hour_dow_counts if hour is None else hour_dow_counts[:, [int(hour)]]
+    if dows:
+        counts = counts[:, :, np.asarray(dows, dtype=np.int64)]
+
+    if crime_type != "ALL":
+        if crime_type not in hour_dow_types:
+            return np.zeros(len(gdf), dtype=np.int64)
+        counts = counts[..., [hour_dow_types.index(crime_type)]]
+
+    return counts.sum(axis=(1, 2, 3), dtype=np.int64)
 
-def make_static_map(model_choice, color_scale, crime_type, hour=None, dows=None):
-    df = gdf.copy()
+
+def static_map_values(model_choice, crime_type, hour=None, dows=None):
+    # Observed counts honour the hour slider and day-of-week checklist
+    if model_choice == "observed" and hour_dow_counts is not None:
+        return observed_counts(crime_type, hour, dows)
 
     # Select value column
     if model_choice == "observed":
@@ -52,7 +176,26 @@ def make_static_map(model_choice, color_scale, crime_type, hour=None, dows=None)
         # pred_poisson / pred_nb / pred_rf / pred_gwr
         value_col = model_choice
 
-    df["value"] = df[value_col]
+    return cells[value_col].values
+
+
+# Compact recolouring payload for the client-side map mode: the values
+# as base64 little-endian float32 (NaN = no data) plus the colour scale
+
+def encode_map_values(values, color_scale):
+    values = np.asarray(values, dtype="<f4")
+    return {
+        "z": base64.b64encode(values.tobytes()).decode("ascii"),
+        "n": int(values.size),
+        "colorscale": px.colors.get_colorscale(color_scale),
+    }
+
+
+# Build STATIC map (non-animated)
+
+def make_static_map(model_choice, color_scale, crime_type, hour=None, dows=None):
+    df = cells.copy()
+    df["value"] = static_map_values(model_choice, crime_type, hour, dows)
 
     # Hover fields
 
@@ -67,23 +210,24 @@ def make_static_map(model_choice, color_scale, crime_type, hour=None, dows=None)
         "pred_gwr": True,
         "gi_star": True,
         "kde_intensity": True,
+        "forecast_next": True,
     }
 
     # Plotly choropleth
 
     fig = px.choropleth_mapbox(
         df,
-        geojson=df.set_index("id").geometry.__geo_interface__,
+        geojson=map_geojson(),
         locations="id",
         color="value",
         mapbox_style="carto-darkmatter",
-        zoom=9,
-        center={"lat": 41.8781, "lon": -87.6298},
+        zoom=MAP_ZOOM,
+        center=MAP_CENTER,
         opacity=0.75,
         color_continuous_scale=color_scale,
         hover_data=hover_fields,
     )
-    fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+    fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0}, uirevision="risk-map")
 
     return fig
 
@@ -91,40 +235,34 @@ def make_static_map(model_choice, color_scale, crime_type, hour=None, dows=None)
 # Build ANIMATED map (month-over-month)
 
 def make_animated_map(crime_type, color_scale, hour, dows):
-    if monthly_df.empty:
+    if animation_index is None:
         # No animation available
         fig = px.scatter(
             title="No monthly data available to animate"
         )
         return fig
 
-    df = monthly_df.copy()
-
-    # Filter crime type
-
-    if crime_type != "ALL":
-        df = df[df["primary_type"] == crime_type]
+    # Cell+month counts for the crime type, hour of day and days of
+    # week (non-empty combinations only, month-major)
 
-    # Hour-of-day filter
-
-    df = df[df["hour"] == hour]
-
-    # Day-of-week filter
-
-    if dows:
-        df = df[df["dow"].isin(dows)]
-
-    # Aggregate to cell+month
+    cell_ids, months, counts = animation_index.query(
+        primary_type=None if crime_type == "ALL" else crime_type,
+        hour=hour,
+        dows=dows,
+    )
 
-    df = (
-        df.groupby(["cell_id", "month"], as_index=False)
-        .agg({"crime_count": "sum"})
+    df = pd.DataFrame(
+        {
+            "cell_id": cell_ids,
+            "month": months,
+            "crime_count": counts,
+        }
     )
 
     # Attach geometry
 
     df = df.merge(
-        gdf[["cell_id", "id"]],
+        cells[["cell_id", "id"]],
         on="cell_id",
         how="left",
     )
@@ -133,18 +271,18 @@ def make_animated_map(crime_type, color_scale, hour, dows):
     
     fig = px.choropleth_mapbox(
         df,
-        geojson=gdf.set_index("id").geometry.__geo_interface__,
+        geojson=map_geojson(),
         locations="id",
         color="crime_count",
         animation_frame="month",
         mapbox_style="carto-darkmatter",
-        zoom=9,
-        center={"lat": 41.8781, "lon": -87.6298},
+        zoom=MAP_ZOOM,
+        center=MAP_CENTER,
         opacity=0.75,
         color_continuous_scale=color_scale,
         hover_data={"crime_count": True, "month": True},
     )
 
-    fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+    fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0}, uirevision="risk-map")
 
     return fig
\ No newline at end of file
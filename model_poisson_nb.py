@@ -1,19 +1,19 @@
 import statsmodels.api as sm
 import numpy as np
 
-def fit_poisson_nb(features_gdf, response_col="crime_count_total"):
-    df = features_gdf.copy()
+from .model_registry import fit_or_load, load_model, model_fingerprint
+
+PREDICTORS = ["streetlight_count", "bus_count"]
 
-    # Defensive filtering
-    df = df[df[response_col].notna()].copy()
 
+def _design_matrix(df):
     # Log-transform predictors to stabilise scale
-    X = df[["streetlight_count", "bus_count"]].copy()
+    X = df[PREDICTORS].copy()
     X = X.apply(lambda s: np.log1p(s))
+    return sm.add_constant(X, has_constant="add")
 
-    X = sm.add_constant(X)
-    y = df[response_col]
 
+def _fit_glms(X, y):
     # Poisson model
     pois = sm.GLM(
         y,
@@ -21,8 +21,6 @@ def fit_poisson_nb(features_gdf, response_col="crime_count_total"):
         family=sm.families.Poisson()
     ).fit()
 
-    df["pred_poisson"] = pois.predict(X)
-
     # Overdispersion check
     ratio = pois.deviance / pois.df_resid if pois.df_resid > 0 else 1.0
 
@@ -33,9 +31,61 @@ def fit_poisson_nb(features_gdf, response_col="crime_count_total"):
             X,
             family=sm.families.NegativeBinomial()
         ).fit()
-        df["pred_nb"] = nb.predict(X)
     else:
         nb = None
-        df["pred_nb"] = df["pred_poisson"]
 
-    return pois, nb, df, ratio
\ No newline at end of file
+    return {"poisson": pois, "nb": nb, "ratio": ratio}
+
+
+def fit_poisson_nb(features_gdf, response_col="crime_count_total", registry=True):
+    """
+    Poisson GLM of cell counts on log street lights / bus stops, plus a
+    Negative Binomial GLM when the Poisson fit is overdispersed.
+
+    With registry=True the fitted models are stored in the model
+    registry and reloaded, not refitted, while the design matrix and
+    response are unchanged.
+    """
+    df = features_gdf.copy()
+
+    # Defensive filtering
+    df = df[df[response_col].notna()].copy()
+
+    X = _design_matrix(df)
+    y = df[response_col]
+
+    if registry:
+        fingerprint = model_fingerprint(X, y, params={"overdispersion": 1.5})
+        fitted = fit_or_load(
+            "poisson_nb",
+            fingerprint,
+            lambda: _fit_glms(X, y),
+            meta={"predictors": PREDICTORS, "response": response_col},
+        )
+    else:
+        fitted = _fit_glms(X, y)
+
+    pois, nb, ratio = fitted["poisson"], fitted["nb"], fitted["ratio"]
+
+    df["pred_poisson"] = pois.predict(X)
+    df["pred_nb"] = nb.predict(X) if nb is not None else df["pred_poisson"]
+
+    return pois, nb, df, ratio
+
+
+def predict_poisson_nb(features_df):
+    """
+    pred_poisson / pred_nb for new feature rows from the stored models
+    (no refit). Raises FileNotFoundError if none are stored.
+    """
+    fitted = load_model("poisson_nb")
+    if fitted is None:
+        raise FileNotFoundError("No stored Poisson / NB model; run the pipeline first.")
+
+    df = features_df.copy()
+    X = _design_matrix(df)
+    df["pred_poisson"] = fitted["poisson"].predict(X)
+    df["pred_nb"] = (
+        fitted["nb"].predict(X) if fitted["nb"] is not None else df["pred_poisson"]
+    )
+    return df
\ No newline at end of file
@@ -0,0 +1,188 @@
+import datetime
+import hashlib
+import json
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .config import MODELS_DIR
+
+# ---------------------------------------------------------------------
+# Fitted model registry
+# ---------------------------------------------------------------------
+# Each fitted model is stored as MODELS_DIR/<name>.joblib next to
+# <name>.json holding the fingerprint of the training data and
+# hyperparameters it was fitted with, and optionally a directory of
+# plain .npy arrays (<name>_arrays/) that can be memory-mapped for
+# scoring without unpickling the model. A fit whose fingerprint matches
+# the stored one loads the model instead of refitting; anything else
+# (new features, new parameters, a library upgrade, an unreadable file)
+# refits and replaces it.
+
+REGISTRY_VERSION = 1
+
+
+def _library_versions() -> dict:
+    import sklearn
+    import statsmodels
+
+    return {
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "statsmodels": statsmodels.__version__,
+    }
+
+
+def model_fingerprint(*data, params=None) -> str:
+    """
+    SHA-256 of the training data (arrays, Series or DataFrames, with
+    their column names / index), the hyperparameters and the library
+    versions the model would be pickled with.
+    """
+    digest = hashlib.sha256()
+    for item in data:
+        if isinstance(item, pd.DataFrame):
+            digest.update(json.dumps([str(c) for c in item.columns]).encode())
+            digest.update(pd.util.hash_pandas_object(item, index=True).values.tobytes())
+        elif isinstance(item, pd.Series):
+            digest.update(str(item.name).encode())
+            digest.update(pd.util.hash_pandas_object(item, index=True).values.tobytes())
+        else:
+            arr = np.ascontiguousarray(item)
+            digest.update(f"{arr.dtype.str}{arr.shape}".encode())
+            digest.update(arr.tobytes())
+
+    payload = {
+        "version": REGISTRY_VERSION,
+        "params": params or {},
+        "libraries": _library_versions(),
+    }
+    digest.update(json.dumps(payload, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _paths(name: str):
+    return MODELS_DIR / f"{name}.joblib", MODELS_DIR / f"{name}.json"
+
+
+def _arrays_dir(name: str):
+    return MODELS_DIR / f"{name}_arrays"
+
+
+def read_model_meta(name: str):
+    """
+    Metadata recorded with a stored model, or None.
+    """
+    _, meta_path = _paths(name)
+    if not meta_path.exists():
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def save_model(name: str, model, fingerprint: str, meta=None, arrays=None):
+    """
+    Store a fitted model with its fingerprint (written to temporary
+    files and swapped in, with the metadata last, so a crash never
+    pairs a model with the wrong fingerprint).
+
+    arrays : dict of str -> ndarray, optional
+        Saved as separate .npy files for load_model_arrays().
+    """
+    model_path, meta_path = _paths(name)
+    MODELS_DIR.mkdir(parents=True, exist_ok=True)
+    if meta_path.exists():
+        meta_path.unlink()
+
+    tmp_model = model_path.with_name(model_path.name + ".tmp")
+    joblib.dump(model, tmp_model)
+    tmp_model.replace(model_path)
+
+    if arrays:
+        arrays_dir = _arrays_dir(name)
+        arrays_dir.mkdir(exist_ok=True)
+        for old in arrays_dir.glob("*.npy"):
+            old.unlink()
+        for key, arr in arrays.items():
+            np.save(arrays_dir / f"{key}.npy", np.ascontiguousarray(arr))
+
+    record = {
+        "name": name,
+        "fingerprint": fingerprint,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "libraries": _library_versions(),
+        **(meta or {}),
+    }
+    tmp_meta = meta_path.with_name(meta_path.name + ".tmp")
+    with open(tmp_meta, "w") as f:
+        json.dump(record, f, indent=2, default=str)
+    tmp_meta.replace(meta_path)
+    return model_path
+
+
+def load_model(name: str, fingerprint: str = None):
+    """
+    Load a stored model.
+
+    Parameters
+    ----------
+    name : str
+    fingerprint : str, optional
+        Only return the model if it was stored with this fingerprint.
+
+    Returns
+    -------
+    The model, or None when it is missing, stale or unreadable.
+    """
+    model_path, _ = _paths(name)
+    meta = read_model_meta(name)
+    if meta is None or not model_path.exists():
+        return None
+    if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+        return None
+
+    try:
+        return joblib.load(model_path)
+    except Exception as exc:
+        print(f"[MODELS] Could not load '{name}' ({exc}).")
+        return None
+
+
+def load_model_arrays(name: str, mmap: bool = True):
+    """
+    The arrays stored with a model (memory-mapped read-only by default,
+    so processes scoring with them share the page cache), or None.
+    """
+    arrays_dir = _arrays_dir(name)
+    if read_model_meta(name) is None or not arrays_dir.exists():
+        return None
+    return {
+        path.stem: np.load(path, mmap_mode="r" if mmap else None)
+        for path in sorted(arrays_dir.glob("*.npy"))
+    }
+
+
+def fit_or_load(name: str, fingerprint: str, fit, meta=None, arrays=None):
+    """
+    Return the stored model `name` if its fingerprint matches, else
+    call fit(), store the result and return it.
+
+    arrays : callable, optional
+        arrays(model) -> dict of arrays stored with a newly fitted model.
+    """
+    model = load_model(name, fingerprint)
+    if model is not None:
+        print(f"[MODELS] '{name}' unchanged; loaded from the registry.")
+        return model
+
+    model = fit()
+    save_model(
+        name,
+        model,
+        fingerprint,
+        meta=meta,
+        arrays=arrays(model) if arrays is not None else None,
+    )
+    print(f"[MODELS] '{name}' fitted and stored.")
+    return model
@@ -1,11 +1,20 @@
+from types import SimpleNamespace
+
 import numpy as np
 import pandas as pd
+from scipy.spatial import cKDTree
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.neighbors import NearestNeighbors
-from sklearn.linear_model import LinearRegression
+
+from .model_registry import (
+    fit_or_load,
+    load_model_arrays,
+    model_fingerprint,
+    read_model_meta,
+)
 
 try:
-    # mgwr is optional; we guard usage in the pipeline
+    # mgwr is optional; only the fit_gwr() cross-check uses it
     from mgwr.gwr import GWR
     from mgwr.sel_bw import Sel_BW
     MGWR_AVAILABLE = True
@@ -17,10 +26,19 @@ except Exception:
 # Random Forest
 # ---------------------------------------------------------------------
 
-def fit_rf(features_gdf: pd.DataFrame):
+RF_PARAMS = {"n_estimators": 250, "max_depth": None, "random_state": 42}
+
+
+def fit_rf(features_gdf: pd.DataFrame, n_jobs: int = -1, registry: bool = True):
     """
     Fit a RandomForest model to predict crime_count_total from
     environmental and crime-type features.
+
+    n_jobs is passed to the forest (-1 = all cores); predictions do not
+    depend on it. With registry=True the forest is stored in the model
+    registry (with its node arrays, see predict_rf) and reloaded
+    instead of refitted while the training features and RF_PARAMS are
+    unchanged.
     """
     df = features_gdf.copy()
     df = df[df["crime_count_total"].notna()]
@@ -40,13 +58,22 @@ def fit_rf(features_gdf: pd.DataFrame):
     X = df[X_cols].values
     y = df["crime_count_total"].values
 
-    rf = RandomForestRegressor(
-        n_estimators=250,
-        max_depth=None,
-        random_state=42,
-        n_jobs=-1,
-    )
-    rf.fit(X, y)
+    def _fit():
+        rf = RandomForestRegressor(**RF_PARAMS, n_jobs=n_jobs)
+        return rf.fit(X, y)
+
+    if registry:
+        fingerprint = model_fingerprint(X, y, params={"columns": X_cols, **RF_PARAMS})
+        rf = fit_or_load(
+            "rf",
+            fingerprint,
+            _fit,
+            meta={"columns": X_cols},
+            arrays=forest_arrays,
+        )
+        rf.n_jobs = n_jobs
+    else:
+        rf = _fit()
 
     preds = rf.predict(features_gdf[X_cols].fillna(0).values)
     features_gdf["pred_rf"] = preds
@@ -56,13 +83,86 @@ def fit_rf(features_gdf: pd.DataFrame):
 
 
 # ---------------------------------------------------------------------
-# GWR (for modest grid sizes)
+# Forest scoring from memory-mapped arrays
+# ---------------------------------------------------------------------
+# Unpickling a forest copies every tree into freshly allocated memory.
+# For scoring, the trees are also stored as flat node arrays (all trees
+# concatenated, child indices global): these memory-map straight from
+# the registry, and a level-by-level descent over all (row, tree) pairs
+# reproduces RandomForestRegressor.predict.
+
+def forest_arrays(rf: RandomForestRegressor) -> dict:
+    """
+    Flat node arrays of a fitted regression forest.
+    """
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for est in rf.estimators_:
+        tree = est.tree_
+        leaf = tree.children_left == -1
+        roots.append(offset)
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        # Leaves point at themselves so the descent can run to a fixed depth
+        own = np.arange(tree.node_count) + offset
+        left.append(np.where(leaf, own, tree.children_left + offset))
+        right.append(np.where(leaf, own, tree.children_right + offset))
+        value.append(tree.value[:, 0, 0])
+        offset += tree.node_count
+
+    return {
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left).astype(np.int64),
+        "right": np.concatenate(right).astype(np.int64),
+        "value": np.concatenate(value),
+        "roots": np.asarray(roots, dtype=np.int64),
+        "depth": np.asarray([max(est.tree_.max_depth for est in rf.estimators_)]),
+    }
+
+
+def predict_forest(arrays: dict, X: np.ndarray) -> np.ndarray:
+    """
+    Forest prediction from forest_arrays() output (arrays may be
+    memory-mapped).
+    """
+    # Trees compare float32 features against float64 thresholds
+    X = np.asarray(X, dtype=np.float32)
+    rows = np.arange(len(X))[:, None]
+    node = np.broadcast_to(np.asarray(arrays["roots"]), (len(X), len(arrays["roots"])))
+
+    for _ in range(int(arrays["depth"][0])):
+        go_left = X[rows, arrays["feature"][node]] <= arrays["threshold"][node]
+        node = np.where(go_left, arrays["left"][node], arrays["right"][node])
+
+    return arrays["value"][node].mean(axis=1)
+
+
+def predict_rf(features_df: pd.DataFrame) -> np.ndarray:
+    """
+    Score new feature rows with the stored forest, without refitting or
+    unpickling it. Raises FileNotFoundError if no forest is stored.
+    """
+    arrays = load_model_arrays("rf", mmap=True)
+    if arrays is None:
+        raise FileNotFoundError("No stored Random Forest; run the pipeline first.")
+
+    X_cols = read_model_meta("rf")["columns"]
+    return predict_forest(arrays, features_df[X_cols].fillna(0).values)
+
+
+# ---------------------------------------------------------------------
+# Reference GWR via mgwr (cross-check only)
 # ---------------------------------------------------------------------
+# The pipeline fits GWR with fit_gwr_native() below. mgwr's fit builds
+# n x n matrices, so it is only usable on modest grids; it is kept as an
+# opt-in reference to check the native fit against and is not called by
+# any stage.
 
 def fit_gwr(features_gdf):
     """
-    Fit a GWR model only when grid size is modest.
-    Assumes CRS is projected (metres).
+    Fit GWR with mgwr (reference for fit_gwr_native() on modest grids;
+    not used by the pipeline). Assumes CRS is projected (metres).
     """
     if not MGWR_AVAILABLE:
         raise RuntimeError("MGWR is not available in this environment.")
@@ -106,15 +206,298 @@ def fit_gwr(features_gdf):
     return gwr_model, features_gdf
 
 
+# ---------------------------------------------------------------------
+# Native GWR (bounded adaptive bisquare, any grid size)
+# ---------------------------------------------------------------------
+# Same model as mgwr's default GWR (adaptive bisquare kernel, AICc
+# golden-section bandwidth search), but each local fit only sees its
+# bw nearest cells: the kd-tree neighbours are queried once up to
+# max_neighbours and sliced for every candidate bandwidth, the local
+# normal equations are solved in row blocks and AICc comes from the
+# hat-matrix diagonal, so nothing n x n is ever built.
+
+# Golden-section constants (as mgwr.sel_bw)
+GWR_GOLDEN_DELTA = 0.38197
+GWR_TOL = 1.0e-5
+GWR_MAX_ITER = 200
+
+# Rows per block in a local fit (memory ~ block x bw x p)
+GWR_BLOCK_ROWS = 2048
+
+
+def gwr_neighbours(coords, max_neighbours: int):
+    """
+    (distances, indices) of every cell's max_neighbours nearest cells,
+    the cell itself first.
+    """
+    k = min(int(max_neighbours), len(coords))
+    dist, idx = cKDTree(coords).query(coords, k=k)
+    return dist.reshape(len(coords), k), idx.reshape(len(coords), k)
+
+
+def _bisquare_weights(dist, bw: int):
+    """
+    Adaptive bisquare weights over the first bw neighbours (the bw-th
+    neighbour marks the bandwidth, as in mgwr).
+    """
+    d = dist[:, :bw]
+    bandwidth = d[:, -1:] * 1.0000001
+    return np.where(d < bandwidth, (1 - (d / bandwidth) ** 2) ** 2, 0.0)
+
+
+def gwr_fit(X, y, dist, idx, bw: int, inference: bool = False):
+    """
+    GWR with an adaptive bisquare kernel of bw neighbours.
+
+    Parameters
+    ----------
+    X : array (n, p), including the constant column.
+    y : array (n,)
+    dist, idx : gwr_neighbours() output with at least bw columns.
+    bw : int
+    inference : bool
+        Also compute standard errors of the local coefficients.
+
+    Returns
+    -------
+    SimpleNamespace with params (n, p), predy, resid, influ (hat
+    diagonal), tr_S, RSS, sigma2, aicc and, with inference, bse.
+    """
+    n, p = X.shape
+    bw = int(min(bw, idx.shape[1]))
+
+    params = np.empty((n, p))
+    influ = np.empty(n)
+    cct = np.empty((n, p)) if inference else None
+
+    for lo in range(0, n, GWR_BLOCK_ROWS):
+        hi = min(n, lo + GWR_BLOCK_ROWS)
+        w = _bisquare_weights(dist[lo:hi], bw)
+        Xn = X[idx[lo:hi, :bw]]  # (b, bw, p)
+        yn = y[idx[lo:hi, :bw]]
+
+        xtwx = np.einsum("bk,bkp,bkq->bpq", w, Xn, Xn)
+        inv = np.linalg.pinv(xtwx, hermitian=True)
+        params[lo:hi] = np.einsum("bpq,bq->bp", inv, np.einsum("bk,bkp,bk->bp", w, Xn, yn))
+
+        # Hat diagonal: x_i (X'W_iX)^-1 x_i' w_ii, with w_ii = 1
+        xi = X[lo:hi]
+        influ[lo:hi] = np.einsum("bp,bpq,bq->b", xi, inv, xi)
+
+        if inference:
+            # diag of C C' with C = (X'WX)^-1 X'W
+            xtw2x = np.einsum("bk,bkp,bkq->bpq", w**2, Xn, Xn)
+            cct[lo:hi] = np.einsum("bpi,bij,bpj->bp", inv, xtw2x, inv)
+
+    predy = np.einsum("np,np->n", X, params)
+    resid = y - predy
+    rss = float(resid @ resid)
+    tr_s = float(influ.sum())
+    sigma2 = rss / (n - tr_s)
+    aicc = n * np.log(rss / n) + n * np.log(2.0 * np.pi) + n * (n + tr_s) / (n - 2.0 - tr_s)
+
+    return SimpleNamespace(
+        bw=bw,
+        params=params,
+        predy=predy,
+        resid=resid,
+        influ=influ,
+        tr_S=tr_s,
+        RSS=rss,
+        sigma2=sigma2,
+        aicc=float(aicc),
+        bse=np.sqrt(cct * sigma2) if inference else None,
+    )
+
+
+def select_gwr_bandwidth(X, y, dist, idx, bw_min: int = None, bw_max: int = None):
+    """
+    Golden-section search for the AICc-optimal adaptive bandwidth (in
+    neighbours), following mgwr.Sel_BW's integer search but bounded by
+    the neighbours available in idx.
+
+    Returns
+    -------
+    (bw, aicc, history) with history a list of (bw, aicc).
+    """
+    n, p = X.shape
+    a = float(bw_min if bw_min is not None else 40 + 2 * p)
+    c = float(min(bw_max if bw_max is not None else n, idx.shape[1]))
+    a = min(a, c)
+    delta = GWR_GOLDEN_DELTA
+
+    scores = {}
+
+    def score(bw):
+        if bw not in scores:
+            scores[bw] = gwr_fit(X, y, dist, idx, int(bw)).aicc
+        return scores[bw]
+
+    b = np.round(a + delta * abs(c - a))
+    d = np.round(c - delta * abs(c - a))
+    opt_val, opt_score = b, np.inf
+    diff, iters = 1.0e9, 0
+
+    while abs(diff) > GWR_TOL and iters < GWR_MAX_ITER:
+        iters += 1
+        b, d = np.round(b), np.round(d)
+        score_b, score_d = score(b), score(d)
+
+        if score_b <= score_d:
+            opt_val, opt_score = b, score_b
+            c, d = d, b
+            b = a + delta * abs(c - a)
+        else:
+            opt_val, opt_score = d, score_d
+            a, b = b, d
+            d = c - delta * abs(c - a)
+
+        diff = score_b - score_d
+
+    history = sorted((int(k), v) for k, v in scores.items())
+    return int(opt_val), float(opt_score), history
+
+
+def fit_gwr_native(features_gdf, bw: int = None, max_neighbours: int = 1000):
+    """
+    Fit GWR (adaptive bisquare, AICc bandwidth) without mgwr's n x n
+    cost, so it runs on any grid size.
+
+    Parameters
+    ----------
+    bw : int, optional
+        Bandwidth in neighbours; searched when None.
+    max_neighbours : int
+        Upper bound on the bandwidth (and on the neighbours kept per
+        cell).
+
+    Returns the fit (gwr_fit() namespace) and the features with the
+    coef_* and pred_gwr columns of fit_gwr(), plus se_* standard errors.
+    """
+    df = features_gdf.copy()
+    df = df[df["crime_count_total"].notna()].copy()
+
+    X_cols = [c for c in ["streetlight_count", "bus_count"] if c in df.columns]
+    if not X_cols:
+        raise ValueError("No predictors available for GWR.")
+
+    centroids = df.geometry.centroid.copy()
+    coords = np.column_stack((centroids.x.values, centroids.y.values))
+
+    y = df["crime_count_total"].values.astype(float)
+    X = np.column_stack([np.ones(len(df)), df[X_cols].values.astype(float)])
+
+    max_neighbours = max(int(max_neighbours), int(bw or 0))
+    dist, idx = gwr_neighbours(coords, max_neighbours)
+
+    if bw is None:
+        bw, aicc, _ = select_gwr_bandwidth(X, y, dist, idx)
+        print(f"GWR bandwidth: {bw} neighbours (AICc {aicc:.2f})")
+
+    fit = gwr_fit(X, y, dist, idx, bw, inference=True)
+
+    names = ["intercept"] + [
+        {"streetlight_count": "streetlight", "bus_count": "bus"}[c] for c in X_cols
+    ]
+    for j, name in enumerate(names):
+        df[f"coef_{name}"] = fit.params[:, j]
+        df[f"se_{name}"] = fit.bse[:, j]
+    df["pred_gwr"] = fit.predy
+
+    local_cols = [f"{p}_{name}" for name in names for p in ("coef", "se")]
+    features_gdf = features_gdf.merge(
+        df[["cell_id", "pred_gwr"] + local_cols],
+        on="cell_id",
+        how="left",
+    )
+
+    print(f"Native GWR fitted (bw={fit.bw}, tr(S)={fit.tr_S:.1f}, AICc={fit.aicc:.2f}).")
+    return fit, features_gdf
+
+
 # ---------------------------------------------------------------------
 # Local Linear fallback (for large grids)
 # ---------------------------------------------------------------------
 
-def fit_local_linear(features_gdf, k: int = 40):
+# Distance-decay kernels for the local linear fallback, with u = d / bw
+# and bw the distance to the k-th neighbour (adaptive bandwidth)
+LOCAL_KERNELS = {
+    "uniform": lambda u: np.ones_like(u),
+    "bisquare": lambda u: np.where(u < 1, (1 - u**2) ** 2, 0.0),
+    "gaussian": lambda u: np.exp(-0.5 * u**2),
+}
+
+
+def local_linear_batch(X, y, neigh_idx, weights=None):
+    """
+    Weighted least squares in every neighbourhood at once.
+
+    Each neighbourhood is centred on its weighted means and solved by a
+    batched pseudo-inverse, which reproduces LinearRegression (minimum
+    norm slopes when a predictor is constant locally).
+
+    Parameters
+    ----------
+    X : array (n, p)
+    y : array (n,)
+    neigh_idx : int array (n, k), rows of each cell's neighbourhood
+    weights : array (n, k), optional (default uniform)
+
+    Returns
+    -------
+    dict with coef (n, p + 1; intercept first), se (n, p + 1), pred (n,)
+    and sigma2 (n,), the residual variance of each local fit.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n, k = neigh_idx.shape
+    if weights is None:
+        weights = np.ones((n, k))
+    weights = weights / weights.sum(axis=1, keepdims=True)
+
+    Xn = X[neigh_idx]  # (n, k, p)
+    yn = y[neigh_idx]  # (n, k)
+
+    x_mean = np.einsum("nk,nkp->np", weights, Xn)
+    y_mean = np.einsum("nk,nk->n", weights, yn)
+    sw = np.sqrt(weights)
+    Xc = (Xn - x_mean[:, None, :]) * sw[:, :, None]
+    yc = (yn - y_mean[:, None]) * sw
+
+    pinv = np.linalg.pinv(Xc)  # (n, p, k)
+    beta = np.einsum("npk,nk->np", pinv, yc)
+    intercept = y_mean - np.einsum("np,np->n", x_mean, beta)
+
+    # Residual variance with k - rank - 1 degrees of freedom
+    resid = yc - np.einsum("nkp,np->nk", Xc, beta)
+    rank = np.linalg.matrix_rank(Xc)
+    dof = np.maximum(k - rank - 1, 1)
+    sigma2 = (resid**2).sum(axis=1) * k / dof
+
+    # cov(beta) = sigma2 (Xc' W Xc)^+ (weights normalised to mean 1)
+    cov = np.einsum("npk,nqk->npq", pinv, pinv) * (sigma2 / k)[:, None, None]
+    se_beta = np.sqrt(np.einsum("npp->np", cov))
+    var_intercept = sigma2 / k + np.einsum("np,npq,nq->n", x_mean, cov, x_mean)
+
+    coef = np.column_stack([intercept, beta])
+    return {
+        "coef": coef,
+        "se": np.column_stack([np.sqrt(var_intercept), se_beta]),
+        "pred": coef[:, 0] + np.einsum("np,np->n", X, coef[:, 1:]),
+        "sigma2": sigma2,
+    }
+
+
+def fit_local_linear(features_gdf, k: int = 40, kernel: str = "uniform"):
     """
     Lightweight local linear regression as a GWR fallback.
 
     k defaults to 40, which is more appropriate for a 500 m grid.
+    kernel weights each neighbourhood by distance ("uniform",
+    "bisquare" or "gaussian", with the k-th neighbour's distance as
+    bandwidth). All neighbourhoods are solved in one batch
+    (local_linear_batch), adding pred_llm plus local coefficients and
+    standard errors in the GWR column names (coef_* / se_*).
     """
     df = features_gdf.copy()
     df = df[df["crime_count_total"].notna()].copy()
@@ -122,6 +505,8 @@ def fit_local_linear(features_gdf, k: int = 40):
     X_cols = [c for c in ["streetlight_count", "bus_count"] if c in df.columns]
     if not X_cols:
         raise ValueError("No predictors available for local linear model.")
+    if kernel not in LOCAL_KERNELS:
+        raise ValueError(f"Unknown kernel '{kernel}'; use one of {sorted(LOCAL_KERNELS)}.")
 
     centroids = df.geometry.centroid.copy()
     coords = np.column_stack((centroids.x.values, centroids.y.values))
@@ -131,19 +516,24 @@ def fit_local_linear(features_gdf, k: int = 40):
 
     k = min(k, len(df))
     nn = NearestNeighbors(n_neighbors=k).fit(coords)
-    neigh_idx = nn.kneighbors(coords, return_distance=False)
+    dist, neigh_idx = nn.kneighbors(coords)
 
-    preds = np.zeros(len(df), dtype=float)
+    bw = np.maximum(dist[:, -1:], np.finfo(float).tiny)
+    weights = LOCAL_KERNELS[kernel](dist / bw)
 
-    for i in range(len(df)):
-        idx = neigh_idx[i]
-        lr = LinearRegression().fit(X[idx], y[idx])
-        preds[i] = lr.predict(X[i].reshape(1, -1))[0]
+    fit = local_linear_batch(X, y, neigh_idx, weights)
 
-    df["pred_llm"] = preds
+    df["pred_llm"] = fit["pred"]
+    names = ["intercept"] + [
+        {"streetlight_count": "streetlight", "bus_count": "bus"}[c] for c in X_cols
+    ]
+    for j, name in enumerate(names):
+        df[f"coef_{name}"] = fit["coef"][:, j]
+        df[f"se_{name}"] = fit["se"][:, j]
 
+    local_cols = [f"{p}_{name}" for name in names for p in ("coef", "se")]
     features_gdf = features_gdf.merge(
-        df[["cell_id", "pred_llm"]],
+        df[["cell_id", "pred_llm"] + local_cols],
         on="cell_id",
         how="left",
     )
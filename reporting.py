@@ -1,7 +1,8 @@
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
-from .config import REPORTS_DIR
+from .config import REPORTS_DIR, SCOPE_FILE
 import datetime
+import json
 
 def generate_pdf_summary(features_gdf, moran, path=None):
     REPORTS_DIR.mkdir(parents=True, exist_ok=True)
@@ -63,6 +64,17 @@ def generate_pdf_summary(features_gdf, moran, path=None):
         f"Moran's I: {moran.I:.4f} (p = {moran.p_norm:.4f})",
     )
 
+    # Period covered by the aggregated data
+    if SCOPE_FILE.exists():
+        with open(SCOPE_FILE) as f:
+            scope = json.load(f)
+
+        c.drawString(
+            50,
+            height - 210,
+            f"Period: {scope.get('first_month') or '-'} to {scope.get('last_month') or '-'}",
+        )
+
     # ------------------------------------------------------------------
     # Footer
     # ------------------------------------------------------------------
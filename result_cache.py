@@ -0,0 +1,268 @@
+import functools
+import hashlib
+import io
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import plotly.graph_objects as go
+
+from src.dag import file_signature
+
+# ---------------------------------------------------------------------
+# Memoised dashboard results
+# ---------------------------------------------------------------------
+# Figures and tables depend only on the callback inputs and on the
+# static artefacts the app was started with, so they are cached under
+# a key of (function, arguments, artefact version). The version is
+# computed once, when the cache is created right after the app modules
+# have loaded their data: it hashes the artefact file signatures and the
+# source of every module in the packages the cached code comes from.
+# Outputs rewritten under a running process do not change its version
+# (its figures still come from the data it loaded); processes started
+# on new outputs or new code get a new version, so entries from older
+# deployments are never served and simply age out of the store.
+#
+# Entries live in a bounded in-process LRU; with a SQLite path they are
+# also shared between processes (Gunicorn workers), the database being
+# trimmed least-recently-used first to its own byte budget. Hits only
+# record their access time in memory; it is written back in batches, so
+# reads do not take the database write lock.
+
+ACCESS_FLUSH_SECONDS = 30.0
+ACCESS_FLUSH_ROWS = 256
+
+
+def _reduce_figure(fig):
+    # A Figure re-validates every property when unpickled; the plain
+    # dict form loads as fast as its arrays and renders the same
+    return dict, (fig.to_plotly_json(),)
+
+
+def _dumps(value) -> bytes:
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = {go.Figure: _reduce_figure}
+    pickler.dump(value)
+    return buffer.getvalue()
+
+
+def source_hash(modules) -> str:
+    """
+    SHA-256 of the source of every module in the packages (directories)
+    of `modules`, so a change to any code a cached function reaches
+    through its imports is picked up.
+    """
+    dirs = sorted({Path(module.__file__).resolve().parent for module in modules})
+    digest = hashlib.sha256()
+    for directory in dirs:
+        for path in sorted(directory.glob("*.py")):
+            digest.update(path.name.encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def artifact_version(paths, code="") -> str:
+    """
+    Hash of the signatures of a set of artefact files and a code hash.
+    """
+    payload = {str(Path(p)): file_signature(Path(p)) for p in paths}
+    payload["code"] = code
+    blob = json.dumps(payload, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+class _MemoryLRU:
+    """
+    In-process LRU bounded by entry count and total pickled size.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.n_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value, size: int):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.n_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.n_bytes += size
+            while self.entries and (
+                len(self.entries) > self.max_entries or self.n_bytes > self.max_bytes
+            ):
+                _, (_, old_size) = self.entries.popitem(last=False)
+                self.n_bytes -= old_size
+
+
+class _SQLiteStore:
+    """
+    Pickled results in a SQLite file shared by worker processes.
+    """
+
+    def __init__(self, path, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._pid = None
+        self._touched = {}
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # One connection per process (workers fork after import)
+        if self._conn is None or self._pid != os.getpid():
+            self._touched = {}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value BLOB, size INTEGER, accessed REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _write_access_times(self, conn):
+        # Caller commits; rows trimmed meanwhile are simply not updated
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._flushed = time.monotonic()
+        if touched:
+            conn.executemany(
+                "UPDATE results SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in touched.items()],
+            )
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self._lock:
+            self._touched[key] = time.time()
+            due = (
+                len(self._touched) >= ACCESS_FLUSH_ROWS
+                or time.monotonic() - self._flushed > ACCESS_FLUSH_SECONDS
+            )
+        if due:
+            self._write_access_times(conn)
+            conn.commit()
+        return row[0]
+
+    def put(self, key, blob: bytes):
+        if len(blob) > self.max_bytes:
+            return
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+            (key, blob, len(blob), time.time()),
+        )
+        self._write_access_times(conn)
+
+        # Trim least-recently-used rows beyond the byte budget
+        (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            stale, freed = [], 0
+            for old_key, size in conn.execute(
+                "SELECT key, size FROM results ORDER BY accessed"
+            ):
+                if freed >= excess:
+                    break
+                stale.append((old_key,))
+                freed += size
+            conn.executemany("DELETE FROM results WHERE key = ?", stale)
+        conn.commit()
+
+
+class ResultCache:
+    """
+    Memoisation layer for dashboard callbacks.
+
+    Parameters
+    ----------
+    artifacts : sequence of Path
+        Files whose signatures version every entry.
+    code : sequence of module
+        Modules whose packages' sources version every entry.
+    max_entries, max_mb : int
+        Bounds of the in-process LRU.
+    sqlite_path : Path, optional
+        Shared SQLite store (disabled when None).
+    sqlite_mb : int
+        Byte budget of the SQLite store.
+    """
+
+    def __init__(
+        self,
+        artifacts,
+        code=(),
+        max_entries: int = 256,
+        max_mb: int = 256,
+        sqlite_path=None,
+        sqlite_mb: int = 1024,
+    ):
+        self.artifacts = list(artifacts)
+        self.version = artifact_version(self.artifacts, source_hash(code) if code else "")
+        self.memory = _MemoryLRU(max_entries, max_mb * 1024 * 1024)
+        self.store = (
+            _SQLiteStore(sqlite_path, sqlite_mb * 1024 * 1024) if sqlite_path else None
+        )
+        self.hits = self.misses = 0
+
+    def memoize(self, func):
+        """
+        Cache func's results by its arguments and the artefact version.
+        Arguments must be JSON-serialisable (lists are fine); results
+        must pickle.
+        """
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            blob = json.dumps([name, self.version, args, kwargs], sort_keys=True, default=str)
+            key = hashlib.sha256(blob.encode()).hexdigest()
+
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[0]
+
+            if self.store is not None:
+                stored = self.store.get(key)
+                if stored is not None:
+                    self.hits += 1
+                    value = pickle.loads(stored)
+                    self.memory.put(key, value, len(stored))
+                    return value
+
+            self.misses += 1
+            value = func(*args, **kwargs)
+            pickled = _dumps(value)
+            self.memory.put(key, value, len(pickled))
+            if self.store is not None:
+                self.store.put(key, pickled)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
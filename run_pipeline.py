@@ -1,149 +1,627 @@
 from pathlib import Path
+from types import SimpleNamespace
 import argparse
-
-from src.load_data import load_boundary
+import json
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from src import (
+    aggregate,
+    build_grid,
+    crime_cube,
+    emerging_hotspots,
+    ingest,
+    load_data,
+    map_geometry,
+    model_poisson_nb,
+    model_registry,
+    model_rf_gwr,
+    reporting,
+    spatial_stats,
+    timeseries,
+)
+from src.dag import Node, run_dag, stage_path
+from src.map_geometry import GEOJSON_LEVELS, GEOJSON_MANIFEST, write_geojson_cache
+from src.load_data import (
+    CRIME_STORE_MANIFEST,
+    load_boundary,
+    resolve_temporal_scope,
+    scope_from_dict,
+    scope_to_dict,
+)
 from src.build_grid import build_and_save_grid
-from src.aggregate import aggregate_features
+from src.ingest import ensure_crime_store
+from src.aggregate import DEFAULT_CRIME_TYPES, aggregate_features
+from src.crime_cube import CrimeCube
 from src.model_poisson_nb import fit_poisson_nb
-from src.model_rf_gwr import fit_rf, fit_gwr, fit_local_linear
+from src.model_rf_gwr import fit_rf, fit_gwr_native, fit_local_linear
 from src.spatial_stats import (
     compute_moran,
     compute_getis_gi_star,
     compute_kde_intensity,
+    compute_batch_statistics,
+    compute_local_inference,
+    compute_kde_surfaces,
 )
+from src.emerging_hotspots import emerging_hotspots as find_emerging_hotspots
 from src.reporting import generate_pdf_summary
-from src.timeseries import forecast_monthly_crime
-from src.config import MODEL_FILE, MONTHLY_FILE
+from src.timeseries import (
+    forecast_cell_panel,
+    forecast_monthly_crime,
+    select_sarima_order,
+    write_empty_cell_forecast,
+)
+from src.config import (
+    CELL_HOUR_DOW_FILE,
+    CITY_LIMITS_SHP,
+    CRIME_CSV,
+    CRIME_STORE_DIR,
+    CTA_BUS_SHP,
+    CUBE_FILE,
+    EMERGING_HOTSPOTS_FILE,
+    FEATURES_FILE,
+    FORECAST_CELL_FILE,
+    FORECAST_FILE,
+    GEOJSON_DIR,
+    GI_STAR_TABLE_FILE,
+    GRID_FILE,
+    GRID_META_FILE,
+    KDE_CELLS_FILE,
+    KDE_RASTER_FILE,
+    LEDGER_FILE,
+    MODEL_FILE,
+    MONTHLY_FILE,
+    MORAN_TABLE_FILE,
+    SARIMA_LEADERBOARD_FILE,
+    SARIMA_SELECTION_FILE,
+    SCOPE_FILE,
+    SPACE_TIME_GI_FILE,
+    STREETLIGHT_CSV,
+)
+
+# Stage names, in pipeline order (valid values for --force)
+STAGES = [
+    "boundary",
+    "grid",
+    "ingest",
+    "aggregate",
+    "poisson_nb",
+    "rf",
+    "gwr",
+    "spatial_stats",
+    "stats_tables",
+    "kde",
+    "emerging_hotspots",
+    "results",
+    "forecast",
+    "forecast_cells",
+    "report",
+]
+
+# Stages that only read the aggregated features / cube
+PARALLEL_STAGES = [
+    "poisson_nb", "rf", "gwr", "spatial_stats", "stats_tables", "kde",
+    "emerging_hotspots", "forecast", "forecast_cells",
+]
+
+
+def _new_columns(before, after) -> pd.DataFrame:
+    """
+    cell_id plus the columns a model added to the features.
+    """
+    added = [c for c in after.columns if c not in before.columns]
+    return pd.DataFrame(after[["cell_id"] + added])
 
 
 # ---------------------------------------------------------------------
-# Main pipeline
+# Stages
 # ---------------------------------------------------------------------
 
-def run_pipeline(year: int = 2025, hex_diameter: float = 500.0):
-    """
-    End-to-end spatial analytics pipeline.
+def _stage_boundary(up):
+    print("=== STEP 1: Loading city boundary ===")
+    return load_boundary()
 
-    This function is intentionally side-effectful:
-    - builds spatial grid
-    - aggregates multi-year crime data
-    - fits statistical and ML models
-    - computes spatial diagnostics
-    - persists all outputs to disk
 
-    Designed for:
-    - local research execution
-    - containerised batch execution
-    """
+def _stage_grid(up, hex_diameter):
+    print("\n=== STEP 2: Building hex grid ===")
+    grid = build_and_save_grid(up["boundary"], hex_diameter=hex_diameter)
+    print(f"Grid built with {len(grid)} cells.")
+    return grid
 
-    # ------------------------------------------------------------------
-    # STEP 1: Load city boundary
-    # ------------------------------------------------------------------
 
-    print("=== STEP 1: Loading city boundary ===")
-    boundary = load_boundary()
+def _stage_ingest(up, rebuild_store, incremental):
+    print("\n=== STEP 3: Ingesting crime CSV into Parquet store ===")
+    return ensure_crime_store(force=rebuild_store, incremental=incremental)
 
-    # ------------------------------------------------------------------
-    # STEP 2: Build hex grid
-    # ------------------------------------------------------------------
 
-    print("\n=== STEP 2: Building hex grid ===")
-    grid = build_and_save_grid(boundary, hex_diameter=hex_diameter)
-    print(f"Grid built with {len(grid)} cells.")
+def _stage_aggregate(up, scope, crime_types, workers, incremental):
+    print("\n=== STEP 4: Aggregating crime + environmental features ===")
+    features_gdf, cube, crime_types = aggregate_features(
+        primary_types=crime_types,
+        scope=scope_from_dict(scope),
+        workers=workers,
+        incremental=incremental,
+    )
+    return features_gdf, cube, crime_types
 
-    # ------------------------------------------------------------------
-    # STEP 3: Aggregate features
-    # ------------------------------------------------------------------
 
-    print("\n=== STEP 3: Aggregating crime + environmental features ===")
-    features_gdf, monthly, crime_types = aggregate_features()
+def _load_aggregate(crime_types):
+    return gpd.read_parquet(FEATURES_FILE), CrimeCube.load(CUBE_FILE), crime_types
 
-    # ------------------------------------------------------------------
-    # STEP 4: Poisson & Negative Binomial regression
-    # ------------------------------------------------------------------
 
-    print("\n=== STEP 4: Fitting Poisson + Negative Binomial models ===")
-    pois, nb, features_gdf, dispersion = fit_poisson_nb(features_gdf)
+def _stage_poisson_nb(up):
+    print("\n=== STEP 5: Fitting Poisson + Negative Binomial models ===")
+    features_gdf = up["aggregate"][0]
+    pois, nb, fitted, dispersion = fit_poisson_nb(features_gdf.copy())
     print(f"Poisson dispersion ratio: {dispersion:.4f}")
+    return _new_columns(features_gdf, fitted)
 
-    # ------------------------------------------------------------------
-    # STEP 5: Random Forest
-    # ------------------------------------------------------------------
 
-    print("\n=== STEP 5: Fitting Random Forest model ===")
-    rf, features_gdf = fit_rf(features_gdf)
+def _stage_rf(up, n_jobs):
+    print("\n=== STEP 6: Fitting Random Forest model ===")
+    features_gdf = up["aggregate"][0]
+    rf, fitted = fit_rf(features_gdf.copy(), n_jobs=n_jobs)
+    return _new_columns(features_gdf, fitted)
 
-    # ------------------------------------------------------------------
-    # STEP 6: GWR or Local Linear fallback
-    # ------------------------------------------------------------------
 
-    print("\n=== STEP 6: Fitting GWR / Local Linear model ===")
+def _stage_gwr(up, max_neighbours):
+    print("\n=== STEP 7: Fitting GWR / Local Linear model ===")
+    features_gdf = up["aggregate"][0]
     try:
-        if len(features_gdf) > 6000:
-            print("Grid too large for MGWR. Using local linear fallback.")
-            features_gdf = fit_local_linear(features_gdf)
-        else:
-            gwr, features_gdf = fit_gwr(features_gdf)
+        gwr, fitted = fit_gwr_native(features_gdf.copy(), max_neighbours=max_neighbours)
     except Exception as exc:
         print("GWR failed; using local linear fallback.")
         print(f"Reason: {exc}")
-        features_gdf = fit_local_linear(features_gdf)
+        fitted = fit_local_linear(features_gdf.copy())
+    return _new_columns(features_gdf, fitted)
+
 
-    # ------------------------------------------------------------------
-    # STEP 7: Spatial statistics
-    # ------------------------------------------------------------------
+def _stage_spatial_stats(up, kde_bandwidth, permutations, seed, workers):
+    print("\n=== STEP 8: Spatial statistics ===")
+    features_gdf = up["aggregate"][0]
+    gdf = features_gdf.copy()
 
-    print("\n=== STEP 7: Spatial statistics ===")
-    moran = compute_moran(features_gdf)
+    moran = compute_moran(gdf)
     print(f"Moran's I: {moran.I:.4f}, p-value: {moran.p_norm:.6f}")
 
-    features_gdf = compute_getis_gi_star(features_gdf)
-    features_gdf = compute_kde_intensity(
-        features_gdf,
-        bandwidth=750.0,  # aligned with 500 m grid resolution
+    gdf = compute_getis_gi_star(gdf)
+    gdf = compute_local_inference(
+        gdf, permutations=permutations, seed=seed, workers=workers
+    )
+    print(
+        f"Gi* hotspots (FDR 5%): {int(gdf['gi_fdr'].sum())}, "
+        f"LISA clusters: {gdf['lisa_cluster'].value_counts().to_dict()}"
+    )
+    gdf = compute_kde_intensity(gdf, bandwidth=kde_bandwidth)
+
+    return {
+        "columns": _new_columns(features_gdf, gdf),
+        "moran": SimpleNamespace(I=float(moran.I), p_norm=float(moran.p_norm)),
+    }
+
+
+def _save_spatial_stats(result):
+    result["columns"].to_parquet(stage_path("spatial_stats"))
+    with open(stage_path("spatial_stats_moran", ".json"), "w") as f:
+        json.dump(vars(result["moran"]), f, indent=2)
+
+
+def _load_spatial_stats():
+    with open(stage_path("spatial_stats_moran", ".json")) as f:
+        moran = SimpleNamespace(**json.load(f))
+    return {"columns": pd.read_parquet(stage_path("spatial_stats")), "moran": moran}
+
+
+def _stage_stats_tables(up, k):
+    print("\n=== STEP 8b: Moran's I / Gi* for every type, month and hour/dow slice ===")
+    features_gdf, cube, _ = up["aggregate"]
+    moran, gi_star = compute_batch_statistics(features_gdf, cube, k=k)
+
+    MORAN_TABLE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    moran.to_parquet(MORAN_TABLE_FILE, index=False)
+    gi_star.to_parquet(GI_STAR_TABLE_FILE, index=False)
+    print(f"Saved {len(moran)} Moran's I rows to: {MORAN_TABLE_FILE}")
+    return MORAN_TABLE_FILE
+
+
+def _stage_kde(up, bandwidth, resolution):
+    print("\n=== STEP 8c: KDE surfaces per crime type and month ===")
+    features_gdf, cube, _ = up["aggregate"]
+    cells, raster = compute_kde_surfaces(
+        features_gdf, cube, bandwidth=bandwidth, resolution=resolution
     )
 
-    # ------------------------------------------------------------------
-    # STEP 8: Persist model outputs
-    # ------------------------------------------------------------------
+    KDE_CELLS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    cells.to_parquet(KDE_CELLS_FILE, index=False)
+    np.savez_compressed(KDE_RASTER_FILE, **raster)
+    print(f"Saved KDE intensity to: {KDE_CELLS_FILE} (rasters: {KDE_RASTER_FILE})")
+    return KDE_CELLS_FILE
+
+
+def _stage_emerging_hotspots(up, k, time_window, alpha):
+    print("\n=== STEP 8d: Emerging hot spot analysis ===")
+    features_gdf, cube, _ = up["aggregate"]
+    cells, cell_months = find_emerging_hotspots(
+        features_gdf, cube, k=k, time_window=time_window, alpha=alpha
+    )
+    print(f"Emerging hot spots: {cells['category'].value_counts().to_dict()}")
+
+    EMERGING_HOTSPOTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    cells.to_parquet(EMERGING_HOTSPOTS_FILE, index=False)
+    cell_months.to_parquet(SPACE_TIME_GI_FILE, index=False)
+    print(f"Saved emerging hot spots to: {EMERGING_HOTSPOTS_FILE}")
+    return EMERGING_HOTSPOTS_FILE
+
+
+def _stage_results(up):
+    print("\n=== STEP 9: Saving model outputs ===")
+    features_gdf = up["aggregate"][0]
+    for name in ["poisson_nb", "rf", "gwr"]:
+        features_gdf = features_gdf.merge(up[name], on="cell_id", how="left")
+    features_gdf = features_gdf.merge(
+        up["spatial_stats"]["columns"], on="cell_id", how="left"
+    )
 
-    print("\n=== STEP 8: Saving model outputs ===")
     MODEL_FILE.parent.mkdir(parents=True, exist_ok=True)
     features_gdf.to_parquet(MODEL_FILE)
     print(f"Saved model results to: {MODEL_FILE}")
 
-    # ------------------------------------------------------------------
-    # STEP 9: Temporal forecasting
-    # ------------------------------------------------------------------
+    # Dashboard map geometry, keyed to the cells in MODEL_FILE
+    write_geojson_cache(features_gdf)
+    return features_gdf
+
+
+def _stage_forecast(up, horizon, tune, workers=1):
+    print("\n=== STEP 10: Forecasting monthly crime ===")
+    orders = {}
+    if tune:
+        _, best = select_sarima_order(
+            up["aggregate"][1], horizon=horizon, workers=workers
+        )
+        orders = {
+            "order": tuple(best["order"]),
+            "seasonal_order": tuple(best["seasonal_order"]),
+        }
 
-    print("\n=== STEP 9: Forecasting monthly crime ===")
     history, forecast, forecast_path = forecast_monthly_crime(
-        monthly,
-        horizon=6,
+        up["aggregate"][1],
+        horizon=horizon,
+        **orders,
     )
     print(f"Saved forecast to: {forecast_path}")
+    return forecast_path
+
+
+def _stage_forecast_cells(up, horizon, interval, min_history):
+    print("\n=== STEP 10b: Forecasting monthly crime per cell ===")
+    features_gdf, cube, _ = up["aggregate"]
+
+    # Short temporal scopes (e.g. --months 3) leave nothing to train on
+    n_months = len(cube.month_range())
+    if n_months <= min_history:
+        print(
+            f"Warning: {n_months} months of history (need more than "
+            f"{min_history}); writing an empty cell forecast."
+        )
+        forecast_df, forecast_path = write_empty_cell_forecast()
+    else:
+        forecast_df, forecast_path = forecast_cell_panel(
+            cube, features_gdf, horizon=horizon, interval=interval,
+            min_history=min_history,
+        )
+    print(f"Saved cell forecast ({len(forecast_df)} rows) to: {forecast_path}")
+    return forecast_path
+
+
+def _stage_report(up):
+    print("\n=== STEP 11: Generating PDF summary report ===")
+    pdf_path = generate_pdf_summary(up["results"], up["spatial_stats"]["moran"])
+    print(f"Saved PDF summary to: {pdf_path}")
+    return pdf_path
 
-    MONTHLY_FILE.parent.mkdir(parents=True, exist_ok=True)
-    monthly.to_parquet(MONTHLY_FILE)
-    print(f"Saved monthly table to: {MONTHLY_FILE}")
 
-    # ------------------------------------------------------------------
-    # STEP 10: PDF summary report
-    # ------------------------------------------------------------------
+def _save_report(pdf_path):
+    with open(stage_path("report", ".json"), "w") as f:
+        json.dump({"pdf_path": str(pdf_path)}, f, indent=2)
 
-    print("\n=== STEP 10: Generating PDF summary report ===")
-    pdf_path = generate_pdf_summary(features_gdf, moran)
-    print(f"Saved PDF summary to: {pdf_path}")
+
+def _load_report():
+    with open(stage_path("report", ".json")) as f:
+        return Path(json.load(f)["pdf_path"])
+
+
+def _frame_stage(name, **kwargs):
+    """
+    Model stage whose result is a cell_id-keyed column frame.
+    """
+    path = stage_path(name)
+    return Node(
+        name,
+        outputs=[path],
+        save=lambda df: df.to_parquet(path),
+        load=lambda: pd.read_parquet(path),
+        **kwargs,
+    )
+
+
+def build_pipeline(
+    scope=None,
+    hex_diameter: float = 500.0,
+    crime_types=None,
+    rebuild_store: bool = False,
+    incremental: bool = False,
+    workers: int = 1,
+    jobs: int = 1,
+    cpu_budget: int = None,
+    tune_forecast: bool = False,
+):
+    """
+    Declare the pipeline DAG.
+
+    boundary → grid ─┐
+    ingest ──────────┴→ aggregate → poisson_nb / rf / gwr / spatial_stats
+                                  → stats_tables / kde / emerging_hotspots
+                                  → results → report
+                                  → forecast / forecast_cells
+
+    The nine stages after aggregate only read its outputs and are
+    marked parallel; with jobs > 1 they share the CPU budget, the
+    random forest taking the cores the other stages leave (one each,
+    `workers` for the spatial statistics permutation pool and for the
+    SARIMA order search when tune_forecast is set).
+    """
+    crime_types = list(crime_types or DEFAULT_CRIME_TYPES)
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    forecast_cpus = workers if tune_forecast else 1
+    other_cpus = (len(PARALLEL_STAGES) - 3) + workers + forecast_cpus
+    rf_cpus = max(1, cpu_budget - other_cpus) if jobs > 1 else cpu_budget
+
+    return [
+        Node(
+            "boundary",
+            _stage_boundary,
+            code=[load_data],
+            inputs=[CITY_LIMITS_SHP],
+            outputs=[stage_path("boundary")],
+            save=lambda gdf: gdf.to_parquet(stage_path("boundary")),
+            load=lambda: gpd.read_parquet(stage_path("boundary")),
+        ),
+        Node(
+            "grid",
+            _stage_grid,
+            deps=["boundary"],
+            params={"hex_diameter": hex_diameter},
+            code=[build_grid],
+            outputs=[GRID_FILE, GRID_META_FILE],
+            load=lambda: gpd.read_file(GRID_FILE),
+        ),
+        Node(
+            "ingest",
+            _stage_ingest,
+            options={"rebuild_store": rebuild_store, "incremental": incremental},
+            code=[ingest, load_data],
+            inputs=[CRIME_CSV],
+            outputs=[CRIME_STORE_DIR / CRIME_STORE_MANIFEST],
+            load=lambda: CRIME_STORE_DIR,
+        ),
+        Node(
+            "aggregate",
+            _stage_aggregate,
+            deps=["grid", "ingest"],
+            params={"scope": scope_to_dict(scope), "crime_types": crime_types},
+            options={"workers": workers, "incremental": incremental},
+            code=[aggregate, load_data, crime_cube, build_grid],
+            inputs=[STREETLIGHT_CSV, CTA_BUS_SHP],
+            outputs=[
+                FEATURES_FILE,
+                CUBE_FILE,
+                CELL_HOUR_DOW_FILE,
+                MONTHLY_FILE,
+                SCOPE_FILE,
+                LEDGER_FILE,
+            ],
+            load=lambda: _load_aggregate(crime_types),
+        ),
+        _frame_stage(
+            "poisson_nb",
+            run=_stage_poisson_nb,
+            deps=["aggregate"],
+            code=[model_poisson_nb, model_registry],
+            parallel=True,
+        ),
+        _frame_stage(
+            "rf",
+            run=_stage_rf,
+            deps=["aggregate"],
+            options={"n_jobs": rf_cpus if jobs > 1 else -1},
+            code=[model_rf_gwr, model_registry],
+            parallel=True,
+            cpus=rf_cpus,
+        ),
+        _frame_stage(
+            "gwr",
+            run=_stage_gwr,
+            deps=["aggregate"],
+            params={"max_neighbours": 1000},
+            code=[model_rf_gwr],
+            parallel=True,
+        ),
+        Node(
+            "spatial_stats",
+            _stage_spatial_stats,
+            deps=["aggregate"],
+            # aligned with 500 m grid resolution
+            params={"kde_bandwidth": 750.0, "permutations": 999, "seed": 12345},
+            options={"workers": workers},
+            code=[spatial_stats],
+            outputs=[stage_path("spatial_stats"), stage_path("spatial_stats_moran", ".json")],
+            save=_save_spatial_stats,
+            load=_load_spatial_stats,
+            parallel=True,
+            cpus=workers,
+        ),
+        Node(
+            "stats_tables",
+            _stage_stats_tables,
+            deps=["aggregate"],
+            params={"k": 8},
+            code=[spatial_stats],
+            outputs=[MORAN_TABLE_FILE, GI_STAR_TABLE_FILE],
+            load=lambda: MORAN_TABLE_FILE,
+            parallel=True,
+        ),
+        Node(
+            "kde",
+            _stage_kde,
+            deps=["aggregate"],
+            params={"bandwidth": 750.0, "resolution": 100.0},
+            code=[spatial_stats],
+            outputs=[KDE_CELLS_FILE, KDE_RASTER_FILE],
+            load=lambda: KDE_CELLS_FILE,
+            parallel=True,
+        ),
+        Node(
+            "emerging_hotspots",
+            _stage_emerging_hotspots,
+            deps=["aggregate"],
+            params={"k": 8, "time_window": 1, "alpha": 0.05},
+            code=[emerging_hotspots, spatial_stats],
+            outputs=[EMERGING_HOTSPOTS_FILE, SPACE_TIME_GI_FILE],
+            load=lambda: EMERGING_HOTSPOTS_FILE,
+            parallel=True,
+        ),
+        Node(
+            "results",
+            _stage_results,
+            deps=["aggregate", "poisson_nb", "rf", "gwr", "spatial_stats"],
+            code=[map_geometry],
+            outputs=[MODEL_FILE, GEOJSON_DIR / GEOJSON_MANIFEST]
+            + [GEOJSON_DIR / f"{level}.geojson" for level in GEOJSON_LEVELS],
+            load=lambda: gpd.read_parquet(MODEL_FILE),
+        ),
+        Node(
+            "forecast",
+            _stage_forecast,
+            deps=["aggregate"],
+            params={"horizon": 6, "tune": tune_forecast},
+            options={"workers": workers},
+            code=[timeseries, model_registry],
+            outputs=[FORECAST_FILE]
+            + ([SARIMA_LEADERBOARD_FILE, SARIMA_SELECTION_FILE] if tune_forecast else []),
+            load=lambda: FORECAST_FILE,
+            parallel=True,
+            cpus=forecast_cpus,
+        ),
+        Node(
+            "forecast_cells",
+            _stage_forecast_cells,
+            deps=["aggregate"],
+            params={"horizon": 6, "interval": 0.9, "min_history": 3},
+            code=[timeseries, spatial_stats],
+            outputs=[FORECAST_CELL_FILE],
+            load=lambda: FORECAST_CELL_FILE,
+            parallel=True,
+        ),
+        Node(
+            "report",
+            _stage_report,
+            deps=["results", "spatial_stats"],
+            code=[reporting],
+            outputs=[stage_path("report", ".json")],
+            save=_save_report,
+            load=_load_report,
+        ),
+    ]
+
+
+# ---------------------------------------------------------------------
+# Main pipeline
+# ---------------------------------------------------------------------
+
+def run_pipeline(
+    year: int = None,
+    hex_diameter: float = 500.0,
+    rebuild_store: bool = False,
+    start: str = None,
+    end: str = None,
+    months: int = None,
+    workers: int = 1,
+    incremental: bool = False,
+    force=(),
+    jobs: int = 1,
+    cpu_budget: int = None,
+    tune_forecast: bool = False,
+):
+    """
+    End-to-end spatial analytics pipeline.
+
+    This function is intentionally side-effectful:
+    - builds spatial grid
+    - converts the raw CSV to a Parquet store (only when it changed)
+    - aggregates multi-year crime data
+    - fits statistical and ML models
+    - computes spatial diagnostics
+    - persists all outputs to disk
+
+    Designed for:
+    - local research execution
+    - containerised batch execution
+
+    year / start / end / months restrict the crimes that are read (see
+    load_data.resolve_temporal_scope); with none of them set the full
+    history is aggregated. workers > 1 counts crime chunks and runs
+    the local-statistic permutations on a process pool.
+    incremental=True appends only new / updated crime rows to the store
+    and the previous aggregation (nightly refresh).
+
+    The steps run as a cached DAG (see src.dag): a stage is skipped
+    when its parameters, code, input files and upstream stages are
+    unchanged since it last completed, and an interrupted run resumes
+    from the first unfinished stage. `force` names stages to re-run
+    anyway ("all" for everything). jobs > 1 runs the independent model,
+    statistics and forecast stages concurrently on a process pool
+    within cpu_budget cores (default: all); model_results.parquet is
+    merged in a fixed order, so it does not depend on completion
+    order. tune_forecast=True picks the citywide SARIMA orders by a
+    rolling-origin backtest (timeseries.select_sarima_order, using
+    `workers` processes) instead of the fixed defaults.
+    """
+
+    scope = resolve_temporal_scope(year=year, start=start, end=end, months=months)
+    print(f"Temporal scope: {scope_to_dict(scope)}")
+
+    if rebuild_store:
+        force = set(force) | {"ingest"}
+
+    results = run_dag(
+        build_pipeline(
+            scope=scope,
+            hex_diameter=hex_diameter,
+            rebuild_store=rebuild_store,
+            incremental=incremental,
+            workers=workers,
+            jobs=jobs,
+            cpu_budget=cpu_budget,
+            tune_forecast=tune_forecast,
+        ),
+        force=force,
+        jobs=jobs,
+        cpu_budget=cpu_budget,
+    )
 
     print("\n=== PIPELINE COMPLETE ===")
 
+    features_gdf, monthly, crime_types = results["aggregate"]
     return {
-        "features": features_gdf,
+        "features": results["results"],
         "monthly": monthly,
         "crime_types": crime_types,
-        "moran": moran,
-        "forecast_path": forecast_path,
-        "pdf_path": pdf_path,
+        "moran": results["spatial_stats"]["moran"],
+        "forecast_path": results["forecast"],
+        "pdf_path": results["report"],
     }
 
 
@@ -155,12 +633,72 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Run the Chicago Crime Spatial Analysis pipeline."
     )
-    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument(
+        "--year", type=int, default=None,
+        help="Only aggregate crimes from this calendar year.",
+    )
+    parser.add_argument(
+        "--start", type=str, default=None,
+        help="First day to include (YYYY-MM-DD).",
+    )
+    parser.add_argument(
+        "--end", type=str, default=None,
+        help="Last day to include (YYYY-MM-DD).",
+    )
+    parser.add_argument(
+        "--months", type=int, default=None,
+        help="Only keep the trailing N calendar months of the range.",
+    )
     parser.add_argument("--hex-diameter", type=float, default=500.0)
+    parser.add_argument(
+        "--rebuild-store",
+        action="store_true",
+        help="Re-ingest the raw CSV even if the Parquet store is current.",
+    )
+
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Worker processes for chunk aggregation and permutations (1 = serial).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only process crimes added or updated since the last run.",
+    )
+    parser.add_argument(
+        "--force",
+        action="append",
+        default=[],
+        choices=STAGES + ["all"],
+        help="Re-run a stage even if its cached result is current (repeatable).",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=1,
+        help="Pipeline stages run concurrently after aggregation (1 = sequential).",
+    )
+    parser.add_argument(
+        "--cpu-budget", type=int, default=None,
+        help="CPU cores shared by concurrent stages (default: all).",
+    )
+    parser.add_argument(
+        "--tune-forecast",
+        action="store_true",
+        help="Choose the SARIMA orders by rolling-origin backtest before forecasting.",
+    )
 
     args = parser.parse_args()
 
     run_pipeline(
         year=args.year,
         hex_diameter=args.hex_diameter,
+        rebuild_store=args.rebuild_store,
+        start=args.start,
+        end=args.end,
+        months=args.months,
+        workers=args.workers,
+        incremental=args.incremental,
+        force=args.force,
+        jobs=args.jobs,
+        cpu_budget=args.cpu_budget,
+        tune_forecast=args.tune_forecast,
     )
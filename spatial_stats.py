@@ -1,20 +1,144 @@
+import hashlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+import pandas as pd
 import geopandas as gpd
-from sklearn.neighbors import KernelDensity
+from scipy import sparse, stats
+from scipy.signal import fftconvolve
+from scipy.spatial import cKDTree
 
 import libpysal
 import esda
 
+from .config import DEFAULT_CRS, WEIGHTS_DIR
+
+
+# ---------------------------------------------------------------------
+# KNN spatial weights (cached)
+# ---------------------------------------------------------------------
+# The neighbour structure of a grid is computed once per (grid, k):
+# it is stored as a binary CSR matrix (indptr.npy / indices.npy) under
+# WEIGHTS_DIR, memory-mapped on load, and the resulting weights object
+# is shared by every statistic in the process (pipeline and dashboard).
+
+_WEIGHTS_MEMO = {}
+
+
+def _cell_coords(gdf: gpd.GeoDataFrame) -> np.ndarray:
+    """
+    Cell centroids in the projected CRS.
+    """
+    if gdf.crs is not None and gdf.crs.is_geographic:
+        gdf = gdf.to_crs(epsg=DEFAULT_CRS)
+    centroids = gdf.geometry.centroid
+    return np.column_stack([centroids.x.values, centroids.y.values])
+
+
+def grid_hash(coords: np.ndarray) -> str:
+    """
+    Content hash of a grid's (ordered) cell centroids, rounded to the
+    centimetre so a grid read back through another CRS hashes the same.
+    """
+    rounded = np.round(np.asarray(coords, dtype=np.float64), 2) + 0.0
+    return hashlib.sha256(np.ascontiguousarray(rounded).tobytes()).hexdigest()
+
+
+def _knn_csr(coords: np.ndarray, k: int) -> sparse.csr_matrix:
+    """
+    Binary KNN neighbour matrix, matching libpysal.weights.KNN (same
+    kd-tree query, same self-exclusion and tie handling).
+    """
+    n = len(coords)
+    _, indices = cKDTree(coords, leafsize=10).query(coords, k=k + 1)
+    indices = indices.reshape(n, k + 1)
+
+    not_self = indices != np.arange(n).reshape(-1, 1)
+    # Duplicate points can push a site out of its own k+1 list
+    not_self[not_self.sum(axis=1) == k + 1, -1] = False
+    neighbours = indices[not_self].reshape(n, k)
+
+    indptr = np.arange(0, n * k + 1, k, dtype=np.int64)
+    return sparse.csr_matrix(
+        (np.ones(n * k), neighbours.ravel().astype(np.int32), indptr),
+        shape=(n, n),
+    )
+
+
+def _load_csr(path):
+    try:
+        indptr = np.load(path / "indptr.npy", mmap_mode="r")
+        indices = np.load(path / "indices.npy", mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    n = len(indptr) - 1
+    return sparse.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(n, n))
+
+
+def _save_csr(path, csr):
+    """
+    Best effort: the dashboard may run on a read-only volume.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "indptr.npy", csr.indptr)
+        np.save(tmp / "indices.npy", csr.indices)
+        shutil.rmtree(path, ignore_errors=True)
+        tmp.rename(path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _neighbours_for(coords: np.ndarray, k: int):
+    k = min(k, max(1, len(coords) - 1))
+    key = f"knn{k}_{grid_hash(coords)[:20]}"
+
+    path = WEIGHTS_DIR / key
+    csr = _load_csr(path)
+    if csr is None or csr.shape[0] != len(coords):
+        csr = _knn_csr(coords, k)
+        _save_csr(path, csr)
+    return csr, key
+
+
+def knn_neighbours(gdf: gpd.GeoDataFrame, k: int = 8):
+    """
+    Binary (n x n) CSR KNN neighbour matrix of the grid cells, keyed by
+    grid hash and k.
+
+    Returns
+    -------
+    (csr, key) where key identifies the (grid, k) pair.
+    """
+    return _neighbours_for(_cell_coords(gdf), k)
+
+
+def get_knn_weights(gdf: gpd.GeoDataFrame, k: int = 8):
+    """
+    Row-standardised KNN weights, shared across calls for the same
+    grid and k.
+    """
+    coords = _cell_coords(gdf)
+    memo_key = (grid_hash(coords), min(k, max(1, len(coords) - 1)))
+
+    w = _WEIGHTS_MEMO.get(memo_key)
+    if w is None:
+        csr, _ = _neighbours_for(coords, k)
+        w = libpysal.weights.W.from_sparse(csr)
+        w.transform = "r"
+        _WEIGHTS_MEMO[memo_key] = w
+    return w
+
 
 def _make_knn_weights(gdf: gpd.GeoDataFrame, k: int = 8):
     """
     Build a KNN weights matrix. This avoids islands and scales better
     for large hex grids than Queen contiguity.
     """
-    k = min(k, max(1, len(gdf) - 1))
-    w = libpysal.weights.KNN.from_dataframe(gdf, k=k, silence_warnings=True)
-    w.transform = "r"
-    return w
+    return get_knn_weights(gdf, k=k)
 
 
 def compute_moran(gdf: gpd.GeoDataFrame):
@@ -22,7 +146,7 @@ def compute_moran(gdf: gpd.GeoDataFrame):
     Compute global Moran's I on crime_count_total using KNN weights.
     """
     y = gdf["crime_count_total"].values.astype(float)
-    w = _make_knn_weights(gdf, k=8)
+    w = get_knn_weights(gdf, k=8)
     mi = esda.Moran(y, w)
     return mi
 
@@ -38,7 +162,7 @@ def compute_getis_gi_star(gdf: gpd.GeoDataFrame):
         raise ValueError("crime_count_total not found in GeoDataFrame.")
 
     y = gdf["crime_count_total"].values.astype(float)
-    w = _make_knn_weights(gdf, k=8)
+    w = get_knn_weights(gdf, k=8)
 
     # permutations=0 → analytical, no Monte Carlo (fast)
     gi = esda.getisord.G_Local(y, w, transform="r", star=True, permutations=0)
@@ -46,19 +170,677 @@ def compute_getis_gi_star(gdf: gpd.GeoDataFrame):
     return gdf
 
 
-def compute_kde_intensity(gdf: gpd.GeoDataFrame, bandwidth: float = 200.0):
+# ---------------------------------------------------------------------
+# Batched Moran's I / Gi* over many variables
+# ---------------------------------------------------------------------
+# Every column of an (n_cells x n_variables) matrix Y is one variable.
+# The spatial lag of all of them is a single sparse product W @ Y, so
+# the cost of a thousand variables is close to that of one. Results
+# match esda.Moran (analytical inference) and esda G_Local(star=True,
+# transform="r", permutations=0) column by column.
+
+def _row_standardise(csr: sparse.csr_matrix) -> sparse.csr_matrix:
+    rows = np.asarray(csr.sum(axis=1)).ravel()
+    scale = np.divide(1.0, rows, out=np.zeros_like(rows, dtype=float), where=rows > 0)
+    return sparse.csr_matrix(sparse.diags(scale) @ csr)
+
+
+def weight_moments(w: sparse.csr_matrix):
+    """
+    (S0, S1, S2) of a weights matrix, as used by Moran's I inference.
+    """
+    w = sparse.csr_matrix(w, dtype=np.float64)
+    s0 = w.sum()
+    s1 = 0.5 * (w + w.T).power(2).sum()
+    s2 = ((np.asarray(w.sum(axis=1)).ravel() + np.asarray(w.sum(axis=0)).ravel()) ** 2).sum()
+    return float(s0), float(s1), float(s2)
+
+
+def batch_moran(Y: np.ndarray, neighbours: sparse.csr_matrix) -> pd.DataFrame:
     """
-    Compute KDE intensity at cell centroids using Gaussian kernel.
+    Global Moran's I with analytical inference for every column of Y.
+
+    Parameters
+    ----------
+    Y : array (n_cells, n_variables)
+    neighbours : binary (n x n) CSR neighbour matrix (knn_neighbours);
+        it is row-standardised here.
+
+    Returns
+    -------
+    DataFrame with one row per column of Y: I, EI, VI_norm, z_norm,
+    p_norm, VI_rand, z_rand, p_rand (two-tailed p-values). Constant
+    columns get NaN.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    n = Y.shape[0]
+
+    w = _row_standardise(neighbours)
+    s0, s1, s2 = weight_moments(w)
+
+    Z = Y - Y.mean(axis=0)
+    z2ss = (Z * Z).sum(axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        I = n / s0 * (Z * (w @ Z)).sum(axis=0) / z2ss
+
+        EI = -1.0 / (n - 1)
+        n2, s02 = n * n, s0 * s0
+        VI_norm = (n2 * s1 - n * s2 + 3 * s02) / ((n - 1) * (n + 1) * s02) - EI**2
+
+        # Randomisation variance depends on each variable's kurtosis
+        k = ((Z**4).sum(axis=0) / n) / (z2ss / n) ** 2
+        A = n * ((n2 - 3 * n + 3) * s1 - n * s2 + 3 * s02)
+        B = k * ((n2 - n) * s1 - 2 * n * s2 + 6 * s02)
+        VI_rand = (A - B) / ((n - 1) * (n - 2) * (n - 3) * s02) - EI**2
+
+        z_norm = (I - EI) / np.sqrt(VI_norm)
+        z_rand = (I - EI) / np.sqrt(VI_rand)
+
+    return pd.DataFrame(
+        {
+            "I": I,
+            "EI": EI,
+            "VI_norm": VI_norm,
+            "z_norm": z_norm,
+            "p_norm": 2.0 * stats.norm.sf(np.abs(z_norm)),
+            "VI_rand": VI_rand,
+            "z_rand": z_rand,
+            "p_rand": 2.0 * stats.norm.sf(np.abs(z_rand)),
+        }
+    )
+
+
+def batch_gi_star(Y: np.ndarray, neighbours: sparse.csr_matrix) -> np.ndarray:
+    """
+    Getis-Ord Gi* z-scores for every column of Y.
+
+    The self-weight equals a neighbour's weight before the rows are
+    standardised (esda's default for Gi* on row-standardised KNN).
+
+    Returns
+    -------
+    array (n_cells, n_variables); constant or all-zero columns are NaN.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    n = Y.shape[0]
+
+    binary = sparse.csr_matrix(neighbours, dtype=np.float64)
+    w = _row_standardise(binary + sparse.identity(n, format="csr"))
+    cardinality = np.asarray(w.sum(axis=1)).ravel()[:, None]
+
+    total = Y.sum(axis=0)
+    mean = total / n
+    variance = (Y * Y).sum(axis=0) / n - mean**2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        G = (w @ Y) / total
+        EG = cardinality / n
+        VG = cardinality * (n - cardinality) / (n - 1) / n**2 * (variance / mean**2)
+        return (G - EG) / np.sqrt(VG)
+
+
+def _cube_families(cube):
+    """
+    (family, labels, matrix) blocks of per-cell variables built from a
+    CrimeCube; matrices are (n_cells, n_labels) in cube.cell_ids order.
+    """
+    n = len(cube.cell_ids)
+    types = [str(t) for t in cube.axis_labels("primary_type")]
+    months = [str(m) for m in cube.axis_labels("month")]
+
+    yield "total", ["all"], cube.sum(("month", "hour", "dow", "primary_type")).reshape(n, 1)
+    yield "primary_type", types, cube.sum(("month", "hour", "dow"))
+    yield "month", months, cube.sum(("hour", "dow", "primary_type"))
+    yield "hour", [f"{h:02d}" for h in range(24)], cube.sum(("month", "dow", "primary_type"))
+    yield "dow", [str(d) for d in range(7)], cube.sum(("month", "hour", "primary_type"))
+    yield (
+        "hour_dow",
+        [f"{h:02d}|{d}" for h in range(24) for d in range(7)],
+        cube.sum(("month", "primary_type")).reshape(n, -1),
+    )
+
+
+def compute_batch_statistics(gdf: gpd.GeoDataFrame, cube, k: int = 8):
+    """
+    Moran's I and Gi* for every crime type, month, hour, day of week
+    and hour x dow slot of the cube.
+
+    Parameters
+    ----------
+    gdf : GeoDataFrame
+        Grid cells (with cell_id); fixes the cell order and weights.
+    cube : CrimeCube
+
+    Returns
+    -------
+    (moran, gi_star) tidy DataFrames:
+    moran   — family, variable, n_crimes and the batch_moran() columns
+    gi_star — family, variable, cell_id, gi_star
+    """
+    csr, _ = knn_neighbours(gdf, k=k)
+    cell_ids = gdf["cell_id"].values
+    rows = pd.Index(cube.cell_ids).get_indexer(cell_ids)
+
+    moran_parts, gi_parts = [], []
+    for family, labels, matrix in _cube_families(cube):
+        Y = np.zeros((len(cell_ids), matrix.shape[1]), dtype=np.float64)
+        Y[rows >= 0] = matrix[rows[rows >= 0]]
+
+        moran = batch_moran(Y, csr)
+        moran.insert(0, "n_crimes", Y.sum(axis=0).astype(np.int64))
+        moran.insert(0, "variable", labels)
+        moran.insert(0, "family", family)
+        moran_parts.append(moran)
+
+        z = batch_gi_star(Y, csr).astype(np.float32)
+        gi_parts.append(
+            pd.DataFrame(
+                {
+                    "family": family,
+                    "variable": np.repeat(np.asarray(labels, dtype=object), len(cell_ids)),
+                    "cell_id": np.tile(cell_ids, len(labels)),
+                    "gi_star": z.T.ravel(),
+                }
+            )
+        )
+        print(f"[STATS] {family}: {len(labels)} variables")
+
+    moran = pd.concat(moran_parts, ignore_index=True)
+    gi_star = pd.concat(gi_parts, ignore_index=True)
+    for col in ["family", "variable"]:
+        gi_star[col] = gi_star[col].astype("category")
+    return moran, gi_star
+
+
+# ---------------------------------------------------------------------
+# Conditional permutation inference (Gi* and local Moran's I)
+# ---------------------------------------------------------------------
+# Each site keeps its own value while its neighbours are replaced by a
+# random draw from the other n - 1 sites. As in esda, one table of
+# random ids (permutations x max cardinality, drawn from n - 1 values)
+# is shared by every site and shifted past the site itself, so a whole
+# block of sites is simulated with one gather and one contraction. The
+# same seed gives the same p-values whatever the number of workers.
+
+LISA_CLUSTERS = {1: "HH", 2: "LH", 3: "LL", 4: "HL"}
+
+# Sites simulated per vectorised block (memory ~ block x perms x k)
+PERMUTATION_BLOCK = 256
+
+# Per-process state for parallel permutations (set by _init_perm_worker)
+_PERM_STATE = {}
+
+
+def _permuted_ids(n: int, max_card: int, permutations: int, seed: int) -> np.ndarray:
+    """
+    (permutations, max_card) ids sampled without replacement from n - 1
+    (the same draws as esda's conditional randomisation for a seed).
+    """
+    rng = np.random.RandomState(seed)
+    out = np.empty((permutations, max_card), dtype=np.int64)
+    for p in range(permutations):
+        out[p] = rng.choice(n - 1, size=max_card, replace=False)
+    return out
+
+
+def _padded_neighbours(neighbours: sparse.csr_matrix):
+    """
+    Neighbour ids and binary weights as dense (n, max_card) arrays,
+    zero-padded for sites with fewer neighbours.
+    """
+    csr = sparse.csr_matrix(neighbours)
+    cards = np.diff(csr.indptr)
+    max_card = int(cards.max()) if len(cards) else 0
+
+    slots = np.arange(max_card)
+    valid = slots[None, :] < cards[:, None]
+    ids = np.zeros((csr.shape[0], max_card), dtype=np.int64)
+    ids[valid] = csr.indices
+    return ids, valid.astype(np.float64), cards
+
+
+def _simulate_block(
+    start, stop, y, y_sum, z, cards, valid, permuted, gi_observed, lisa_observed, lisa_scale
+):
+    """
+    Pseudo p-values (esda "directed" rule) for Gi* and local Moran's I
+    at sites start..stop.
+    """
+    rows = np.arange(start, stop)
+    n_perm = permuted.shape[0]
+
+    # Shift ids past the site itself: draws come from the other n - 1
+    ids = permuted[None, :, :] + (permuted[None, :, :] >= rows[:, None, None])
+    w = valid[start:stop]
+
+    # Gi*: neighbours and the site itself weigh 1 / (card + 1)
+    y_lag = np.einsum("bpk,bk->bp", y[ids], w)
+    gi_sims = (y_lag + y[rows, None]) / (cards[start:stop, None] + 1) / y_sum
+
+    # Local Moran: row-standardised lag of the standardised values
+    z_lag = np.einsum("bpk,bk->bp", z[ids], w) / np.maximum(cards[start:stop, None], 1)
+    lisa_sims = z[rows, None] * z_lag * lisa_scale
+
+    out = []
+    for sims, observed in ((gi_sims, gi_observed), (lisa_sims, lisa_observed)):
+        larger = (sims >= observed[rows, None]).sum(axis=1)
+        larger = np.minimum(larger, n_perm - larger)
+        out.append((larger + 1.0) / (n_perm + 1.0))
+    return out
+
+
+def _permutation_chunk(start, stop, state):
+    gi_p, lisa_p = [], []
+    for lo in range(start, stop, PERMUTATION_BLOCK):
+        g, l = _simulate_block(lo, min(stop, lo + PERMUTATION_BLOCK), **state)
+        gi_p.append(g)
+        lisa_p.append(l)
+    return np.concatenate(gi_p), np.concatenate(lisa_p)
+
+
+def _init_perm_worker(state):
+    _PERM_STATE.update(state)
+
+
+def _worker_permutation_chunk(bounds):
+    return _permutation_chunk(*bounds, _PERM_STATE)
+
+
+def fdr_flags(p_values: np.ndarray, alpha: float = 0.05) -> np.ndarray:
+    """
+    Benjamini-Hochberg: True where a p-value stays significant at false
+    discovery rate alpha.
+    """
+    p = np.asarray(p_values, dtype=np.float64)
+    m = len(p)
+    if m == 0:
+        return np.zeros(0, dtype=bool)
+    ranked = np.sort(p)
+    below = ranked <= alpha * np.arange(1, m + 1) / m
+    if not below.any():
+        return np.zeros(m, dtype=bool)
+    return p <= ranked[np.nonzero(below)[0].max()]
+
+
+def local_permutation_inference(
+    y: np.ndarray,
+    neighbours: sparse.csr_matrix,
+    permutations: int = 999,
+    seed: int = 12345,
+    workers: int = 1,
+):
+    """
+    Gi* and local Moran's I with conditional permutation p-values.
+
+    Parameters
+    ----------
+    y : array (n_cells,)
+    neighbours : binary (n x n) CSR neighbour matrix (knn_neighbours).
+    permutations : int
+    seed : int
+        Fixes the random draws; results do not depend on workers.
+    workers : int
+        Processes sharing the sites (1 = in this process).
+
+    Returns
+    -------
+    dict of (n_cells,) arrays: gi (Gi* statistic), gi_p_sim, lisa_i,
+    lisa_q (quadrant 1=HH, 2=LH, 3=LL, 4=HL), lisa_p_sim.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    ids, valid, cards = _padded_neighbours(neighbours)
+
+    # Observed statistics (the same weights as the simulations)
+    y_lag = np.einsum("nk,nk->n", y[ids], valid)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gi = (y_lag + y) / (cards + 1) / y.sum()
+        z = (y - y.mean()) / y.std()
+    z_lag = np.einsum("nk,nk->n", z[ids], valid) / np.maximum(cards, 1)
+    lisa_scale = (n - 1) / (z * z).sum()
+    lisa_i = lisa_scale * z * z_lag
+
+    lisa_q = np.select(
+        [(z > 0) & (z_lag > 0), (z <= 0) & (z_lag > 0), (z <= 0) & (z_lag <= 0)],
+        [1, 2, 3],
+        default=4,
+    )
+
+    state = {
+        "y": y,
+        "y_sum": y.sum(),
+        "z": z,
+        "cards": cards,
+        "valid": valid,
+        "permuted": _permuted_ids(n, valid.shape[1], permutations, seed),
+        "gi_observed": gi,
+        "lisa_observed": lisa_i,
+        "lisa_scale": lisa_scale,
+    }
+
+    workers = max(1, min(int(workers), n))
+    if workers <= 1:
+        gi_p, lisa_p = _permutation_chunk(0, n, state)
+    else:
+        edges = np.linspace(0, n, workers + 1).astype(int)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_perm_worker,
+            initargs=(state,),
+        ) as pool:
+            parts = list(pool.map(_worker_permutation_chunk, zip(edges[:-1], edges[1:])))
+        gi_p = np.concatenate([g for g, _ in parts])
+        lisa_p = np.concatenate([l for _, l in parts])
+
+    return {
+        "gi": gi,
+        "gi_p_sim": gi_p,
+        "lisa_i": lisa_i,
+        "lisa_q": lisa_q,
+        "lisa_p_sim": lisa_p,
+    }
+
+
+def compute_local_inference(
+    gdf: gpd.GeoDataFrame,
+    column: str = "crime_count_total",
+    permutations: int = 999,
+    seed: int = 12345,
+    workers: int = 1,
+    alpha: float = 0.05,
+    k: int = 8,
+):
+    """
+    Permutation inference for Gi* hotspots and LISA clusters.
+
+    Adds columns:
+    gi_p_sim, gi_fdr          pseudo p-value and FDR-significant flag
+    lisa_i, lisa_p_sim,
+    lisa_fdr                  local Moran's I and its inference
+    lisa_cluster              HH / LH / LL / HL where lisa_p_sim <= alpha,
+                              else "ns"
+    """
+    csr, _ = knn_neighbours(gdf, k=k)
+    res = local_permutation_inference(
+        gdf[column].values,
+        csr,
+        permutations=permutations,
+        seed=seed,
+        workers=workers,
+    )
+
+    gdf["gi_p_sim"] = res["gi_p_sim"]
+    gdf["gi_fdr"] = fdr_flags(res["gi_p_sim"], alpha)
+    gdf["lisa_i"] = res["lisa_i"]
+    gdf["lisa_p_sim"] = res["lisa_p_sim"]
+    gdf["lisa_fdr"] = fdr_flags(res["lisa_p_sim"], alpha)
+    gdf["lisa_cluster"] = np.where(
+        res["lisa_p_sim"] <= alpha,
+        pd.Series(res["lisa_q"]).map(LISA_CLUSTERS).values,
+        "ns",
+    )
+    return gdf
+
+
+# ---------------------------------------------------------------------
+# Binned FFT kernel density
+# ---------------------------------------------------------------------
+# Weighted points (incidents, or cell centroids carrying their counts)
+# are spread onto a fine raster by linear binning, convolved with a
+# truncated Gaussian by FFT and read back at the cells by bilinear
+# interpolation: O(N + G log G) instead of O(N^2). Binning and sampling
+# share one sparse (raster x points) matrix, and many variables (crime
+# types, months) are convolved as one stack.
+
+# Kernel support / raster padding, in bandwidths
+KDE_TRUNCATE = 4.0
+
+# Raster cells per bandwidth when no resolution is given
+KDE_CELLS_PER_BANDWIDTH = 8
+
+# Variables convolved at once (memory ~ batch x raster size)
+KDE_BATCH = 16
+
+
+def kde_raster_frame(bounds, bandwidth: float, resolution: float = None):
+    """
+    Raster covering bounds plus the kernel support.
+
+    Returns
+    -------
+    dict with origin (x0, y0) of node (0, 0), resolution and shape
+    (ny, nx); node (r, c) sits at (x0 + c * res, y0 + r * res).
+    """
+    resolution = float(resolution or bandwidth / KDE_CELLS_PER_BANDWIDTH)
+    pad = KDE_TRUNCATE * bandwidth
+    minx, miny, maxx, maxy = bounds
+    nx = int(np.ceil((maxx - minx + 2 * pad) / resolution)) + 2
+    ny = int(np.ceil((maxy - miny + 2 * pad) / resolution)) + 2
+    return {
+        "origin": (minx - pad, miny - pad),
+        "resolution": resolution,
+        "shape": (ny, nx),
+    }
+
+
+def _bilinear_matrix(coords: np.ndarray, frame) -> sparse.csr_matrix:
+    """
+    (raster nodes x points) matrix of linear-binning weights; its
+    transpose interpolates a raster bilinearly at the points.
+    """
+    ny, nx = frame["shape"]
+    x0, y0 = frame["origin"]
+    fx = (coords[:, 0] - x0) / frame["resolution"]
+    fy = (coords[:, 1] - y0) / frame["resolution"]
+    ix = np.clip(np.floor(fx).astype(np.int64), 0, nx - 2)
+    iy = np.clip(np.floor(fy).astype(np.int64), 0, ny - 2)
+    tx = fx - ix
+    ty = fy - iy
+
+    points = np.arange(len(coords))
+    rows = np.concatenate(
+        [iy * nx + ix, iy * nx + ix + 1, (iy + 1) * nx + ix, (iy + 1) * nx + ix + 1]
+    )
+    vals = np.concatenate(
+        [(1 - tx) * (1 - ty), tx * (1 - ty), (1 - tx) * ty, tx * ty]
+    )
+    return sparse.csr_matrix(
+        (vals, (rows, np.tile(points, 4))), shape=(ny * nx, len(coords))
+    )
+
+
+def _gaussian_kernel(bandwidth: float, resolution: float) -> np.ndarray:
+    """
+    Gaussian kernel on the raster lattice, per square metre.
+    """
+    r = int(np.ceil(KDE_TRUNCATE * bandwidth / resolution))
+    offsets = np.arange(-r, r + 1) * resolution
+    d2 = offsets[None, :] ** 2 + offsets[:, None] ** 2
+    return np.exp(-0.5 * d2 / bandwidth**2) / (2 * np.pi * bandwidth**2)
+
+
+def binned_kde(
+    coords: np.ndarray,
+    weights: np.ndarray = None,
+    bandwidth: float = 750.0,
+    resolution: float = None,
+    frame=None,
+    binning=None,
+):
+    """
+    Weighted Gaussian KDE surfaces on a raster via FFT convolution.
+
+    Parameters
+    ----------
+    coords : array (n_points, 2), projected (metres).
+    weights : array (n_points,) or (n_points, n_variables), optional
+        Counts per point; one surface per column (default: 1 each).
+    bandwidth : float
+        Kernel standard deviation in metres.
+    resolution : float, optional
+        Raster cell size (default bandwidth / 8).
+    frame, binning : optional
+        A kde_raster_frame() and its _bilinear_matrix() to reuse.
+
+    Returns
+    -------
+    (surfaces, frame) where surfaces is (n_variables, ny, nx) in
+    events per km^2.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    if weights is None:
+        weights = np.ones(len(coords))
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.ndim == 1:
+        weights = weights[:, None]
+
+    if frame is None:
+        bounds = (*coords.min(axis=0), *coords.max(axis=0))
+        frame = kde_raster_frame(bounds, bandwidth, resolution)
+    if binning is None:
+        binning = _bilinear_matrix(coords, frame)
+
+    ny, nx = frame["shape"]
+    binned = np.asarray(binning @ weights).T.reshape(-1, ny, nx)
+    kernel = _gaussian_kernel(bandwidth, frame["resolution"])
+
+    surfaces = fftconvolve(binned, kernel[None], mode="same", axes=(1, 2))
+    # FFT round-off can leave tiny negatives far from any point
+    np.maximum(surfaces, 0.0, out=surfaces)
+    return surfaces * 1e6, frame
+
+
+def kde_cell_intensity(
+    gdf: gpd.GeoDataFrame,
+    weights: np.ndarray,
+    bandwidth: float = 750.0,
+    resolution: float = None,
+    keep_rasters: bool = False,
+):
+    """
+    KDE intensity (events per km^2) at every cell centroid, with the
+    cell counts as point weights.
+
+    Parameters
+    ----------
+    gdf : GeoDataFrame of grid cells.
+    weights : array (n_cells,) or (n_cells, n_variables)
+    keep_rasters : bool
+        Also return the (n_variables, ny, nx) surfaces.
+
+    Returns
+    -------
+    (intensity (n_cells, n_variables), frame, rasters or None)
+    """
+    coords = _cell_coords(gdf)
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.ndim == 1:
+        weights = weights[:, None]
+
+    bounds = (*coords.min(axis=0), *coords.max(axis=0))
+    frame = kde_raster_frame(bounds, bandwidth, resolution)
+    binning = _bilinear_matrix(coords, frame)
+
+    intensity = np.empty(weights.shape, dtype=np.float64)
+    rasters = []
+    for lo in range(0, weights.shape[1], KDE_BATCH):
+        block = weights[:, lo : lo + KDE_BATCH]
+        surfaces, _ = binned_kde(
+            coords, block, bandwidth, frame=frame, binning=binning
+        )
+        intensity[:, lo : lo + block.shape[1]] = np.asarray(
+            binning.T @ surfaces.reshape(len(surfaces), -1).T
+        )
+        if keep_rasters:
+            rasters.append(surfaces.astype(np.float32))
+
+    rasters = np.concatenate(rasters) if keep_rasters else None
+    return intensity, frame, rasters
+
+
+def compute_kde_intensity(
+    gdf: gpd.GeoDataFrame,
+    bandwidth: float = 200.0,
+    column: str = "crime_count_total",
+    resolution: float = None,
+):
+    """
+    Crime intensity (crimes per km^2) at cell centroids: a Gaussian
+    KDE of the cells weighted by their counts, computed on a binned
+    raster by FFT.
 
     Parameters
     ----------
     bandwidth : float
         Kernel bandwidth in CRS units (metres if CRS is projected).
+    column : str
+        Per-cell counts used as weights.
     """
-    centroids = gdf.geometry.centroid
-    coords = np.column_stack([centroids.x.values, centroids.y.values])
+    intensity, _, _ = kde_cell_intensity(
+        gdf, gdf[column].values, bandwidth=bandwidth, resolution=resolution
+    )
+    gdf["kde_intensity"] = intensity[:, 0]
+    return gdf
+
+
+def compute_kde_surfaces(
+    gdf: gpd.GeoDataFrame,
+    cube,
+    bandwidth: float = 750.0,
+    resolution: float = None,
+):
+    """
+    KDE intensity per crime type and per month from the cube.
+
+    Returns
+    -------
+    (cells, raster)
+    cells  — tidy DataFrame: family, variable, cell_id, kde_intensity
+    raster — dict for np.savez: the total and per-type surfaces
+             (float32, rows from y0 upward), their labels, origin,
+             resolution
+    """
+    cell_ids = gdf["cell_id"].values
+    rows = pd.Index(cube.cell_ids).get_indexer(cell_ids)
+
+    families = {
+        name: (labels, matrix)
+        for name, labels, matrix in _cube_families(cube)
+        if name in ("total", "primary_type", "month")
+    }
+
+    parts, raster = [], {}
+    for family, (labels, matrix) in families.items():
+        Y = np.zeros((len(cell_ids), matrix.shape[1]), dtype=np.float64)
+        Y[rows >= 0] = matrix[rows[rows >= 0]]
+
+        keep = family in ("total", "primary_type")
+        intensity, frame, surfaces = kde_cell_intensity(
+            gdf, Y, bandwidth=bandwidth, resolution=resolution, keep_rasters=keep
+        )
+        parts.append(
+            pd.DataFrame(
+                {
+                    "family": family,
+                    "variable": np.repeat(np.asarray(labels, dtype=object), len(cell_ids)),
+                    "cell_id": np.tile(cell_ids, len(labels)),
+                    "kde_intensity": intensity.T.ravel().astype(np.float32),
+                }
+            )
+        )
+        if keep:
+            raster[family] = surfaces
+            raster[f"{family}_labels"] = np.asarray(labels, dtype=str)
+            raster["origin"] = np.asarray(frame["origin"])
+            raster["resolution"] = np.float64(frame["resolution"])
+        print(f"[KDE] {family}: {len(labels)} surfaces")
 
-    kde = KernelDensity(bandwidth=bandwidth, kernel="gaussian")
-    kde.fit(coords)
-    gdf["kde_intensity"] = np.exp(kde.score_samples(coords))
-    return gdf
\ No newline at end of file
+    cells = pd.concat(parts, ignore_index=True)
+    for col in ["family", "variable"]:
+        cells[col] = cells[col].astype("category")
+    return cells, raster
\ No newline at end of file
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Project root on the path (for `src` / `app`), and pipeline outputs
+# (e.g. cached spatial weights) written to a scratch directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("DATA_PROCESSED_DIR", tempfile.mkdtemp(prefix="crime_tests_"))
@@ -0,0 +1,127 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+from src.aggregate import _iter_partials, build_grid_index, chunk_partial, merge_partials
+from src.crime_cube import MISSING_TYPE, month_code, month_labels
+
+PRIMARY_TYPES = ["THEFT", "BATTERY"]
+CELL_SIZE = 100.0
+NX, NY = 6, 5
+
+
+@pytest.fixture(scope="module")
+def grid():
+    cells = [
+        box(i * CELL_SIZE, j * CELL_SIZE, (i + 1) * CELL_SIZE, (j + 1) * CELL_SIZE)
+        for j in range(NY)
+        for i in range(NX)
+    ]
+    return gpd.GeoDataFrame(
+        {"cell_id": np.arange(100, 100 + len(cells))}, geometry=cells, crs=32616
+    )
+
+
+@pytest.fixture(scope="module")
+def crimes():
+    """
+    Synthetic crimes as iter_crime_arrays() yields them; some fall
+    outside the grid and some have no primary type.
+    """
+    rng = np.random.default_rng(0)
+    n = 6000
+    types = rng.choice(["THEFT", "BATTERY", "ROBBERY", None], size=n, p=[0.4, 0.3, 0.2, 0.1])
+    return {
+        "id": np.arange(n, dtype=np.int64),
+        "updated_on": np.full(n, np.datetime64("2024-01-01T00:00:00", "ns")),
+        "x": rng.uniform(-50, NX * CELL_SIZE + 50, n),
+        "y": rng.uniform(-50, NY * CELL_SIZE + 50, n),
+        "month": month_code(2023, 1) + rng.integers(0, 14, n),
+        "hour": rng.integers(0, 24, n).astype(np.int8),
+        "dow": rng.integers(0, 7, n).astype(np.int8),
+        "primary_type": pd.Categorical(types),
+    }
+
+
+def _chunks(crimes, size):
+    n = len(crimes["x"])
+    for start in range(0, n, size):
+        yield {key: values[start:start + size] for key, values in crimes.items()}
+
+
+def _aggregate(grid, chunks, workers):
+    tree, _, _ = build_grid_index(grid)
+    partials = _iter_partials(
+        chunks,
+        workers,
+        grid["cell_id"].values,
+        PRIMARY_TYPES,
+        None,
+        tree,
+        grid.geometry.values,
+    )
+    return merge_partials(*partials)
+
+
+def _monthly(partial):
+    return partial["cube"].to_frame().reset_index(drop=True)
+
+
+def _expected(grid, crimes):
+    """
+    Counts by direct cell arithmetic and a pandas group-by.
+    """
+    col = np.floor(crimes["x"] / CELL_SIZE).astype(np.int64)
+    row = np.floor(crimes["y"] / CELL_SIZE).astype(np.int64)
+    inside = (col >= 0) & (col < NX) & (row >= 0) & (row < NY)
+    pos = (row * NX + col)[inside]
+    ptype = np.asarray(crimes["primary_type"].astype(object))[inside]
+
+    n_cells = len(grid)
+    total = np.bincount(pos, minlength=n_cells)
+    by_type = np.stack(
+        [np.bincount(pos[ptype == t], minlength=n_cells) for t in PRIMARY_TYPES]
+    )
+    monthly = (
+        pd.DataFrame(
+            {
+                "cell_id": grid["cell_id"].values[pos],
+                "month": month_labels(crimes["month"][inside]),
+                "hour": crimes["hour"][inside].astype(np.int64),
+                "dow": crimes["dow"][inside].astype(np.int64),
+                "primary_type": pd.Series(ptype).fillna(MISSING_TYPE).values,
+            }
+        )
+        .groupby(["cell_id", "month", "hour", "dow", "primary_type"])
+        .size()
+    )
+    return total, by_type, monthly
+
+
+def test_single_chunk_matches_group_by(grid, crimes):
+    tree, _, _ = build_grid_index(grid)
+    partial = chunk_partial(
+        crimes, grid["cell_id"].values, PRIMARY_TYPES, tree=tree
+    )
+    total, by_type, monthly = _expected(grid, crimes)
+
+    np.testing.assert_array_equal(partial["total"], total)
+    np.testing.assert_array_equal(partial["by_type"], by_type)
+
+    frame = _monthly(partial)
+    got = frame.set_index(["cell_id", "month", "hour", "dow", "primary_type"])["crime_count"]
+    pd.testing.assert_series_equal(
+        got.sort_index(), monthly.sort_index(), check_names=False, check_dtype=False
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_chunked_aggregation_matches_single_pass(grid, crimes, workers):
+    single = _aggregate(grid, _chunks(crimes, len(crimes["x"])), workers=1)
+    chunked = _aggregate(grid, _chunks(crimes, 700), workers=workers)
+
+    np.testing.assert_array_equal(chunked["total"], single["total"])
+    np.testing.assert_array_equal(chunked["by_type"], single["by_type"])
+    pd.testing.assert_frame_equal(_monthly(chunked), _monthly(single))
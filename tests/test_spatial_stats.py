@@ -0,0 +1,58 @@
+import esda
+import geopandas as gpd
+import libpysal
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from src.spatial_stats import batch_gi_star, batch_moran, knn_neighbours
+
+MORAN_COLUMNS = ["I", "EI", "VI_norm", "z_norm", "p_norm", "VI_rand", "z_rand", "p_rand"]
+
+
+@pytest.fixture(scope="module")
+def grid():
+    cells = [box(i, j, i + 1, j + 1) for j in range(9) for i in range(12)]
+    return gpd.GeoDataFrame({"cell_id": np.arange(len(cells))}, geometry=cells, crs=32616)
+
+
+@pytest.fixture(scope="module")
+def values(grid):
+    """
+    Columns with spatial structure, pure noise and sparse counts.
+    """
+    rng = np.random.default_rng(1)
+    centroids = grid.geometry.centroid
+    trend = centroids.x.values + 0.5 * centroids.y.values
+    n = len(grid)
+    return np.column_stack(
+        [
+            rng.poisson(1 + trend),
+            rng.poisson(3.0, n),
+            rng.poisson(0.2, n),
+        ]
+    ).astype(np.float64)
+
+
+def test_batch_moran_matches_esda(grid, values):
+    csr, _ = knn_neighbours(grid, k=8)
+    result = batch_moran(values, csr)
+
+    w = libpysal.weights.W.from_sparse(csr)
+    w.transform = "r"
+    for j in range(values.shape[1]):
+        moran = esda.Moran(values[:, j], w, permutations=0)
+        expected = [getattr(moran, col) for col in MORAN_COLUMNS]
+        np.testing.assert_allclose(
+            result.loc[j, MORAN_COLUMNS].values.astype(float), expected, rtol=1e-10
+        )
+
+
+def test_batch_gi_star_matches_esda(grid, values):
+    csr, _ = knn_neighbours(grid, k=8)
+    result = batch_gi_star(values, csr)
+
+    w = libpysal.weights.W.from_sparse(csr)
+    for j in range(values.shape[1]):
+        gi = esda.G_Local(values[:, j], w, transform="R", star=1.0, permutations=0)
+        np.testing.assert_allclose(result[:, j], gi.Zs, rtol=1e-10)
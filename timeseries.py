@@ -1,7 +1,55 @@
+import itertools
+import json
+import signal
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import numpy as np
 import pandas as pd
+from scipy import stats
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 
-from .config import FORECAST_FILE
+from .config import (
+    FORECAST_CELL_FILE,
+    FORECAST_FILE,
+    SARIMA_LEADERBOARD_FILE,
+    SARIMA_SELECTION_FILE,
+)
+from .crime_cube import CrimeCube, month_labels
+from .model_registry import fit_or_load, model_fingerprint
+
+
+def citywide_monthly_history(monthly_df) -> pd.DataFrame:
+    """
+    Citywide monthly totals (month as Timestamp, crime_count) from a
+    CrimeCube or a long monthly table.
+    """
+    if isinstance(monthly_df, CrimeCube):
+        # Contiguous months, including any with zero crimes
+        history_df = pd.DataFrame(
+            {
+                "month": monthly_df.axis_labels("month"),
+                "crime_count": monthly_df.sum(
+                    axis=("cell", "hour", "dow", "primary_type")
+                ),
+            }
+        )
+    else:
+        history_df = (
+            monthly_df
+            .groupby("month", as_index=False)["crime_count"]
+            .sum()
+            .sort_values("month")
+        )
+
+    history_df["month"] = pd.to_datetime(history_df["month"])
+    return history_df
+
+
+def _monthly_series(history_df: pd.DataFrame) -> pd.Series:
+    ts = history_df.set_index("month")["crime_count"].astype(float)
+    return ts.asfreq("MS", fill_value=0.0)
 
 
 def forecast_monthly_crime(
@@ -9,18 +57,23 @@ def forecast_monthly_crime(
     horizon: int = 6,
     order=(1, 1, 1),
     seasonal_order=(1, 1, 1, 12),
+    registry: bool = True,
 ):
     """
     Forecast citywide monthly crime totals using SARIMA.
 
     Parameters
     ----------
-    monthly_df : DataFrame
-        Output from aggregate_features(), containing cell-level monthly counts.
+    monthly_df : CrimeCube or DataFrame
+        Output from aggregate_features() (a CrimeCube), or a long
+        monthly table with month and crime_count columns.
     horizon : int
         Number of months to forecast ahead.
     order, seasonal_order : tuple
         SARIMA model parameters.
+    registry : bool
+        Store the fitted model in the model registry and reuse it while
+        the monthly totals and orders are unchanged.
 
     Returns
     -------
@@ -36,16 +89,8 @@ def forecast_monthly_crime(
     # Aggregate to citywide monthly totals
     # ------------------------------------------------------------------
 
-    history_df = (
-        monthly_df
-        .groupby("month", as_index=False)["crime_count"]
-        .sum()
-        .sort_values("month")
-    )
-
-    history_df["month"] = pd.to_datetime(history_df["month"])
-
-    ts = history_df.set_index("month")["crime_count"]
+    history_df = citywide_monthly_history(monthly_df)
+    ts = _monthly_series(history_df)
 
     # ------------------------------------------------------------------
     # Fit SARIMA
@@ -58,7 +103,19 @@ def forecast_monthly_crime(
         enforce_stationarity=False,
         enforce_invertibility=False,
     )
-    res = model.fit(disp=False)
+    if registry:
+        fingerprint = model_fingerprint(
+            ts,
+            params={"order": list(order), "seasonal_order": list(seasonal_order)},
+        )
+        res = fit_or_load(
+            "sarima",
+            fingerprint,
+            lambda: model.fit(disp=False),
+            meta={"order": list(order), "seasonal_order": list(seasonal_order)},
+        )
+    else:
+        res = model.fit(disp=False)
 
     # ------------------------------------------------------------------
     # Forecast
@@ -81,4 +138,429 @@ def forecast_monthly_crime(
     FORECAST_FILE.parent.mkdir(parents=True, exist_ok=True)
     forecast_df.to_parquet(FORECAST_FILE)
 
-    return history_df, forecast_df, FORECAST_FILE
\ No newline at end of file
+    return history_df, forecast_df, FORECAST_FILE
+
+
+# ---------------------------------------------------------------------
+# SARIMA order search (rolling-origin backtest)
+# ---------------------------------------------------------------------
+# Every candidate order is scored by refitting it at successive forecast
+# origins (expanding window) and comparing its forecasts with what
+# followed. Each origin's fit starts from the previous origin's
+# parameters, so only the first fit of an order starts cold. Orders are
+# spread over a process pool; a fit that exceeds the time limit fails
+# that order instead of stalling the search.
+
+def sarima_order_grid(
+    p=(0, 1, 2),
+    d=(0, 1),
+    q=(0, 1, 2),
+    P=(0, 1),
+    D=(0, 1),
+    Q=(0, 1),
+    s: int = 12,
+):
+    """
+    All (order, seasonal_order) combinations of the given values.
+    """
+    return [
+        ((pi, di, qi), (Pi, Di, Qi, s))
+        for pi, di, qi, Pi, Di, Qi in itertools.product(p, d, q, P, D, Q)
+    ]
+
+
+@contextmanager
+def _time_limit(seconds):
+    """
+    Raise TimeoutError if the block runs longer than `seconds` (only
+    where SIGALRM exists, in a process's main thread).
+    """
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def _raise(signum, frame):
+        raise TimeoutError(f"SARIMA fit exceeded {seconds} s")
+
+    try:
+        previous = signal.signal(signal.SIGALRM, _raise)
+    except ValueError:
+        # Not the main thread: run without a limit
+        yield
+        return
+
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def backtest_sarima(
+    ts: pd.Series,
+    order,
+    seasonal_order,
+    origins,
+    horizon: int = 6,
+    interval: float = 0.9,
+    fit_timeout: float = 60.0,
+) -> dict:
+    """
+    Rolling-origin backtest of one SARIMA order.
+
+    Parameters
+    ----------
+    ts : Series of monthly totals.
+    origins : sequence of int
+        Number of observations used for training at each origin
+        (increasing).
+    horizon : int
+        Months forecast from each origin (truncated at the end of ts).
+    interval : float
+        Coverage of the forecast intervals.
+    fit_timeout : float
+        Seconds allowed per fit.
+
+    Returns
+    -------
+    dict with order, seasonal_order, mae, mape, coverage, n_forecasts,
+    aic (of the last fit), seconds and error (None when it succeeded).
+    """
+    started = pd.Timestamp.now()
+    errors, ape, inside = [], [], []
+    params, aic, error = None, np.nan, None
+
+    try:
+        for cutoff in origins:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                model = SARIMAX(
+                    ts.iloc[:cutoff],
+                    order=order,
+                    seasonal_order=seasonal_order,
+                    enforce_stationarity=False,
+                    enforce_invertibility=False,
+                )
+                with _time_limit(fit_timeout):
+                    res = model.fit(disp=False, start_params=params)
+
+            params, aic = res.params, res.aic
+            steps = min(horizon, len(ts) - cutoff)
+            fc = res.get_forecast(steps=steps)
+            mean = fc.predicted_mean.values
+            conf = fc.conf_int(alpha=1 - interval).values
+            actual = ts.iloc[cutoff:cutoff + steps].values
+
+            errors.append(mean - actual)
+            inside.append((actual >= conf[:, 0]) & (actual <= conf[:, 1]))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ape.append(np.where(actual != 0, np.abs(mean - actual) / np.abs(actual), np.nan))
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+
+    ok = error is None and len(errors) > 0
+    errors = np.concatenate(errors) if ok else np.array([])
+    return {
+        "order": tuple(order),
+        "seasonal_order": tuple(seasonal_order),
+        "mae": float(np.abs(errors).mean()) if ok else np.inf,
+        "mape": float(np.nanmean(np.concatenate(ape))) if ok else np.inf,
+        "coverage": float(np.concatenate(inside).mean()) if ok else np.nan,
+        "n_forecasts": int(errors.size),
+        "aic": float(aic) if ok else np.nan,
+        "seconds": round((pd.Timestamp.now() - started).total_seconds(), 3),
+        "error": error,
+    }
+
+
+def _rolling_origins(n: int, n_origins: int, step: int, min_train: int):
+    """
+    Training sizes of the last n_origins origins, `step` months apart,
+    each followed by at least one month to score.
+    """
+    last = n - 1
+    origins = [last - i * step for i in range(n_origins)]
+    origins = sorted(o for o in origins if o >= min_train)
+    if not origins:
+        raise ValueError(
+            f"Series of {n} months is too short for a backtest "
+            f"(needs more than {min_train} months)."
+        )
+    return origins
+
+
+def select_sarima_order(
+    monthly_df,
+    grid=None,
+    horizon: int = 6,
+    n_origins: int = 6,
+    step: int = 1,
+    interval: float = 0.9,
+    workers: int = 1,
+    fit_timeout: float = 60.0,
+    metric: str = "mae",
+    min_train: int = 24,
+):
+    """
+    Choose SARIMA orders by rolling-origin cross-validation.
+
+    Parameters
+    ----------
+    monthly_df : CrimeCube or DataFrame (see forecast_monthly_crime).
+    grid : list of (order, seasonal_order), optional
+        Candidates (default sarima_order_grid()).
+    horizon, interval : see backtest_sarima().
+    n_origins, step : int
+        Number of forecast origins and months between them.
+    workers : int
+        Processes evaluating orders concurrently (1 = serial).
+    fit_timeout : float
+        Seconds allowed per individual fit.
+    metric : str
+        Leaderboard column to minimise ("mae" or "mape").
+    min_train : int
+        Smallest training window.
+
+    Returns
+    -------
+    leaderboard : DataFrame
+        One row per order, best first (failed orders last).
+    best : dict
+        Chosen order / seasonal_order with its scores.
+    """
+    ts = _monthly_series(citywide_monthly_history(monthly_df))
+    grid = grid or sarima_order_grid()
+    origins = _rolling_origins(len(ts), n_origins, step, min(min_train, len(ts) - 1))
+
+    args = [
+        (ts, order, seasonal_order, origins, horizon, interval, fit_timeout)
+        for order, seasonal_order in grid
+    ]
+
+    print(
+        f"[SARIMA] Backtesting {len(args)} orders at {len(origins)} origins "
+        f"({'serial' if workers <= 1 else f'{workers} workers'})..."
+    )
+
+    if workers <= 1:
+        rows = [backtest_sarima(*a) for a in args]
+    else:
+        rows = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(backtest_sarima, *a) for a in args]
+            for future in as_completed(futures):
+                rows.append(future.result())
+
+    leaderboard = pd.DataFrame(rows)
+    leaderboard["failed"] = leaderboard["error"].notna()
+    leaderboard = leaderboard.sort_values(
+        ["failed", metric, "aic"], kind="stable"
+    ).reset_index(drop=True)
+
+    if leaderboard["failed"].all():
+        raise RuntimeError("Every SARIMA order failed in the backtest.")
+
+    top = leaderboard.iloc[0]
+    best = {
+        "order": list(top["order"]),
+        "seasonal_order": list(top["seasonal_order"]),
+        "metric": metric,
+        "mae": float(top["mae"]),
+        "mape": float(top["mape"]),
+        "coverage": float(top["coverage"]),
+        "horizon": horizon,
+        "origins": [str(ts.index[o].date()) for o in origins],
+    }
+
+    SARIMA_LEADERBOARD_FILE.parent.mkdir(parents=True, exist_ok=True)
+    board = leaderboard.assign(
+        order=leaderboard["order"].astype(str),
+        seasonal_order=leaderboard["seasonal_order"].astype(str),
+    )
+    board.to_parquet(SARIMA_LEADERBOARD_FILE, index=False)
+    with open(SARIMA_SELECTION_FILE, "w") as f:
+        json.dump(best, f, indent=2)
+
+    print(
+        f"[SARIMA] Best: order={tuple(best['order'])} "
+        f"seasonal={tuple(best['seasonal_order'])} "
+        f"MAE={best['mae']:.1f} MAPE={best['mape']:.3f} coverage={best['coverage']:.2f}"
+    )
+    return leaderboard, best
+
+
+# ---------------------------------------------------------------------
+# Cell-level panel forecast
+# ---------------------------------------------------------------------
+# One global model over the cell x month panel: each cell-month is a
+# row whose features are the cell's recent counts, the same lags
+# averaged over its KNN neighbours and the month of year. The model is
+# trained once; forecasts are made for all cells at a time, one month
+# ahead per pass, feeding each month's predictions back as lags.
+
+PANEL_LAGS = (1, 2, 3, 6, 12)
+
+
+def _panel_features(Y: np.ndarray, W, t: int, month_of_year: int) -> np.ndarray:
+    """
+    Features of every cell for target month index t of Y (n x T),
+    using months before t only. Missing history is NaN.
+    """
+    n = Y.shape[0]
+    cols = []
+
+    def lag(k):
+        return Y[:, t - k] if t - k >= 0 else np.full(n, np.nan)
+
+    for k in PANEL_LAGS:
+        cols.append(lag(k))
+
+    for width in (3, 12):
+        window = Y[:, max(0, t - width):t]
+        cols.append(window.mean(axis=1) if window.shape[1] else np.full(n, np.nan))
+
+    # Neighbourhood (spatial lag) of last month and of the last quarter
+    cols.append(W @ np.nan_to_num(cols[0]) if t >= 1 else np.full(n, np.nan))
+    cols.append(W @ np.nan_to_num(cols[len(PANEL_LAGS)]) if t >= 1 else np.full(n, np.nan))
+
+    # Long-run level of the cell
+    cols.append(Y[:, :t].mean(axis=1) if t else np.full(n, np.nan))
+    cols.append(np.full(n, month_of_year, dtype=np.float64))
+
+    return np.column_stack(cols)
+
+
+def forecast_cell_panel(
+    cube: CrimeCube,
+    cells,
+    horizon: int = 6,
+    interval: float = 0.9,
+    k: int = 8,
+    min_history: int = 3,
+    random_state: int = 0,
+):
+    """
+    Forecast monthly crime counts for every cell.
+
+    Parameters
+    ----------
+    cube : CrimeCube
+    cells : GeoDataFrame
+        Grid cells (cell_id + geometry), used for the KNN spatial lag.
+    horizon : int
+        Months to forecast ahead.
+    interval : float
+        Coverage of the prediction interval.
+    k : int
+        Neighbours in the spatial-lag features.
+    min_history : int
+        Months of history required before a month is used for training.
+
+    Returns
+    -------
+    forecast_df : DataFrame
+        cell_id, month, horizon, forecast, lower, upper and baseline
+        (the cell's mean over the last three observed months).
+    forecast_path : Path
+    """
+    from sklearn.ensemble import HistGradientBoostingRegressor
+
+    from .spatial_stats import _row_standardise, knn_neighbours
+
+    cell_ids = cells["cell_id"].values
+    months = cube.month_range()
+
+    counts = cube.sum(("hour", "dow", "primary_type"))
+    rows = pd.Index(cube.cell_ids).get_indexer(cell_ids)
+    Y = np.zeros((len(cell_ids), len(months)), dtype=np.float64)
+    Y[rows >= 0] = counts[rows[rows >= 0]]
+    n, T = Y.shape
+
+    if T <= min_history:
+        raise ValueError(f"Need more than {min_history} months to forecast; got {T}.")
+
+    csr, _ = knn_neighbours(cells, k=k)
+    W = _row_standardise(csr)
+
+    # ------------------------------------------------------------------
+    # Train one model on every (cell, month) with enough history
+    # ------------------------------------------------------------------
+
+    train_t = range(min_history, T)
+    X_train = np.vstack([_panel_features(Y, W, t, months[t] % 12) for t in train_t])
+    y_train = np.concatenate([Y[:, t] for t in train_t])
+
+    model = HistGradientBoostingRegressor(
+        loss="poisson",
+        max_iter=300,
+        learning_rate=0.05,
+        categorical_features=[X_train.shape[1] - 1],
+        random_state=random_state,
+    )
+    model.fit(X_train, y_train)
+
+    # Overdispersion for negative binomial intervals: Var = mu + alpha mu^2
+    mu = np.maximum(model.predict(X_train), 1e-9)
+    alpha = max(0.0, float(np.mean(((y_train - mu) ** 2 - mu) / mu**2)))
+
+    # ------------------------------------------------------------------
+    # Recursive forecast, all cells per step
+    # ------------------------------------------------------------------
+
+    panel = np.hstack([Y, np.zeros((n, horizon))])
+    future = months[-1] + np.arange(1, horizon + 1)
+    for h in range(horizon):
+        t = T + h
+        panel[:, t] = np.maximum(model.predict(_panel_features(panel, W, t, future[h] % 12)), 0.0)
+
+    mean = panel[:, T:]
+    tail = (1 - interval) / 2
+    if alpha > 0:
+        size = 1.0 / alpha
+        prob = size / (size + np.maximum(mean, 1e-9))
+        lower = stats.nbinom.ppf(tail, size, prob)
+        upper = stats.nbinom.ppf(1 - tail, size, prob)
+    else:
+        lower = stats.poisson.ppf(tail, mean)
+        upper = stats.poisson.ppf(1 - tail, mean)
+
+    forecast_df = pd.DataFrame(
+        {
+            "cell_id": np.repeat(cell_ids, horizon),
+            "month": np.tile(month_labels(future), n),
+            "horizon": np.tile(np.arange(1, horizon + 1), n),
+            "forecast": mean.ravel(),
+            "lower": np.nan_to_num(lower).ravel(),
+            "upper": np.nan_to_num(upper).ravel(),
+            "baseline": np.repeat(Y[:, -3:].mean(axis=1), horizon),
+        }
+    )
+
+    FORECAST_CELL_FILE.parent.mkdir(parents=True, exist_ok=True)
+    forecast_df.to_parquet(FORECAST_CELL_FILE, index=False)
+
+    return forecast_df, FORECAST_CELL_FILE
+
+
+def write_empty_cell_forecast():
+    """
+    Write a per-cell forecast without rows (same columns as
+    forecast_cell_panel), for scopes too short to forecast from.
+    """
+    forecast_df = pd.DataFrame(
+        {
+            "cell_id": np.empty(0, dtype=np.int64),
+            "month": np.empty(0, dtype=object),
+            "horizon": np.empty(0, dtype=np.int64),
+            "forecast": np.empty(0),
+            "lower": np.empty(0),
+            "upper": np.empty(0),
+            "baseline": np.empty(0),
+        }
+    )
+
+    FORECAST_CELL_FILE.parent.mkdir(parents=True, exist_ok=True)
+    forecast_df.to_parquet(FORECAST_CELL_FILE, index=False)
+
+    return forecast_df, FORECAST_CELL_FILE
\ No newline at end of file